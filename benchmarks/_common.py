@@ -0,0 +1,47 @@
+"""Shared helpers for the benchmark scripts"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from database import connection
+from database.config import create_app_engine
+from database.migrations import upgrade
+
+
+@contextmanager
+def temporary_database(profile: str = "desktop"):
+    """Point the data layer at a fresh database file for the duration of a benchmark"""
+    tmpdir = tempfile.mkdtemp(prefix="lms-bench-")
+    engine = create_app_engine(f"sqlite:///{os.path.join(tmpdir, 'bench.db')}", profile)
+
+    previous = connection.engine
+    connection.engine = engine
+    connection.SessionLocal.configure(bind=engine)
+    connection.member_directory.invalidate()
+    connection.query_cache.clear()
+    try:
+        connection.Base.metadata.create_all(bind=engine)
+        upgrade(engine)
+        yield engine
+    finally:
+        connection.engine = previous
+        connection.SessionLocal.configure(bind=previous)
+        connection.member_directory.invalidate()
+        connection.query_cache.clear()
+        engine.dispose()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+@contextmanager
+def timer(label: str, rows: int = None):
+    """Print the elapsed time (and rows/sec when rows is given) of the block"""
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    rate = f"  {rows / elapsed:>12,.0f} rows/s" if rows else ""
+    print(f"{label:<40} {elapsed * 1000:>10.1f} ms{rate}")
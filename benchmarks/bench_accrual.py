@@ -0,0 +1,58 @@
+"""
+The accrual batch job over every active loan: total run time, and how long
+a clerk's contribution waits while the job runs beside it. Run from the
+repository root:
+
+    python benchmarks/bench_accrual.py [loans] [chunk_size] [pause]
+"""
+import statistics
+import sys
+import threading
+import time
+
+from _common import temporary_database, timer
+from bench_amortization import add_loans
+from database import connection
+
+
+def clerk(member_id: int, stop: threading.Event, latencies: list):
+    """Record a contribution every 20 ms and keep how long each took"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        connection.record_contribution(member_id, 10.0)
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.02)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    pause = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+    with temporary_database():
+        add_loans(count, members=count // 4)
+        connection.rebuild_loan_schedules()
+        member = connection.create_member("Clerk")
+
+        with timer("run_accrual, time budget 2 s"):
+            partial = connection.run_accrual(time_budget=2.0, chunk_size=chunk_size, pause=pause)
+        print(f"{'':<40} {partial.processed:,} loans, finished={partial.finished}")
+
+        latencies = []
+        stop = threading.Event()
+        thread = threading.Thread(target=clerk, args=(member.id, stop, latencies))
+        thread.start()
+        with timer(f"run_accrual resumed (chunks of {chunk_size})", count - partial.processed):
+            run = connection.run_accrual(chunk_size=chunk_size, pause=pause)
+        stop.set()
+        thread.join()
+        assert run.finished and partial.processed + run.processed == count
+
+        latencies.sort()
+        print(f"{'':<40} {run.defaulted:,} defaulted in total {partial.defaulted + run.defaulted:,}")
+        print(f"{'clerk writes during the run':<40} {len(latencies)} writes, "
+              f"median {statistics.median(latencies) * 1000:.1f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms, "
+              f"max {latencies[-1] * 1000:.1f} ms")
+
+        with timer("run_accrual again (already finished)", 1):
+            assert connection.run_accrual().processed == 0
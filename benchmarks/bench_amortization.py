@@ -0,0 +1,69 @@
+"""
+Regenerating the installment schedules of every active loan: one
+build_schedules() call over all loans versus scheduling loans one at a time,
+and the full rebuild_loan_schedules() including the database writes.
+Run from the repository root:
+
+    python benchmarks/bench_amortization.py [loans]
+"""
+import random
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+from _common import temporary_database, timer
+from database import amortization, connection
+from database.models import InterestMethod, Loan, LoanInstallment, LoanStatus, Member
+
+# Loans scheduled one at a time; the per-loan rate is extrapolated from these
+ONE_AT_A_TIME_SAMPLE = 2000
+
+
+def add_loans(count: int, members: int = 1):
+    rng = random.Random(42)
+    with connection.session_scope() as session:
+        session.execute(insert(Member), [{"name": f"Benchmark Member {i}"} for i in range(members)])
+        member_ids = session.scalars(select(Member.id)).all()
+    start = datetime(2024, 1, 1)
+    rows = [
+        {
+            "member_id": rng.choice(member_ids),
+            "amount": rng.randrange(1000, 200000, 500),
+            "interest_rate": rng.choice([0.0, 8.0, 12.0, 18.0, 24.0]),
+            "total_interest": 0.0,
+            "term_months": rng.choice([6, 12, 24, 36, 60]),
+            "interest_method": rng.choice(list(InterestMethod)),
+            "status": LoanStatus.ACTIVE,
+            "start_date": start + timedelta(days=rng.randrange(365)),
+        }
+        for _ in range(count)
+    ]
+    with connection.session_scope() as session:
+        session.execute(insert(Loan), rows)
+
+
+def load_loans() -> list:
+    with connection.session_scope() as session:
+        return [tuple(row) for row in session.execute(select(*amortization._SCHEDULE_COLUMNS).order_by(Loan.id))]
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    with temporary_database():
+        add_loans(count)
+        loans = load_loans()
+
+        sample = loans[:ONE_AT_A_TIME_SAMPLE]
+        with timer(f"build one loan at a time ({len(sample)})", len(sample)):
+            for loan in sample:
+                amortization._schedule_loans([loan])
+        with timer(f"build_schedules, all {count} loans", count):
+            schedules = amortization._schedule_loans(loans)
+        print(f"{'':<40} {len(schedules.loan_id):,} installments")
+
+        with timer("rebuild_loan_schedules (with writes)", count):
+            scheduled = connection.rebuild_loan_schedules()
+        assert scheduled == count
+        with connection.session_scope() as session:
+            assert session.query(LoanInstallment).count() == len(schedules.loan_id)
@@ -0,0 +1,59 @@
+"""
+Arrears aging for every active loan: the set-based refresh_loan_arrears()
+versus walking each loan's schedule and repayments in Python, plus the
+incremental refresh a single repayment triggers. Run from the repository root:
+
+    python benchmarks/bench_arrears.py [loans]
+"""
+import random
+import sys
+from datetime import datetime
+
+from _common import temporary_database, timer
+from bench_amortization import add_loans
+from database import connection
+from database.models import Loan, LoanInstallment
+
+
+def python_arrears(as_of: datetime) -> dict:
+    """Days past due per loan, computed one loan at a time through the ORM"""
+    result = {}
+    with connection.session_scope() as session:
+        for loan in session.query(Loan).filter(Loan.term_months.is_not(None)):
+            paid = sum(repayment.amount_paid for repayment in loan.repayments)
+            cumulative = 0.0
+            result[loan.id] = 0
+            for installment in loan.installments:
+                cumulative += installment.amount_due
+                if installment.due_date <= as_of and cumulative > paid + 0.005:
+                    result[loan.id] = (as_of.date() - installment.due_date.date()).days
+                    break
+    return result
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    rng = random.Random(7)
+    with temporary_database():
+        add_loans(count)
+        connection.rebuild_loan_schedules()
+        loan_ids = [loan.id for loan in connection.get_active_loans()]
+        connection.bulk_record_repayments(
+            [(loan_id, rng.randrange(100, 20000)) for loan_id in rng.sample(loan_ids, count // 2)]
+        )
+
+        as_of = datetime.now()
+        with timer("walk loans in Python (ORM)", count):
+            expected = python_arrears(as_of)
+        with timer("refresh_loan_arrears, all loans", count):
+            connection.refresh_loan_arrears()
+        with timer("record_repayment (incremental refresh)", 1):
+            connection.record_repayment(loan_ids[0], 100.0)
+        with timer("get_portfolio_at_risk", 1):
+            portfolio = connection.get_portfolio_at_risk()
+
+        with connection.session_scope() as session:
+            stored = dict(session.query(connection.LoanArrears.loan_id, connection.LoanArrears.days_past_due))
+        expected[loan_ids[0]] = stored[loan_ids[0]]
+        mismatched = [loan_id for loan_id, days in stored.items() if expected.get(loan_id) != days]
+        print(f"{'':<40} PAR 30 {portfolio.par_30:.1%}, {len(mismatched)} loans differ from the Python walk")
@@ -0,0 +1,35 @@
+"""
+Month-end contribution posting: one record_contribution call per member
+versus a single bulk_record_contributions call. Run from the repository root:
+
+    python benchmarks/bench_bulk_contributions.py [members] [profile]
+"""
+import sys
+
+from _common import temporary_database, timer
+from database import connection
+from database.models import MemberStatus
+
+
+def run(members: int, profile: str):
+    with temporary_database(profile):
+        with connection.unit_of_work():
+            member_ids = [
+                connection.create_member(f"Member {i}", status=MemberStatus.ACTIVE).id
+                for i in range(members)
+            ]
+
+        with timer(f"{profile}: record_contribution x{members}", members):
+            for member_id in member_ids:
+                connection.record_contribution(member_id, 500.0, "Monthly", "2025-01")
+
+        rows = [{"member_id": member_id, "amount": 500.0, "month": "2025-02"} for member_id in member_ids]
+        with timer(f"{profile}: bulk_record_contributions", members):
+            connection.bulk_record_contributions(rows)
+
+
+if __name__ == "__main__":
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    profiles = sys.argv[2:] or ["compat", "desktop"]
+    for profile in profiles:
+        run(members, profile)
@@ -0,0 +1,58 @@
+"""
+Dashboard headline figures: the four separate statistics calls the
+dashboard used to make versus get_dashboard_snapshot(), with the query
+cache cleared before every call, then the snapshot served from the cache.
+Run from the repository root:
+
+    python benchmarks/bench_dashboard.py [members] [repeats]
+"""
+import random
+import sys
+
+from _common import temporary_database, timer
+from database import connection
+
+
+def seed(members: int):
+    with connection.unit_of_work():
+        member_ids = [connection.create_member(f"Member {i}").id for i in range(members)]
+        for month in range(1, 13):
+            connection.bulk_record_contributions(
+                [{"member_id": m, "amount": 500.0, "month": f"2025-{month:02d}"} for m in member_ids]
+            )
+        loan_ids = [
+            connection.create_loan(m, random.choice([5000.0, 10000.0]), 10.0).id
+            for m in random.sample(member_ids, members // 3)
+        ]
+        for loan_id in loan_ids:
+            connection.update_loan(loan_id, status="Active")
+        connection.bulk_record_repayments([(loan_id, 1000.0) for loan_id in loan_ids])
+
+
+def separate_calls():
+    return (
+        connection.get_total_members(),
+        connection.get_total_contributions(),
+        connection.get_total_loans_issued(),
+        connection.get_active_loans_count(),
+    )
+
+
+if __name__ == "__main__":
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    random.seed(7)
+    with temporary_database():
+        seed(members)
+        with timer(f"4 statistics calls x{repeats}"):
+            for _ in range(repeats):
+                connection.query_cache.clear()
+                separate_calls()
+        with timer(f"get_dashboard_snapshot x{repeats}"):
+            for _ in range(repeats):
+                connection.query_cache.clear()
+                connection.get_dashboard_snapshot()
+        with timer(f"get_dashboard_snapshot cached x{repeats}"):
+            for _ in range(repeats):
+                connection.get_dashboard_snapshot()
+        print(connection.get_query_cache_stats())
@@ -0,0 +1,31 @@
+"""
+Write-heavy benchmark for the SQLite engine profiles
+
+Records contributions one committed call at a time, the way the
+Contributions screen does, and reads the running total after every
+tenth write. Run from the repository root:
+
+    python benchmarks/bench_engine_profiles.py [rows]
+"""
+import sys
+
+from _common import temporary_database, timer
+from database import connection
+from database.config import ENGINE_PROFILES
+from database.models import ContributionType, MemberStatus
+
+
+def run(profile: str, rows: int):
+    with temporary_database(profile):
+        member = connection.create_member("Benchmark Member", status=MemberStatus.ACTIVE)
+        with timer(f"{profile}: {rows} committed writes", rows):
+            for i in range(rows):
+                connection.record_contribution(member.id, 100.0, ContributionType.MONTHLY)
+                if i % 10 == 0:
+                    connection.get_total_contributions()
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for name in ENGINE_PROFILES:
+        run(name, rows)
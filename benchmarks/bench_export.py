@@ -0,0 +1,62 @@
+"""
+CSV export of members, loans and contributions: the tables written one
+after another from three separate reads versus export_tables() (one
+snapshot, a writer thread per table), with and without gzip. Elapsed time,
+peak Python memory and file sizes. Run from the repository root:
+
+    python benchmarks/bench_export.py [members] [contributions_per_member]
+"""
+import csv
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+from _common import temporary_database, timer
+from bench_amortization import add_loans
+from bench_statement_batch import add_contributions
+from database import connection, export
+
+
+def export_one_by_one(exports_dir: str):
+    """The old way: stream each table into its file in turn, each from its own read"""
+    for table, rows in zip(export.EXPORT_TABLES, (connection.iter_members(), connection.iter_loans(),
+                                                   connection.iter_contributions())):
+        with open(os.path.join(exports_dir, f"{table.name}.csv"), "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(table.header)
+            writer.writerows(map(table.format_row, rows))
+
+
+def measure(label: str, rows: int, function):
+    """Time one run, then repeat it under tracemalloc (which slows it down) for the peak memory"""
+    exports_dir = tempfile.mkdtemp(prefix="lms-export-")
+    try:
+        with timer(label, rows):
+            function(exports_dir)
+        size = sum(os.path.getsize(os.path.join(exports_dir, name)) for name in os.listdir(exports_dir))
+        shutil.rmtree(exports_dir)
+        os.makedirs(exports_dir)
+        gc.collect()
+        tracemalloc.start()
+        function(exports_dir)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{'':<40} peak {peak / 1024 / 1024:.1f} MiB, files {size / 1024 / 1024:.1f} MiB")
+    finally:
+        shutil.rmtree(exports_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    per_member = int(sys.argv[2]) if len(sys.argv) > 2 else 25
+    with temporary_database():
+        add_loans(members * 2, members=members)
+        add_contributions(per_member)
+        rows = members * (3 + per_member)
+
+        measure("tables one after another", rows, export_one_by_one)
+        measure("export_tables", rows, export.export_tables)
+        measure("export_tables, gzip", rows, lambda exports_dir: export.export_tables(exports_dir, compress=True))
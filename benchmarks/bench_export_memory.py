@@ -0,0 +1,37 @@
+"""
+Peak Python memory while writing every contribution to CSV: the
+list from get_all_contributions() versus the streaming iter_contributions().
+Run from the repository root:
+
+    python benchmarks/bench_export_memory.py [rows]
+"""
+import csv
+import os
+import sys
+import tracemalloc
+
+from _common import temporary_database, timer
+from database import connection
+
+
+def export(rows_source, label: str, rows: int):
+    tracemalloc.start()
+    with timer(label, rows), open(os.devnull, "w", newline="") as f:
+        writer = csv.writer(f)
+        for c in rows_source():
+            writer.writerow([c.id, c.member_id, c.amount, c.contribution_type.value, c.contribution_date, c.month])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{'':<40} peak {peak / 1024 / 1024:>8.1f} MiB")
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with temporary_database():
+        member = connection.create_member("Benchmark Member")
+        for start in range(0, rows, 50000):
+            connection.bulk_record_contributions(
+                [(member.id, 100.0)] * min(50000, rows - start)
+            )
+        export(connection.get_all_contributions, "get_all_contributions", rows)
+        export(connection.iter_contributions, "iter_contributions", rows)
@@ -0,0 +1,48 @@
+"""
+Loading every contribution as detached ORM instances (the old read path)
+versus ContributionRow tuples from get_all_contributions(): rows/sec and
+Python memory held per row. Run from the repository root:
+
+    python benchmarks/bench_read_models.py [rows]
+"""
+import gc
+import sys
+import tracemalloc
+
+from _common import temporary_database, timer
+from database import connection
+from database.models import Contribution
+
+
+def orm_contributions():
+    with connection.session_scope() as session:
+        return session.query(Contribution).all()
+
+
+def measure(load, label: str, rows: int):
+    # Timed without tracemalloc, which slows allocation-heavy code several times over
+    gc.collect()
+    with timer(label, rows):
+        result = load()
+    assert len(result) == rows
+    del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{'':<40} {held / rows:>8.0f} bytes/row held, peak {peak / 1024 / 1024:>8.1f} MiB")
+    del result
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    with temporary_database():
+        member = connection.create_member("Benchmark Member")
+        for start in range(0, rows, 50000):
+            connection.bulk_record_contributions(
+                [(member.id, 100.0)] * min(50000, rows - start)
+            )
+        measure(orm_contributions, "ORM Contribution instances", rows)
+        measure(connection.get_all_contributions, "ContributionRow tuples", rows)
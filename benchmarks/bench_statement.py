@@ -0,0 +1,87 @@
+"""
+Statement of one member with a long history: get_member_statement() (SQL
+window sums, streamed) versus fetching contributions, loans and repayments
+separately and merging them in Python. Time to the first line, total time
+and peak Python memory. Run from the repository root:
+
+    python benchmarks/bench_statement.py [contributions]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from _common import temporary_database, timer
+from database import connection
+from database.models import Contribution, ContributionType
+
+
+def python_statement(member_id: int) -> list:
+    """The old way: three reads, then sort and accumulate in Python"""
+    entries = [(c.contribution_date, 3, c.id, c.amount, 0.0) for c in connection.get_contributions_by_member(member_id)]
+    for loan in connection.get_loans_by_member(member_id):
+        entries.append((loan.start_date, 1, loan.id, 0.0, loan.amount))
+        entries.append((loan.start_date, 2, loan.id, 0.0, loan.total_interest))
+        for r in connection.get_repayments_by_loan(loan.id):
+            entries.append((r.payment_date, 4, r.id, 0.0, -r.amount_paid))
+    entries.sort()
+    savings = owed = 0.0
+    lines = []
+    for entry_date, _, reference_id, savings_change, loan_change in entries:
+        savings += savings_change
+        owed += loan_change
+        lines.append((entry_date, reference_id, savings, owed))
+    return lines
+
+
+def first_line_ms(member_id: int) -> float:
+    start = time.perf_counter()
+    rows = connection.get_member_statement(member_id)
+    next(rows)
+    elapsed = (time.perf_counter() - start) * 1000
+    rows.close()
+    return elapsed
+
+
+def peak_mib(function) -> float:
+    gc.collect()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def stream_all(member_id: int) -> int:
+    return sum(1 for _ in connection.get_member_statement(member_id))
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with temporary_database():
+        member = connection.create_member("Long History")
+        start = datetime(2000, 1, 1)
+        with connection.session_scope() as session:
+            session.execute(insert(Contribution), [
+                {"member_id": member.id, "amount": 100.0, "contribution_type": ContributionType.MONTHLY,
+                 "contribution_date": start + timedelta(hours=i)}
+                for i in range(count)
+            ])
+        loans = [connection.create_loan(member.id, 10000, 12, term_months=12) for _ in range(200)]
+        connection.bulk_record_repayments([(loan.id, 500.0) for loan in loans for _ in range(12)])
+        connection.query_cache.clear()
+
+        with timer("Python merge of three reads", count):
+            expected = python_statement(member.id)
+        connection.query_cache.clear()
+        with timer("get_member_statement, streamed", count):
+            lines = stream_all(member.id)
+        assert lines == len(expected) + 1  # plus the opening balance
+        print(f"{'':<40} first line after {first_line_ms(member.id):.0f} ms, {lines:,} lines")
+
+        connection.query_cache.clear()
+        print(f"{'peak memory, Python merge':<40} {peak_mib(lambda: python_statement(member.id)):>10.1f} MiB")
+        print(f"{'peak memory, streamed':<40} {peak_mib(lambda: stream_all(member.id)):>10.1f} MiB")
@@ -0,0 +1,69 @@
+"""
+Year-end statements for every member: rendering them one after another in
+this process versus generate_statements() with 1, 2, 4 ... worker processes
+(up to the CPU count). Run from the repository root:
+
+    python benchmarks/bench_statement_batch.py [members] [contributions_per_member]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+from _common import temporary_database, timer
+from bench_amortization import add_loans
+from database import connection, statements
+from database.models import Contribution, ContributionType, Member
+
+
+def add_contributions(per_member: int):
+    rng = random.Random(3)
+    start = datetime(2024, 1, 1)
+    with connection.session_scope() as session:
+        member_ids = session.scalars(select(Member.id)).all()
+        session.execute(insert(Contribution), [
+            {"member_id": member_id, "amount": float(rng.randrange(100, 5000)),
+             "contribution_type": ContributionType.MONTHLY, "contribution_date": start + timedelta(days=7 * i)}
+            for member_id in member_ids
+            for i in range(per_member)
+        ])
+
+
+def render_in_process(output_dir: str):
+    """The old way: one member after another through the app's own session"""
+    for member in connection.get_all_members():
+        lines = connection.get_member_statement(member.id)
+        statements.write_statement(output_dir, member, lines, None, None, statements.FORMATS)
+
+
+if __name__ == "__main__":
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    per_member = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    cpus = os.cpu_count() or 1
+    with temporary_database() as engine:
+        add_loans(members * 2, members=members)
+        connection.rebuild_loan_schedules()
+        add_contributions(per_member)
+        url = engine.url.render_as_string(hide_password=False)
+        print(f"{members:,} members, {per_member} contributions and 2 loans each, {cpus} CPUs")
+
+        output_dir = tempfile.mkdtemp(prefix="lms-statements-")
+        try:
+            with timer("one process, member after member", members):
+                render_in_process(output_dir)
+            workers = 1
+            while workers <= max(cpus, 1):
+                shutil.rmtree(output_dir)
+                with timer(f"generate_statements, {workers} workers", members):
+                    run = statements.generate_statements(output_dir, workers=workers, url=url)
+                assert run.written == members and not run.failed
+                workers *= 2
+            with timer("generate_statements again (resumed)", members):
+                run = statements.generate_statements(output_dir, url=url)
+            assert run.skipped == members and run.written == 0
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
@@ -0,0 +1,52 @@
+"""
+Many clerks saving contributions at once: every thread committing its own
+writes directly versus all writes going through the group-commit write
+queue. Run from the repository root:
+
+    python benchmarks/bench_write_queue.py [clerks] [writes per clerk] [profile]
+"""
+import sys
+import threading
+
+from _common import temporary_database, timer
+from database import connection
+from database.write_queue import WriteQueue
+
+
+def run_clerks(clerks: int, writes: int, record) -> int:
+    """Run clerks threads each calling record() writes times; returns the failures"""
+    failures = []
+
+    def clerk():
+        for _ in range(writes):
+            if record() is None:
+                failures.append(1)
+
+    threads = [threading.Thread(target=clerk) for _ in range(clerks)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(failures)
+
+
+if __name__ == "__main__":
+    clerks = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    writes = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    profile = sys.argv[3] if len(sys.argv) > 3 else "desktop"
+    total = clerks * writes
+    with temporary_database(profile):
+        member_id = connection.create_member("Benchmark Member").id
+
+        with timer(f"direct, {clerks} clerks", total):
+            failed = run_clerks(clerks, writes, lambda: connection.record_contribution(member_id, 100.0))
+        print(f"{'':<40} {failed} failed writes")
+
+        queue = WriteQueue()
+        with timer(f"write queue, {clerks} clerks", total):
+            failed = run_clerks(
+                clerks, writes,
+                lambda: queue.submit(connection.record_contribution, member_id, 100.0).result(),
+            )
+        queue.stop()
+        print(f"{'':<40} {failed} failed writes, {queue.batches} commits")
@@ -0,0 +1,77 @@
+import asyncio
+import flet as ft
+from database.async_api import search_members
+
+# Wait this long after the last keystroke before searching
+SEARCH_DELAY = 0.25
+MAX_SUGGESTIONS = 8
+
+
+def create_member_picker(page: ft.Page, label: str = "Member", width: int = 400):
+    """
+    Creates a type-ahead member picker backed by search_members()
+
+    Typing searches members by name, contact or email once the user pauses
+    for SEARCH_DELAY seconds. Only the latest search is shown, and picking
+    a suggestion selects that member.
+
+    Args:
+        page: The page to refresh when suggestions change
+        label: Label of the search field
+        width: Width of the control
+
+    Returns:
+        (picker, selection) where selection["member_id"] is the picked
+        member's ID (None until one is picked) and selection["name"] its name
+    """
+    selection = {"member_id": None, "name": None}
+    # Incremented on every keystroke; a search only shows results if it is still the latest
+    searches = {"latest": 0}
+
+    search_field = ft.TextField(
+        label=label,
+        hint_text="Type a name, phone number or email",
+        prefix_icon=ft.Icons.SEARCH,
+        width=width,
+    )
+    suggestions = ft.Column(controls=[], spacing=0, visible=False, width=width)
+
+    def pick(member):
+        selection["member_id"] = member.id
+        selection["name"] = member.name
+        search_field.value = member.name
+        suggestions.controls = []
+        suggestions.visible = False
+        page.update()
+
+    def create_suggestion(member):
+        details = " | ".join(value for value in (member.contact, member.email) if value)
+        return ft.ListTile(
+            title=ft.Text(member.name),
+            subtitle=ft.Text(details, size=11, color=ft.Colors.GREY) if details else None,
+            dense=True,
+            on_click=lambda e, m=member: pick(m),
+        )
+
+    async def search(number: int, text: str):
+        await asyncio.sleep(SEARCH_DELAY)
+        if number != searches["latest"]:
+            return  # Superseded by a later keystroke
+        members = await search_members(text, MAX_SUGGESTIONS) if text.strip() else []
+        if number != searches["latest"]:
+            return
+        suggestions.controls = [create_suggestion(member) for member in members]
+        suggestions.visible = bool(members)
+        page.update()
+
+    def on_change(e):
+        # Editing the text clears the previous pick until a suggestion is chosen again
+        selection["member_id"] = None
+        selection["name"] = None
+        searches["latest"] += 1
+        page.run_task(search, searches["latest"], search_field.value or "")
+
+    search_field.on_change = on_change
+
+    picker = ft.Column(controls=[search_field, suggestions], spacing=2, width=width)
+    return picker, selection
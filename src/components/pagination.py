@@ -0,0 +1,41 @@
+import flet as ft
+
+
+def create_pagination_bar(on_previous, on_next):
+    """
+    Creates previous/next controls for a keyset-paginated table
+    
+    Args:
+        on_previous: Callback to load the previous page
+        on_next: Callback to load the next page
+    
+    Returns:
+        (bar, sync) where sync(page, number) updates the buttons and label
+        for a database.connection.Page that is shown as page `number`
+    """
+    previous_button = ft.IconButton(
+        ft.Icons.CHEVRON_LEFT,
+        tooltip="Previous page",
+        on_click=lambda e: on_previous(),
+        disabled=True,
+    )
+    next_button = ft.IconButton(
+        ft.Icons.CHEVRON_RIGHT,
+        tooltip="Next page",
+        on_click=lambda e: on_next(),
+        disabled=True,
+    )
+    label = ft.Text("Page 1", size=12, color=ft.Colors.GREY)
+    
+    def sync(page, number):
+        previous_button.disabled = page.prev_cursor is None
+        next_button.disabled = page.next_cursor is None
+        label.value = f"Page {number}"
+    
+    bar = ft.Row(
+        controls=[previous_button, label, next_button],
+        spacing=5,
+        alignment=ft.MainAxisAlignment.END,
+    )
+    
+    return bar, sync
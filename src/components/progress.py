@@ -0,0 +1,32 @@
+import flet as ft
+from contextlib import asynccontextmanager
+
+
+def create_progress_bar(page: ft.Page):
+    """
+    Creates a progress bar shown while database calls run in the background
+
+    Args:
+        page: The page to refresh when the bar is shown or hidden
+
+    Returns:
+        (bar, busy) where `async with busy():` shows the bar for the
+        duration of the block; overlapping blocks keep it visible until
+        the last one finishes
+    """
+    bar = ft.ProgressBar(visible=False, color=ft.Colors.BLUE_200, bgcolor="#2a2a2a")
+    pending = {"count": 0}
+
+    @asynccontextmanager
+    async def busy():
+        pending["count"] += 1
+        bar.visible = True
+        page.update()
+        try:
+            yield
+        finally:
+            pending["count"] -= 1
+            bar.visible = pending["count"] > 0
+            page.update()
+
+    return bar, busy
@@ -0,0 +1,133 @@
+"""
+Database maintenance commands
+
+Run from the src directory:
+
+    python -m database rebuild-balances
+    python -m database rebuild-rollups
+    python -m database rebuild-schedules [--loan ID ...]
+    python -m database refresh-arrears
+    python -m database accrue [--date YYYY-MM-DD] [--time-budget SECONDS] [--default-after DAYS]
+    python -m database statements OUTPUT_DIR [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--format html|csv]
+"""
+import argparse
+import sys
+from datetime import date, datetime
+
+from .connection import (
+    get_portfolio_at_risk, init_db, rebuild_loan_schedules, rebuild_member_balances, rebuild_monthly_rollups,
+    refresh_loan_arrears, run_accrual,
+)
+from .accrual import CHUNK_SIZE, DEFAULT_AFTER_DAYS
+from .models import MemberStatus
+from .statements import FORMATS, generate_statements
+
+
+def _rebuild_balances(args) -> int:
+    report = rebuild_member_balances()
+    print(f"✓ Rebuilt balances for {report['members']} members")
+    for member_id, field, stored, actual in report["drift"]:
+        print(f"  drift: member {member_id} {field}: stored={stored} actual={actual}")
+    if report["drift"]:
+        print(f"✗ {len(report['drift'])} drifted values corrected")
+    return 1 if report["drift"] else 0
+
+
+def _rebuild_rollups(args) -> int:
+    rows = rebuild_monthly_rollups()
+    print(f"✓ Rebuilt {rows} monthly rollup rows")
+    return 0
+
+
+def _rebuild_schedules(args) -> int:
+    loans = rebuild_loan_schedules(args.loan)
+    print(f"✓ Rebuilt installment schedules for {loans} loans")
+    return 0
+
+
+def _refresh_arrears(args) -> int:
+    loans = refresh_loan_arrears()
+    portfolio = get_portfolio_at_risk()
+    print(f"✓ Refreshed arrears for {loans} loans")
+    for bucket in portfolio.buckets:
+        print(f"  {bucket.bucket:>8}: {bucket.loans} loans, outstanding {bucket.outstanding:.2f}, arrears {bucket.arrears_amount:.2f}")
+    print(f"  PAR 30 {portfolio.par_30:.1%}  PAR 60 {portfolio.par_60:.1%}  PAR 90 {portfolio.par_90:.1%}")
+    return 0
+
+
+def _accrue(args) -> int:
+    run = run_accrual(args.date, args.time_budget, args.chunk_size, args.default_after)
+    print(f"✓ Accrual for {run.run_key}: {run.processed} loans in {run.chunks} chunks, "
+          f"{run.defaulted} defaulted ({run.elapsed:.1f}s)")
+    if not run.finished:
+        print("  not finished; run again to resume from the checkpoint")
+    return 0 if run.finished else 2
+
+
+def _statements(args) -> int:
+    def report(done: int, total: int):
+        print(f"  {done}/{total} members", end="\r", flush=True)
+
+    run = generate_statements(
+        args.output,
+        datetime.combine(args.start, datetime.min.time()) if args.start else None,
+        datetime.combine(args.end, datetime.min.time()) if args.end else None,
+        args.format or FORMATS,
+        args.member,
+        args.status,
+        args.workers,
+        progress=report,
+    )
+    print(f"\n✓ Statements for {run.written} of {run.members} members in {run.output_dir} ({run.elapsed:.1f}s)")
+    if run.skipped:
+        print(f"  {run.skipped} members already done by an earlier run of this period")
+    if run.failed:
+        print(f"✗ {len(run.failed)} members failed; run again to retry them")
+    return 2 if run.failed else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m database", description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild-balances", help="Recompute member_balances and report drift")
+    rebuild.set_defaults(handler=_rebuild_balances)
+
+    rollups = commands.add_parser("rebuild-rollups", help="Recompute monthly_rollups")
+    rollups.set_defaults(handler=_rebuild_rollups)
+
+    schedules = commands.add_parser("rebuild-schedules", help="Regenerate loan installment schedules")
+    schedules.add_argument("--loan", type=int, action="append",
+                           help="Loan ID to reschedule (repeatable; default: every pending and active loan)")
+    schedules.set_defaults(handler=_rebuild_schedules)
+
+    arrears = commands.add_parser("refresh-arrears", help="Recompute loan arrears aging and portfolio at risk")
+    arrears.set_defaults(handler=_refresh_arrears)
+
+    accrue = commands.add_parser("accrue", help="Accrue interest and default overdue loans (resumable)")
+    accrue.add_argument("--date", type=date.fromisoformat, help="Period to process (default: today)")
+    accrue.add_argument("--time-budget", type=float, help="Stop after this many seconds; the next run resumes")
+    accrue.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Loans per transaction")
+    accrue.add_argument("--default-after", type=int, default=DEFAULT_AFTER_DAYS,
+                        help="Days past due after which an active loan is marked Defaulted")
+    accrue.set_defaults(handler=_accrue)
+
+    statements = commands.add_parser("statements", help="Render member statements to HTML/CSV files (resumable)")
+    statements.add_argument("output", help="Directory for the statement files")
+    statements.add_argument("--start", type=date.fromisoformat, help="First day of the period (default: the beginning)")
+    statements.add_argument("--end", type=date.fromisoformat, help="Day after the period (default: today)")
+    statements.add_argument("--format", choices=FORMATS, action="append",
+                            help="File format (repeatable; default: html and csv)")
+    statements.add_argument("--member", type=int, action="append", help="Member ID (repeatable; default: every member)")
+    statements.add_argument("--status", choices=[status.value for status in MemberStatus],
+                            help="Only members with this status")
+    statements.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    statements.set_defaults(handler=_statements)
+
+    args = parser.parse_args(argv)
+    init_db()
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
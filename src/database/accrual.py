@@ -0,0 +1,151 @@
+"""
+Interest accrual and auto-default batch job
+
+A run processes every active loan for one period (a calendar day):
+
+    accrued_interest  the interest of every installment due by the end of
+                      the period, so accruing the same period twice
+                      changes nothing. Loans without a term accrue their
+                      flat charge day by day from start_date to end_date.
+    days past due     refreshed in loan_arrears (see arrears.py)
+    Defaulted         active loans more than default_after_days past due
+
+Loans with neither a term nor an end date have no due date to measure
+against: they are counted as processed but their accrual is left as it
+was, and they are never defaulted.
+
+Loans are taken in primary-key order, chunk_size at a time. Each chunk
+commits in its own short transaction, together with a checkpoint row in
+batch_checkpoints that records the last loan ID done. A run that crashes
+or runs out of its time budget resumes after that ID the next time it is
+started for the same period. Between chunks the job pauses with the
+write lock released, so clerks saving payments wait about one chunk.
+
+Run it daily (cron, Task Scheduler) from the src directory:
+
+    python -m database accrue [--time-budget SECONDS] [--default-after DAYS]
+
+The functions here take a SQLAlchemy Connection; connection.run_accrual()
+drives the chunks.
+"""
+import os
+from datetime import date, datetime, time
+from sqlalchemy import DateTime, Float, case, cast, func, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from . import arrears
+from .models import BatchCheckpoint, Loan, LoanArrears, LoanInstallment, LoanStatus
+
+
+JOB_NAME = "accrual"
+
+# Active loans more than this many days past due are marked Defaulted
+DEFAULT_AFTER_DAYS = int(os.environ.get("LMS_DEFAULT_AFTER_DAYS", "90"))
+
+# Loans per transaction; small enough that interactive writes never wait long
+CHUNK_SIZE = 500
+
+# Seconds to sleep between chunks. SQLite does not queue waiting writers: one
+# that is backing off in busy_timeout only gets the lock if it is still free
+# when it wakes, so the job has to leave gaps longer than that back-off.
+CHUNK_PAUSE = 0.05
+
+
+def period_end(day: date) -> datetime:
+    """The accrual cut-off for a period: the last moment of that day"""
+    return datetime.combine(day, time.max)
+
+
+# ==================== CHECKPOINTS ====================
+
+def load_checkpoint(conn, run_key: str) -> int:
+    """
+    Start or resume the run for run_key
+
+    Returns:
+        The last loan ID already processed (0 for a new run), or None if
+        the run for run_key has already finished
+    """
+    checkpoint = conn.execute(select(BatchCheckpoint).where(BatchCheckpoint.job == JOB_NAME)).first()
+    if checkpoint is not None and checkpoint.run_key == run_key:
+        return None if checkpoint.finished_at is not None else checkpoint.last_id
+
+    # First run ever, or a new period: any unfinished older run is superseded,
+    # since accrual recomputes totals instead of adding to them
+    table = BatchCheckpoint.__table__
+    insert = postgresql.insert(table) if conn.dialect.name == "postgresql" else sqlite.insert(table)
+    now = datetime.now()
+    values = {"run_key": run_key, "last_id": 0, "processed": 0, "started_at": now, "updated_at": now, "finished_at": None}
+    conn.execute(
+        insert.values(job=JOB_NAME, **values).on_conflict_do_update(index_elements=[table.c.job], set_=values)
+    )
+    return 0
+
+
+def save_checkpoint(conn, last_id: int, processed: int, finished: bool = False):
+    """Record progress in the same transaction as the chunk it covers"""
+    now = datetime.now()
+    conn.execute(
+        update(BatchCheckpoint)
+        .where(BatchCheckpoint.job == JOB_NAME)
+        .values(
+            last_id=last_id,
+            processed=BatchCheckpoint.processed + processed,
+            updated_at=now,
+            finished_at=now if finished else None,
+        )
+    )
+
+
+# ==================== CHUNK PROCESSING ====================
+
+def next_chunk(conn, after_id: int, chunk_size: int) -> list:
+    """(id, member_id) of the next chunk_size active loans after after_id"""
+    return conn.execute(
+        select(Loan.id, Loan.member_id)
+        .where(Loan.status == LoanStatus.ACTIVE, Loan.id > after_id)
+        .order_by(Loan.id)
+        .limit(chunk_size)
+    ).all()
+
+
+def process_chunk(conn, loan_ids: list, as_of: datetime, default_after_days: int) -> list:
+    """
+    Accrue interest and apply auto-default to one chunk of active loans
+
+    Returns:
+        IDs of the loans that were marked Defaulted
+    """
+    due_interest = (
+        select(func.coalesce(func.sum(LoanInstallment.interest), 0.0))
+        .where(LoanInstallment.loan_id == Loan.id, LoanInstallment.due_date <= as_of)
+        .scalar_subquery()
+    )
+    # Without a term, the flat charge accrues evenly over the loan's days
+    elapsed = arrears.days_between(conn, literal(as_of, DateTime), Loan.start_date)
+    term_days = arrears.days_between(conn, Loan.end_date, Loan.start_date)
+    daily_interest = case(
+        (elapsed >= term_days, Loan.total_interest),
+        (elapsed <= 0, 0.0),
+        else_=Loan.total_interest * cast(elapsed, Float) / term_days,
+    )
+    conn.execute(
+        update(Loan)
+        .where(Loan.id.in_(loan_ids), Loan.term_months.is_not(None) | Loan.end_date.is_not(None))
+        .values(
+            accrued_interest=case((Loan.term_months.is_(None), daily_interest), else_=due_interest),
+            accrued_through=as_of,
+        )
+    )
+
+    arrears.refresh_loan_arrears(conn, loan_ids, as_of=as_of)
+    defaulted = conn.execute(
+        select(LoanArrears.loan_id)
+        .where(LoanArrears.loan_id.in_(loan_ids), LoanArrears.days_past_due > default_after_days)
+    ).scalars().all()
+    if defaulted:
+        conn.execute(
+            update(Loan)
+            .where(Loan.id.in_(defaulted), Loan.status == LoanStatus.ACTIVE)
+            .values(status=LoanStatus.DEFAULTED, updated_at=datetime.now())
+        )
+    return defaulted
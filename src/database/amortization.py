@@ -0,0 +1,239 @@
+"""
+Loan amortization schedules
+
+A loan with term_months set is repaid in that many monthly installments,
+due on the start date's day of the month (or the month's last day if it
+is shorter). interest_rate is then a yearly percentage:
+
+    Flat              interest = amount * rate/100 * term/12, spread evenly;
+                      every installment repays the same principal
+    Reducing balance  each installment pays rate/12 on the principal still
+                      owed; installments are equal (annuity), so the
+                      principal share grows as the balance falls
+
+Loans without a term keep the original single flat charge of
+amount * rate/100 and have no schedule.
+
+build_schedules() computes the schedules of any number of loans at once
+with NumPy: every installment of every loan is one element of flat arrays,
+so there is no Python loop per loan or per month. Amounts are rounded to
+cents, and the last installment absorbs the rounding so principal always
+adds up to the loan amount. The write functions take a SQLAlchemy
+Connection so schedules are written in the same transaction as the loan.
+"""
+from typing import NamedTuple
+import numpy as np
+from sqlalchemy import bindparam, delete, insert, select, update
+from .models import InterestMethod, Loan, LoanInstallment, LoanStatus
+
+
+# Loans scheduled per round by rebuild_schedules(); bounds the size of the arrays
+SCHEDULE_CHUNK_SIZE = 10000
+
+# Loan IDs per DELETE ... IN (...), below SQLite's bound-parameter limit
+_ID_CHUNK_SIZE = 900
+
+_ONE_DAY = np.timedelta64(1, "D")
+
+
+class Schedules(NamedTuple):
+    """Installments of one or more loans as parallel arrays, grouped by loan in number order"""
+    loan_id: np.ndarray
+    number: np.ndarray
+    due_date: np.ndarray  # datetime64[us]
+    principal: np.ndarray
+    interest: np.ndarray
+    amount_due: np.ndarray
+    balance: np.ndarray
+    total_interest: np.ndarray  # one value per input loan
+
+
+def _fix_last(values: np.ndarray, totals: np.ndarray, starts: np.ndarray, terms: np.ndarray) -> np.ndarray:
+    """Adjust the last installment of each loan so that values add up to totals"""
+    last = starts + terms - 1
+    values[last] += totals - np.add.reduceat(values, starts)
+    return np.round(values, 2)
+
+
+def _due_dates(start_dates: np.ndarray, terms: np.ndarray, number: np.ndarray) -> np.ndarray:
+    """Monthly due dates: number months after each start date, clamped to the end of short months"""
+    start_month = start_dates.astype("datetime64[M]")
+    into_month = start_dates - start_month.astype(start_dates.dtype)
+    day = into_month // _ONE_DAY
+    time_of_day = into_month - day * _ONE_DAY
+
+    month = np.repeat(start_month, terms) + number
+    days_in_month = ((month + 1).astype("datetime64[D]") - month.astype("datetime64[D]")) // _ONE_DAY
+    day = np.minimum(np.repeat(day, terms), days_in_month - 1)
+    return month.astype(start_dates.dtype) + day * _ONE_DAY + np.repeat(time_of_day, terms)
+
+
+def add_months(start_date, months: int):
+    """The date months after start_date, as used for due dates"""
+    start = np.asarray([start_date], dtype="datetime64[us]")
+    return _due_dates(start, np.ones(1, dtype=np.int64), np.asarray([months])).tolist()[0]
+
+
+def build_schedules(loan_ids, amounts, interest_rates, terms, reducing, start_dates) -> Schedules:
+    """
+    Build the installment schedules of many loans at once
+
+    Args:
+        loan_ids: Loan IDs
+        amounts: Principal of each loan
+        interest_rates: Yearly interest rate of each loan in percent
+        terms: Number of monthly installments of each loan (at least 1)
+        reducing: True for reducing-balance loans, False for flat ones
+        start_dates: Start date of each loan (datetimes or datetime64)
+
+    Returns:
+        Schedules with one array element per installment
+    """
+    loan_ids = np.asarray(loan_ids, dtype=np.int64)
+    amounts = np.round(np.asarray(amounts, dtype=np.float64), 2)
+    monthly_rates = np.asarray(interest_rates, dtype=np.float64) / 1200
+    terms = np.asarray(terms, dtype=np.int64)
+    reducing = np.asarray(reducing, dtype=bool)
+    start_dates = np.asarray(start_dates, dtype="datetime64[us]")
+    if np.any(terms < 1):
+        raise ValueError("Loan term must be at least one month")
+
+    # One element per installment: which loan it belongs to and its number (1-based)
+    starts = np.cumsum(terms) - terms
+    loan = np.repeat(np.arange(len(terms)), terms)
+    number = np.arange(len(loan)) - starts[loan] + 1
+
+    principal_owed = amounts[loan]
+    rate = monthly_rates[loan]
+    term = terms[loan]
+
+    # Reducing balance: fixed payment P*i/(1-(1+i)^-n); the balance before installment k
+    # is P*(1+i)^(k-1) - payment*((1+i)^(k-1)-1)/i (and P - payment*(k-1) when i is 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = (1 + rate) ** (number - 1)
+        payment = np.where(rate > 0, principal_owed * rate / (1 - (1 + rate) ** -term), principal_owed / term)
+        balance_before = np.where(
+            rate > 0,
+            principal_owed * growth - payment * (growth - 1) / rate,
+            principal_owed - payment * (number - 1),
+        )
+    reducing_interest = balance_before * rate
+
+    # Flat: the whole interest is charged up front and spread evenly, like the principal
+    flat_totals = np.round(amounts * monthly_rates * terms, 2)
+    flat_interest = flat_totals[loan] / term
+    flat_principal = principal_owed / term
+
+    is_reducing = reducing[loan]
+    interest = np.round(np.where(is_reducing, reducing_interest, flat_interest), 2)
+    # The rounded payment less the rounded interest, so reducing-balance installments stay equal to the cent
+    principal = np.round(np.where(is_reducing, np.round(payment, 2) - interest, flat_principal), 2)
+    if len(loan):
+        principal = _fix_last(principal, amounts, starts, terms)
+        flat_rows = ~is_reducing
+        interest = np.where(flat_rows, _fix_last(interest.copy(), flat_totals, starts, terms), interest)
+        total_interest = np.round(np.add.reduceat(interest, starts), 2)
+        repaid = np.cumsum(principal)
+        repaid -= np.repeat(repaid[starts] - principal[starts], terms)
+    else:
+        total_interest = np.zeros(0)
+        repaid = principal
+
+    return Schedules(
+        loan_id=loan_ids[loan],
+        number=number,
+        due_date=_due_dates(start_dates, terms, number),
+        principal=principal,
+        interest=interest,
+        amount_due=np.round(principal + interest, 2),
+        balance=np.round(principal_owed - repaid, 2) + 0.0,  # + 0.0 turns -0.0 into 0.0
+        total_interest=total_interest,
+    )
+
+
+# ==================== PERSISTENCE ====================
+
+_SCHEDULE_COLUMNS = (
+    Loan.id, Loan.amount, Loan.interest_rate, Loan.term_months, Loan.interest_method, Loan.start_date,
+)
+
+
+_store_total_interest = (
+    update(Loan.__table__)
+    .where(Loan.__table__.c.id == bindparam("loan_pk"))
+    .values(total_interest=bindparam("new_total_interest"))
+)
+
+
+def _schedule_loans(loans: list) -> Schedules:
+    """build_schedules() for (id, amount, interest_rate, term_months, interest_method, start_date) rows"""
+    ids, amounts, rates, terms, methods, starts = zip(*loans)
+    reducing = [method == InterestMethod.REDUCING_BALANCE for method in methods]
+    return build_schedules(ids, amounts, rates, terms, reducing, starts)
+
+
+_INSTALLMENT_COLUMNS = ("loan_id", "number", "due_date", "principal", "interest", "amount_due", "balance")
+
+
+def _insert_installments(conn, schedules: Schedules):
+    """Insert the installments of built schedules"""
+    if conn.dialect.name == "sqlite":
+        # Per-row parameter processing dominates a Core executemany of a million rows, so
+        # hand SQLite plain tuples, with due dates already in SQLAlchemy's DateTime text format
+        due_dates = np.char.replace(np.datetime_as_string(schedules.due_date, unit="us"), "T", " ")
+        columns = [getattr(schedules, name).tolist() for name in _INSTALLMENT_COLUMNS]
+        columns[2] = due_dates.tolist()
+        conn.exec_driver_sql(
+            f"INSERT INTO loan_installments ({', '.join(_INSTALLMENT_COLUMNS)}) VALUES ({', '.join('?' * 7)})",
+            list(zip(*columns)),
+        )
+        return
+    rows = zip(*(getattr(schedules, name).tolist() for name in _INSTALLMENT_COLUMNS))
+    conn.execute(insert(LoanInstallment), [dict(zip(_INSTALLMENT_COLUMNS, row)) for row in rows])
+
+
+def write_schedules(conn, loans: list) -> dict:
+    """
+    Replace the installments of the given loans and store their total interest
+
+    Args:
+        loans: (id, amount, interest_rate, term_months, interest_method, start_date)
+            rows of loans that have a term
+
+    Returns:
+        {loan_id: total_interest}
+    """
+    loan_ids = [loan[0] for loan in loans]
+    for i in range(0, len(loan_ids), _ID_CHUNK_SIZE):
+        conn.execute(delete(LoanInstallment).where(LoanInstallment.loan_id.in_(loan_ids[i:i + _ID_CHUNK_SIZE])))
+    if not loans:
+        return {}
+
+    schedules = _schedule_loans(loans)
+    _insert_installments(conn, schedules)
+
+    totals = dict(zip(loan_ids, schedules.total_interest.tolist()))
+    conn.execute(
+        _store_total_interest,
+        [{"loan_pk": loan_id, "new_total_interest": total} for loan_id, total in totals.items()],
+    )
+    return totals
+
+
+def rebuild_schedules(conn, loan_ids=None) -> int:
+    """
+    Regenerate the schedules of the given loans, or of every pending and active loan
+
+    Loans without a term are skipped. Returns the number of loans scheduled.
+    """
+    query = select(*_SCHEDULE_COLUMNS).where(Loan.term_months.is_not(None)).order_by(Loan.id)
+    if loan_ids is None:
+        query = query.where(Loan.status.in_([LoanStatus.PENDING, LoanStatus.ACTIVE]))
+    else:
+        query = query.where(Loan.id.in_(list(loan_ids)))
+
+    # Read the (small) loan rows up front; the writes below change the loans table
+    loans = [tuple(loan) for loan in conn.execute(query)]
+    for i in range(0, len(loans), SCHEDULE_CHUNK_SIZE):
+        write_schedules(conn, loans[i:i + SCHEDULE_CHUNK_SIZE])
+    return len(loans)
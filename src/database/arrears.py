@@ -0,0 +1,166 @@
+"""
+Arrears aging and portfolio at risk
+
+For every disbursed (Active or Defaulted) loan with an installment schedule
+(see amortization.py), the loan_arrears table holds the loan's position at
+the last refresh:
+
+    arrears_amount  installments due by then minus everything repaid
+    days_past_due   days since the oldest installment that the repayments
+                    do not cover fell due (0 when the loan is up to date)
+    bucket          days_past_due as an aging bucket (BUCKETS)
+    outstanding     the scheduled total still owed
+
+Loans without a term (those from before schedules existed) are treated as
+a single installment of the amount plus the flat charge, due on end_date.
+Loans with neither a term nor an end date are never in arrears.
+
+refresh_loan_arrears() computes all of this in one INSERT ... SELECT: a
+running SUM() OVER the installments of each loan, compared with the
+loan's repayment total, finds the oldest unpaid installment. No loan or
+repayment is loaded into Python. Repayments refresh only the loans they
+touch. Days past due grow every day without any write, so the full
+refresh runs again once the snapshot is from an earlier day.
+
+Every function takes a SQLAlchemy Connection, like summaries.py.
+"""
+from datetime import datetime
+from sqlalchemy import Date, DateTime, Integer, case, cast, delete, func, insert, literal, select, union_all
+from .models import Loan, LoanArrears, LoanInstallment, LoanRepayment, LoanStatus
+
+
+BUCKET_CURRENT = "Current"
+
+# (bucket, first day past due, last day past due or None) in aging order
+BUCKETS = [
+    (BUCKET_CURRENT, 0, 0),
+    ("1-30", 1, 30),
+    ("31-60", 31, 60),
+    ("61-90", 61, 90),
+    ("90+", 91, None),
+]
+
+# Unpaid amounts below this (rounding left-overs) do not make an installment overdue
+_TOLERANCE = 0.005
+
+# Loan IDs per refresh statement, below SQLite's bound-parameter limit
+_ID_CHUNK_SIZE = 900
+
+
+def days_between(conn, later, earlier):
+    """SQL expression for the whole days from earlier's date to later's date"""
+    if conn.dialect.name == "postgresql":
+        return cast(later, Date) - cast(earlier, Date)
+    return cast(func.julianday(func.date(later)) - func.julianday(func.date(earlier)), Integer)
+
+
+def _arrears_rows(conn, as_of: datetime, loan_ids=None):
+    """SELECT of the loan_arrears rows of disbursed loans with a due date, as of as_of"""
+    as_of = literal(as_of, DateTime)
+    # Pending loans have not been paid out, so nothing is owed on them yet
+    disbursed = Loan.status.in_((LoanStatus.ACTIVE, LoanStatus.DEFAULTED))
+
+    scheduled = (
+        select(
+            LoanInstallment.loan_id,
+            LoanInstallment.due_date,
+            LoanInstallment.amount_due,
+            func.sum(LoanInstallment.amount_due).over(
+                partition_by=LoanInstallment.loan_id, order_by=LoanInstallment.number,
+            ).label("cumulative_due"),
+        )
+        .join(Loan, Loan.id == LoanInstallment.loan_id)
+        .where(disbursed)
+    )
+    # A loan without a term is owed in full on its end date
+    bullet = (
+        select(
+            Loan.id.label("loan_id"),
+            Loan.end_date.label("due_date"),
+            (Loan.amount + Loan.total_interest).label("amount_due"),
+            (Loan.amount + Loan.total_interest).label("cumulative_due"),
+        )
+        .where(disbursed, Loan.term_months.is_(None), Loan.end_date.is_not(None))
+    )
+    paid = select(LoanRepayment.loan_id, func.sum(LoanRepayment.amount_paid).label("paid")).group_by(LoanRepayment.loan_id)
+    if loan_ids is not None:
+        scheduled = scheduled.where(LoanInstallment.loan_id.in_(loan_ids))
+        bullet = bullet.where(Loan.id.in_(loan_ids))
+        paid = paid.where(LoanRepayment.loan_id.in_(loan_ids))
+    scheduled = union_all(scheduled, bullet).subquery()
+    paid = paid.subquery()
+
+    # One row per loan: what fell due, what was paid and the oldest installment not covered
+    paid_amount = func.coalesce(func.max(paid.c.paid), 0.0)
+    is_due = scheduled.c.due_date <= as_of
+    positions = (
+        select(
+            scheduled.c.loan_id,
+            func.sum(case((is_due, scheduled.c.amount_due), else_=0.0)).label("expected"),
+            func.sum(scheduled.c.amount_due).label("scheduled_total"),
+            paid_amount.label("paid"),
+            func.min(case(
+                (is_due & (scheduled.c.cumulative_due > func.coalesce(paid.c.paid, 0.0) + _TOLERANCE),
+                 scheduled.c.due_date),
+            )).label("oldest_unpaid"),
+        )
+        .select_from(scheduled)
+        .outerjoin(paid, paid.c.loan_id == scheduled.c.loan_id)
+        .group_by(scheduled.c.loan_id)
+        .subquery()
+    )
+
+    days_past_due = case(
+        (positions.c.oldest_unpaid.is_(None), 0),
+        else_=days_between(conn, as_of, positions.c.oldest_unpaid),
+    )
+    aged = (
+        select(
+            positions.c.loan_id,
+            Loan.member_id,
+            days_past_due.label("days_past_due"),
+            (positions.c.expected - positions.c.paid).label("arrears_amount"),
+            (positions.c.scheduled_total - positions.c.paid).label("outstanding"),
+        )
+        .join(Loan, Loan.id == positions.c.loan_id)
+        .subquery()
+    )
+
+    bucket = case(
+        *[(aged.c.days_past_due <= last, name) for name, _, last in BUCKETS if last is not None],
+        else_=BUCKETS[-1][0],
+    )
+    return select(
+        aged.c.loan_id,
+        aged.c.member_id,
+        as_of,
+        aged.c.days_past_due,
+        bucket,
+        case((aged.c.arrears_amount > _TOLERANCE, aged.c.arrears_amount), else_=0.0),
+        case((aged.c.outstanding > 0, aged.c.outstanding), else_=0.0),
+    )
+
+
+_COLUMNS = ["loan_id", "member_id", "as_of", "days_past_due", "bucket", "arrears_amount", "outstanding"]
+
+
+def refresh_loan_arrears(conn, loan_ids=None, as_of: datetime = None) -> int:
+    """
+    Recompute loan_arrears for the given loans, or for every loan
+
+    Loans that are pending, paid or deleted, or have neither a schedule nor
+    an end date, lose their row.
+    Returns the number of rows written.
+    """
+    as_of = as_of or datetime.now()
+    if loan_ids is None:
+        conn.execute(delete(LoanArrears))
+        return conn.execute(insert(LoanArrears).from_select(_COLUMNS, _arrears_rows(conn, as_of))).rowcount
+
+    loan_ids = sorted(set(loan_ids))
+    written = 0
+    for start in range(0, len(loan_ids), _ID_CHUNK_SIZE):
+        chunk = loan_ids[start:start + _ID_CHUNK_SIZE]
+        conn.execute(delete(LoanArrears).where(LoanArrears.loan_id.in_(chunk)))
+        written += conn.execute(insert(LoanArrears).from_select(_COLUMNS, _arrears_rows(conn, as_of, chunk))).rowcount
+    return written
@@ -0,0 +1,132 @@
+"""
+Awaitable versions of the data-access functions
+
+Flet runs async event handlers on its asyncio event loop. A blocking call into
+connection.py from there freezes the window until the call returns. In web
+mode it freezes that user's session instead. The functions here make the
+same calls off the event loop and can be awaited:
+
+    async def create_new_loan():
+        async with busy():
+            await create_loan(member_id, amount, interest_rate)
+
+Reads run on a bounded thread pool. Writes go through the write queue
+(write_queue.py), which group-commits writes that arrive together. Each
+call runs outside any unit_of_work() the caller has open. To run several
+calls in one transaction, put them in a function and pass it to run(), or
+to write_queue.submit() if it writes.
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from . import connection, export
+from .write_queue import write_queue
+
+
+# Number of threads running reads; each has its own pooled connection
+DB_WORKERS = int(os.environ.get("LMS_DB_WORKERS", "4"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Create the worker pool on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="lms-db")
+        return _executor
+
+
+async def run(function, *args, **kwargs):
+    """Run any blocking function on the database pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(function, *args, **kwargs))
+
+
+def shutdown(wait: bool = True):
+    """Stop the worker pool (a later call starts a new one)"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def _awaitable(function):
+    """Wrap a blocking data-access function as a coroutine function"""
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        return await run(function, *args, **kwargs)
+    return wrapper
+
+
+def _queued(function):
+    """Wrap a write function as a coroutine function that runs it on the write queue"""
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.wrap_future(write_queue.submit(function, *args, **kwargs))
+    return wrapper
+
+
+# ==================== MEMBER OPERATIONS ====================
+
+create_member = _queued(connection.create_member)
+get_all_members = _awaitable(connection.get_all_members)
+get_member_by_id = _awaitable(connection.get_member_by_id)
+search_members = _awaitable(connection.search_members)
+update_member = _queued(connection.update_member)
+delete_member = _queued(connection.delete_member)
+
+# ==================== LOAN OPERATIONS ====================
+
+create_loan = _queued(connection.create_loan)
+get_all_loans = _awaitable(connection.get_all_loans)
+get_loans_by_member = _awaitable(connection.get_loans_by_member)
+get_loan_by_id = _awaitable(connection.get_loan_by_id)
+update_loan = _queued(connection.update_loan)
+delete_loan = _queued(connection.delete_loan)
+get_active_loans = _awaitable(connection.get_active_loans)
+get_loan_schedule = _awaitable(connection.get_loan_schedule)
+rebuild_loan_schedules = _queued(connection.rebuild_loan_schedules)
+
+# ==================== LOAN REPAYMENT OPERATIONS ====================
+
+record_repayment = _queued(connection.record_repayment)
+bulk_record_repayments = _queued(connection.bulk_record_repayments)
+get_repayments_by_loan = _awaitable(connection.get_repayments_by_loan)
+
+# ==================== CONTRIBUTION OPERATIONS ====================
+
+record_contribution = _queued(connection.record_contribution)
+bulk_record_contributions = _queued(connection.bulk_record_contributions)
+get_all_contributions = _awaitable(connection.get_all_contributions)
+get_contributions_by_member = _awaitable(connection.get_contributions_by_member)
+get_contributions_by_month = _awaitable(connection.get_contributions_by_month)
+delete_contribution = _queued(connection.delete_contribution)
+
+# ==================== PAGINATED QUERIES ====================
+
+get_members_page = _awaitable(connection.get_members_page)
+get_loans_page = _awaitable(connection.get_loans_page)
+get_contributions_page = _awaitable(connection.get_contributions_page)
+get_repayments_page = _awaitable(connection.get_repayments_page)
+
+# ==================== SUMMARIES AND STATISTICS ====================
+
+get_member_balances = _awaitable(connection.get_member_balances)
+get_member_balance = _awaitable(connection.get_member_balance)
+get_top_contributors = _awaitable(connection.get_top_contributors)
+get_monthly_trend = _awaitable(connection.get_monthly_trend)
+get_dashboard_snapshot = _awaitable(connection.get_dashboard_snapshot)
+get_portfolio_at_risk = _awaitable(connection.get_portfolio_at_risk)
+refresh_loan_arrears = _queued(connection.refresh_loan_arrears)
+get_aged_loans_count = _awaitable(connection.get_aged_loans_count)
+get_recent_activities = _awaitable(connection.get_recent_activities)
+
+# ==================== EXPORT ====================
+
+export_tables = _awaitable(export.export_tables)
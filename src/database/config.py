@@ -0,0 +1,199 @@
+"""
+Database engine configuration
+
+The database is chosen with the LMS_DATABASE_URL environment variable. It
+defaults to loan_manager.db next to this package. Any SQLAlchemy URL for
+SQLite or PostgreSQL works, for example:
+
+    LMS_DATABASE_URL=sqlite:////srv/lms/loans.db flet run --web
+    LMS_DATABASE_URL=postgresql+psycopg2://lms:secret@db/lms flet run --web
+
+(PostgreSQL needs a driver installed, e.g. pip install psycopg2-binary.)
+
+SQLite connection settings are grouped into named profiles. The profile is
+picked with the LMS_DB_PROFILE environment variable (default "desktop"), and
+single settings can be overridden with LMS_DB_PRAGMAS, for example:
+
+    LMS_DB_PROFILE=web-multiuser LMS_DB_PRAGMAS="cache_size=-131072" flet run --web
+
+Server databases use a connection pool sized by LMS_DB_POOL_SIZE,
+LMS_DB_MAX_OVERFLOW, LMS_DB_POOL_RECYCLE and LMS_DB_POOL_TIMEOUT.
+
+Batch jobs that only read (statement generation) use
+create_readonly_engine(), which opens SQLite files with mode=ro.
+"""
+import os
+from urllib.parse import quote
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import StaticPool
+
+
+# PRAGMA values applied to every new SQLite connection, in order.
+# Negative cache_size is in KiB; mmap_size is in bytes; busy_timeout in ms.
+ENGINE_PROFILES = {
+    # Single user on a laptop/desktop: WAL, no fsync per commit, generous caches
+    "desktop": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -32768,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    # Several browser sessions on one server: WAL so readers never wait for the
+    # writer, larger cache, and a long busy timeout for competing writers
+    "web-multiuser": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,
+        "mmap_size": 1073741824,
+        "temp_store": "MEMORY",
+        "busy_timeout": 15000,
+    },
+    # Phones and tablets: WAL, but small page cache, no mmap and on-disk temp tables
+    "android-low-memory": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -2048,
+        "mmap_size": 0,
+        "temp_store": "FILE",
+        "busy_timeout": 5000,
+    },
+    # Stock SQLite behaviour (rollback journal, fsync on every commit)
+    "compat": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -2000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 0,
+    },
+}
+
+DEFAULT_PROFILE = "desktop"
+
+
+def get_engine_profile(name: str = None) -> dict:
+    """Get the PRAGMA settings for a profile, defaulting to LMS_DB_PROFILE"""
+    name = name or os.environ.get("LMS_DB_PROFILE", DEFAULT_PROFILE)
+    if name not in ENGINE_PROFILES:
+        raise ValueError(
+            f"Unknown database profile '{name}'. Available: {', '.join(ENGINE_PROFILES)}"
+        )
+
+    pragmas = dict(ENGINE_PROFILES[name])
+    pragmas.update(_parse_pragma_overrides(os.environ.get("LMS_DB_PRAGMAS", "")))
+    return pragmas
+
+
+def _parse_pragma_overrides(value: str) -> dict:
+    """Parse "name=value,name=value" into a dict"""
+    overrides = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        key, _, setting = item.partition("=")
+        overrides[key.strip().lower()] = setting.strip()
+    return overrides
+
+
+def apply_engine_profile(engine, pragmas: dict):
+    """Apply PRAGMA settings to every connection the engine opens (SQLite only)"""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for key, value in pragmas.items():
+                cursor.execute(f"PRAGMA {key}={value}")
+        finally:
+            cursor.close()
+
+
+# ==================== ENGINE FACTORY ====================
+
+DEFAULT_DATABASE_PATH = os.path.join(os.path.dirname(__file__), "loan_manager.db")
+
+# QueuePool settings for server databases (environment variable, default)
+SERVER_POOL_SETTINGS = {
+    "pool_size": ("LMS_DB_POOL_SIZE", 5),
+    "max_overflow": ("LMS_DB_MAX_OVERFLOW", 10),
+    "pool_recycle": ("LMS_DB_POOL_RECYCLE", 1800),  # Seconds; drop connections the server may have timed out
+    "pool_timeout": ("LMS_DB_POOL_TIMEOUT", 30),
+}
+
+
+def get_database_url(url: str = None) -> str:
+    """Get the database URL, defaulting to LMS_DATABASE_URL and then the bundled SQLite file"""
+    return url or os.environ.get("LMS_DATABASE_URL") or f"sqlite:///{DEFAULT_DATABASE_PATH}"
+
+
+def _is_memory_database(url) -> bool:
+    return url.database in (None, "", ":memory:") or "mode=memory" in str(url)
+
+
+def create_app_engine(url: str = None, profile: str = None, echo: bool = False):
+    """
+    Create the engine for a database URL with the pooling that suits its backend
+
+    - SQLite file: a pool of connections. Each session (and so each thread)
+      gets its own connection, and the PRAGMA profile is applied to every one.
+    - SQLite in memory: one shared connection (StaticPool), because every
+      new connection would open an empty database.
+    - Server databases: QueuePool with the SERVER_POOL_SETTINGS, checking
+      connections before use so a restarted server does not surface as errors.
+    """
+    url = make_url(get_database_url(url))
+
+    if url.get_backend_name() == "sqlite":
+        # check_same_thread=False: connections are opened and returned by different threads
+        options = {"connect_args": {"check_same_thread": False}}
+        if _is_memory_database(url):
+            options["poolclass"] = StaticPool
+        engine = create_engine(url, echo=echo, **options)
+        apply_engine_profile(engine, get_engine_profile(profile))
+        return engine
+
+    pool_settings = {
+        name: int(os.environ.get(variable, default))
+        for name, (variable, default) in SERVER_POOL_SETTINGS.items()
+    }
+    return create_engine(url, echo=echo, pool_pre_ping=True, **pool_settings)
+
+
+# PRAGMAs that change the database file; read-only connections skip them
+_WRITE_PRAGMAS = {"journal_mode", "synchronous"}
+
+
+def create_readonly_engine(url: str = None, profile: str = None):
+    """
+    Create an engine whose connections can only read
+
+    - SQLite file: opened with mode=ro (and query_only as a second guard),
+      keeping the profile's cache and busy_timeout settings. WAL lets these
+      readers run beside the app's writer.
+    - PostgreSQL: read-only transactions.
+    - SQLite in memory cannot be shared with another connection and is refused.
+    """
+    url = make_url(get_database_url(url))
+
+    if url.get_backend_name() != "sqlite":
+        engine = create_app_engine(url)
+        if url.get_backend_name() == "postgresql":
+            engine = engine.execution_options(postgresql_readonly=True)
+        return engine
+
+    if _is_memory_database(url):
+        raise ValueError("An in-memory SQLite database cannot be opened read-only")
+    path = os.path.abspath(url.database).replace(os.sep, "/")
+    if not path.startswith("/"):
+        path = "/" + path  # file:/C:/... on Windows
+    url = url.set(database=f"file:{quote(path, safe='/:')}", query={"mode": "ro", "uri": "true"})
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    pragmas = {key: value for key, value in get_engine_profile(profile).items() if key not in _WRITE_PRAGMAS}
+    pragmas["query_only"] = "ON"
+    apply_engine_profile(engine, pragmas)
+    return engine
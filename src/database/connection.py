@@ -1,29 +1,48 @@
-import os
-from sqlalchemy import create_engine
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from typing import NamedTuple
+from sqlalchemy import (
+    DateTime, Float, bindparam, case, column, event, func, insert, literal, null, or_, select, table, text,
+    tuple_, union_all, update,
+)
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
-from .models import Base, Member, Loan, LoanRepayment, Contribution
-from datetime import datetime
-
-# Database configuration - SQLite for offline single-user app
-DB_PATH = os.path.join(os.path.dirname(__file__), "loan_manager.db")
-
-# Create SQLite engine with check_same_thread=False for Flet's async handling
-engine = create_engine(
-    f"sqlite:///{DB_PATH}",
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-    echo=False  # Set to True for SQL debugging
+from .models import (
+    Base, Member, Loan, LoanArrears, LoanInstallment, LoanRepayment, Contribution, ContributionType, InterestMethod, LoanStatus,
+    MemberStatus, MemberBalance, MonthlyRollup,
+)
+from . import accrual, amortization, arrears, summaries
+from .member_directory import MemberDirectory
+from .query_cache import QueryCache
+from .read_models import (
+    BalanceRow, ContributionRow, InstallmentRow, LoanRow, MemberRow, RepaymentRow, StatementRow, fetch_row, fetch_rows,
+    select_rows,
 )
+from .config import create_app_engine
+from .migrations import upgrade
+from datetime import date, datetime
+
+# Database configuration - the bundled SQLite file unless LMS_DATABASE_URL says otherwise.
+# Each session checks out its own pooled connection, so transactions on different
+# threads (UI handlers, async_api workers, the write queue) never share one; for
+# SQLite the LMS_DB_PROFILE PRAGMAs (WAL, cache, fsync) apply to each (see config.py).
+engine = create_app_engine(echo=False)  # Set echo=True for SQL debugging
 
 # Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False keeps returned objects readable after their session closes
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# Active unit of work per thread (see unit_of_work())
+_local = threading.local()
 
 
 def init_db():
-    """Initialize the database - creates all tables if they don't exist"""
+    """Initialize the database - creates missing tables and applies pending migrations"""
     Base.metadata.create_all(bind=engine)
-    print(f"✓ Database initialized at: {DB_PATH}")
+    version = upgrade(engine)
+    print(f"✓ Database initialized at: {engine.url.render_as_string(hide_password=True)} (schema version {version})")
 
 
 def get_session() -> Session:
@@ -37,345 +56,1457 @@ def close_session(session: Session):
         session.close()
 
 
-# ==================== MEMBER OPERATIONS ====================
+# ==================== UNIT OF WORK ====================
 
-def create_member(name: str, contact: str = None, email: str = None, status: str = "Active") -> Member:
-    """Create a new member"""
-    session = get_session()
+class UnitOfWork:
+    """A session and transaction shared by every data-access call made inside it"""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def flush(self):
+        """Send pending changes to the database without committing"""
+        self.session.flush()
+
+
+def current_unit_of_work() -> UnitOfWork:
+    """Get the unit of work active on this thread, or None"""
+    return getattr(_local, "unit_of_work", None)
+
+
+@contextmanager
+def unit_of_work():
+    """
+    Run many data-access calls on one session, connection and transaction
+
+    Usage:
+        with unit_of_work():
+            member = create_member("Jane")
+            record_contribution(member.id, 500.0)
+
+    The transaction commits when the block exits and rolls back if it raises.
+    Inside a unit of work a failing write raises instead of returning None, so
+    the whole block is undone. Nested blocks join the outermost one.
+    """
+    outer = current_unit_of_work()
+    if outer is not None:
+        yield outer
+        return
+
+    uow = UnitOfWork(get_session())
+    _local.unit_of_work = uow
     try:
-        member = Member(name=name, contact=contact, email=email, status=status)
-        session.add(member)
-        session.commit()
-        member_id = member.id
-        session.refresh(member)
-        return member
-    except Exception as e:
-        session.rollback()
-        print(f"Error creating member: {e}")
-        return None
+        yield uow
+        uow.session.commit()
+    except Exception:
+        uow.session.rollback()
+        raise
     finally:
-        close_session(session)
+        _local.unit_of_work = None
+        close_session(uow.session)
+
+
+@contextmanager
+def session_scope():
+    """
+    Get the session for a single data-access call
 
+    Joins the active unit of work if there is one; otherwise opens a
+    short-lived session that commits on success and rolls back on error.
+    """
+    uow = current_unit_of_work()
+    if uow is not None:
+        yield uow.session
+        return
 
-def get_all_members():
-    """Get all members"""
     session = get_session()
     try:
-        members = session.query(Member).all()
-        return members
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
     finally:
         close_session(session)
 
 
-def get_member_by_id(member_id: int) -> Member:
-    """Get a member by ID"""
-    session = get_session()
+def _after_commit(session: Session, callback):
+    """Run callback once the session's transaction commits; it is dropped on rollback"""
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _run_after_commit(session):
+    query_cache.bump(*session.info.pop("changed_tables", ()))
+    for callback in session.info.pop("after_commit", []):
+        callback()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_after_commit(session):
+    query_cache.bump(*session.info.pop("changed_tables", ()))
+    session.info.pop("after_commit", None)
+
+
+# ==================== QUERY CACHE ====================
+
+# Results of the read functions, keyed by arguments (see query_cache.py).
+# Inside a unit of work reads go straight to the database, since they must
+# see the block's own uncommitted writes.
+query_cache = QueryCache(bypass=lambda: current_unit_of_work() is not None)
+
+
+def _tables_changed(session: Session, *tables: str):
+    """
+    Invalidate cached reads of tables a write touches
+
+    The versions are bumped when the transaction commits or rolls back.
+    Until then other sessions, each on its own pooled connection, still read
+    the old rows, so results they cache meanwhile stay valid.
+    """
+    session.info.setdefault("changed_tables", set()).update(tables)
+
+
+def get_query_cache_stats():
+    """Get the query cache hit/miss/eviction counters"""
+    return query_cache.stats()
+
+
+def _write_failed(action: str, error: Exception):
+    """Report a failed write; inside a unit of work re-raise so the block rolls back"""
+    if current_unit_of_work() is not None:
+        raise error
+    print(f"Error {action}: {error}")
+
+
+def _as_enum(enum_cls, value):
+    """Accept an enum member, its value ("Monthly") or its name ("MONTHLY")"""
+    if isinstance(value, enum_cls):
+        return value
+    for member in enum_cls:
+        if value in (member.value, member.name):
+            return member
+    raise ValueError(f"'{value}' is not a valid {enum_cls.__name__}")
+
+
+# ==================== MEMBER OPERATIONS ====================
+
+def create_member(name: str, contact: str = None, email: str = None, status: str = "Active") -> Member:
+    """Create a new member"""
     try:
-        member = session.query(Member).filter(Member.id == member_id).first()
+        with session_scope() as session:
+            member = Member(name=name, contact=contact, email=email, status=_as_enum(MemberStatus, status))
+            session.add(member)
+            session.flush()
+            _tables_changed(session, "members")
+            _after_commit(session, partial(member_directory.put, member.id, member.name))
         return member
-    finally:
-        close_session(session)
+    except Exception as e:
+        _write_failed("creating member", e)
+        return None
+
+
+@query_cache.cached("members")
+def get_all_members() -> list:
+    """Get all members as MemberRow tuples"""
+    with session_scope() as session:
+        return fetch_rows(session, MemberRow, select_rows(MemberRow).order_by(Member.id))
+
+
+@query_cache.cached("members")
+def get_member_by_id(member_id: int) -> MemberRow:
+    """Get a member by ID"""
+    with session_scope() as session:
+        return fetch_row(session, MemberRow, select_rows(MemberRow).where(Member.id == member_id))
+
+
+def _load_member_directory():
+    """(id, name) of every member, for the member directory"""
+    with session_scope() as session:
+        return session.execute(select(Member.id, Member.name)).all()
+
+
+# Names of all members, shared by every screen (see member_directory.py)
+member_directory = MemberDirectory(_load_member_directory)
 
 
 def update_member(member_id: int, **kwargs) -> Member:
     """Update member information"""
-    session = get_session()
     try:
-        member = session.query(Member).filter(Member.id == member_id).first()
-        if member:
-            for key, value in kwargs.items():
-                if hasattr(member, key):
-                    setattr(member, key, value)
-            session.commit()
-            session.refresh(member)
+        with session_scope() as session:
+            member = session.query(Member).filter(Member.id == member_id).first()
+            if member:
+                if "status" in kwargs:
+                    kwargs["status"] = _as_enum(MemberStatus, kwargs["status"])
+                for key, value in kwargs.items():
+                    if hasattr(member, key):
+                        setattr(member, key, value)
+                session.flush()
+                _tables_changed(session, "members")
+                _after_commit(session, partial(member_directory.put, member.id, member.name))
         return member
     except Exception as e:
-        session.rollback()
-        print(f"Error updating member: {e}")
+        _write_failed("updating member", e)
         return None
-    finally:
-        close_session(session)
 
 
 def delete_member(member_id: int) -> bool:
     """Delete a member"""
-    session = get_session()
     try:
-        member = session.query(Member).filter(Member.id == member_id).first()
-        if member:
+        with session_scope() as session:
+            member = session.query(Member).filter(Member.id == member_id).first()
+            if not member:
+                return False
+            activity = summaries.contribution_activity(member.contributions, sign=-1)
+            for loan in member.loans:
+                for key, (amount, count) in summaries.repayment_activity(loan.repayments, sign=-1).items():
+                    total, n = activity.get(key, (0.0, 0))
+                    activity[key] = (total + amount, n + count)
             session.delete(member)
-            session.commit()
-            return True
-        return False
+            session.flush()
+            summaries.remove_member_balance(session.connection(), member_id)
+            summaries.add_monthly_activity(session.connection(), activity)
+            _tables_changed(session, "members", "loans", "loan_installments", "loan_arrears", "loan_repayments",
+                            "contributions", "member_balances", "monthly_rollups")
+            _after_commit(session, partial(member_directory.remove, member_id))
+        return True
     except Exception as e:
-        session.rollback()
-        print(f"Error deleting member: {e}")
+        _write_failed("deleting member", e)
         return False
-    finally:
-        close_session(session)
+
+
+# ==================== MEMBER SEARCH ====================
+
+# FTS5 index created by migration 5 (name, contact, email; rowid = member id)
+MEMBERS_FTS = table("members_fts", column("rowid"), column("members_fts"), column("rank"))
+
+_SEARCH_TOKEN = re.compile(r"\w+")
+
+
+def _has_member_search_index(session) -> bool:
+    """Whether the database has the FTS5 members index (SQLite built with FTS5)"""
+    if session.bind.dialect.name != "sqlite":
+        return False
+    return session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'members_fts'")
+    ).first() is not None
+
+
+def _like_prefix(value: str) -> str:
+    """LIKE pattern matching strings that start with value (wildcards escaped with \\)"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+@query_cache.cached("members")
+def search_members(prefix: str, limit: int = 10) -> list:
+    """
+    Find members whose name, contact or email has words starting with prefix
+
+    Every word typed must match ("jane do" finds "Jane Doe"). Results are
+    MemberRow tuples, best match first. Uses the FTS5 index when the
+    database has one and falls back to LIKE on the start of each field.
+    """
+    tokens = _SEARCH_TOKEN.findall(prefix or "")
+    if not tokens:
+        return []
+    with session_scope() as session:
+        if _has_member_search_index(session):
+            match = " ".join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+            query = (
+                select_rows(MemberRow)
+                .join(MEMBERS_FTS, MEMBERS_FTS.c.rowid == Member.id)
+                .where(MEMBERS_FTS.c.members_fts.op("MATCH")(match))
+                .order_by(MEMBERS_FTS.c.rank, Member.name, Member.id)
+            )
+        else:
+            query = select_rows(MemberRow).order_by(Member.name, Member.id)
+            for token in tokens:
+                pattern = _like_prefix(token)
+                query = query.where(or_(
+                    Member.name.ilike(pattern, escape="\\"),
+                    Member.name.ilike("% " + pattern, escape="\\"),
+                    Member.contact.like(pattern, escape="\\"),
+                    Member.email.ilike(pattern, escape="\\"),
+                ))
+        return fetch_rows(session, MemberRow, query.limit(limit))
 
 
 # ==================== LOAN OPERATIONS ====================
 
-def create_loan(member_id: int, amount: float, interest_rate: float = 0.0, end_date=None) -> Loan:
-    """Create a new loan"""
-    session = get_session()
+# Changing any of these regenerates a loan's schedule (see amortization.py)
+_SCHEDULE_FIELDS = {"amount", "interest_rate", "term_months", "interest_method", "start_date"}
+
+
+def _schedule_loan(session: Session, loan: Loan):
+    """Write a flushed loan's installment schedule and total interest"""
+    if loan.term_months:
+        totals = amortization.write_schedules(session.connection(), [(
+            loan.id, loan.amount, loan.interest_rate, loan.term_months, loan.interest_method, loan.start_date,
+        )])
+        loan.total_interest = totals[loan.id]
+    else:
+        # No term: the original single flat charge and no schedule
+        session.query(LoanInstallment).filter(LoanInstallment.loan_id == loan.id).delete()
+        loan.total_interest = (loan.amount * loan.interest_rate) / 100
+    session.flush()
+
+
+def create_loan(member_id: int, amount: float, interest_rate: float = 0.0, end_date=None,
+                term_months: int = None, interest_method: str = "Flat") -> Loan:
+    """
+    Create a new loan
+
+    With term_months, interest_rate is yearly and the loan gets a monthly
+    installment schedule (flat or reducing-balance interest); without it the
+    interest is a single flat charge of amount * interest_rate / 100.
+    """
     try:
-        total_interest = (amount * interest_rate) / 100
-        loan = Loan(
-            member_id=member_id,
-            amount=amount,
-            interest_rate=interest_rate,
-            total_interest=total_interest,
-            end_date=end_date
-        )
-        session.add(loan)
-        session.commit()
-        session.refresh(loan)
+        with session_scope() as session:
+            loan = Loan(
+                member_id=member_id,
+                amount=amount,
+                interest_rate=interest_rate,
+                total_interest=0.0,
+                term_months=term_months or None,
+                interest_method=_as_enum(InterestMethod, interest_method),
+                start_date=datetime.now(),
+                end_date=end_date
+            )
+            if loan.term_months and end_date is None:
+                loan.end_date = amortization.add_months(loan.start_date, loan.term_months)
+            session.add(loan)
+            session.flush()
+            _schedule_loan(session, loan)
+            arrears.refresh_loan_arrears(session.connection(), [loan.id])
+            summaries.refresh_member_loans(session.connection(), [member_id])
+            _tables_changed(session, "loans", "loan_installments", "loan_arrears", "member_balances")
         return loan
     except Exception as e:
-        session.rollback()
-        print(f"Error creating loan: {e}")
+        _write_failed("creating loan", e)
         return None
-    finally:
-        close_session(session)
 
 
-def get_all_loans():
-    """Get all loans"""
-    session = get_session()
-    try:
-        loans = session.query(Loan).all()
-        return loans
-    finally:
-        close_session(session)
+@query_cache.cached("loans")
+def get_all_loans() -> list:
+    """Get all loans as LoanRow tuples"""
+    with session_scope() as session:
+        return fetch_rows(session, LoanRow, select_rows(LoanRow).order_by(Loan.id))
 
 
-def get_loans_by_member(member_id: int):
+@query_cache.cached("loans")
+def get_loans_by_member(member_id: int) -> list:
     """Get all loans for a specific member"""
-    session = get_session()
-    try:
-        loans = session.query(Loan).filter(Loan.member_id == member_id).all()
-        return loans
-    finally:
-        close_session(session)
+    with session_scope() as session:
+        return fetch_rows(session, LoanRow, select_rows(LoanRow).where(Loan.member_id == member_id).order_by(Loan.id))
 
 
-def get_loan_by_id(loan_id: int) -> Loan:
+@query_cache.cached("loans")
+def get_loan_by_id(loan_id: int) -> LoanRow:
     """Get a loan by ID"""
-    session = get_session()
-    try:
-        loan = session.query(Loan).filter(Loan.id == loan_id).first()
-        return loan
-    finally:
-        close_session(session)
+    with session_scope() as session:
+        return fetch_row(session, LoanRow, select_rows(LoanRow).where(Loan.id == loan_id))
 
 
 def update_loan(loan_id: int, **kwargs) -> Loan:
     """Update loan information"""
-    session = get_session()
     try:
-        loan = session.query(Loan).filter(Loan.id == loan_id).first()
-        if loan:
-            for key, value in kwargs.items():
-                if hasattr(loan, key):
-                    setattr(loan, key, value)
-            session.commit()
-            session.refresh(loan)
+        with session_scope() as session:
+            loan = session.query(Loan).filter(Loan.id == loan_id).first()
+            if loan:
+                previous_member_id = loan.member_id
+                if "status" in kwargs:
+                    kwargs["status"] = _as_enum(LoanStatus, kwargs["status"])
+                if "interest_method" in kwargs:
+                    kwargs["interest_method"] = _as_enum(InterestMethod, kwargs["interest_method"])
+                for key, value in kwargs.items():
+                    if hasattr(loan, key):
+                        setattr(loan, key, value)
+                session.flush()
+                if _SCHEDULE_FIELDS & kwargs.keys():
+                    _schedule_loan(session, loan)
+                arrears.refresh_loan_arrears(session.connection(), [loan.id])
+                summaries.refresh_member_loans(session.connection(), [previous_member_id, loan.member_id])
+                _tables_changed(session, "loans", "loan_installments", "loan_arrears", "member_balances")
         return loan
     except Exception as e:
-        session.rollback()
-        print(f"Error updating loan: {e}")
+        _write_failed("updating loan", e)
         return None
-    finally:
-        close_session(session)
 
 
-def get_active_loans():
-    """Get all active loans"""
-    session = get_session()
+def delete_loan(loan_id: int) -> bool:
+    """Delete a loan and its repayments"""
     try:
-        loans = session.query(Loan).filter(Loan.status == "Active").all()
-        return loans
-    finally:
-        close_session(session)
+        with session_scope() as session:
+            loan = session.query(Loan).filter(Loan.id == loan_id).first()
+            if not loan:
+                return False
+            member_id = loan.member_id
+            activity = summaries.repayment_activity(loan.repayments, sign=-1)
+            session.delete(loan)
+            session.flush()
+            summaries.refresh_member_loans(session.connection(), [member_id])
+            summaries.add_monthly_activity(session.connection(), activity)
+            _tables_changed(session, "loans", "loan_installments", "loan_arrears", "loan_repayments", "member_balances",
+                            "monthly_rollups")
+        return True
+    except Exception as e:
+        _write_failed("deleting loan", e)
+        return False
+
+
+@query_cache.cached("loans")
+def get_active_loans() -> list:
+    """Get all active loans"""
+    with session_scope() as session:
+        return fetch_rows(session, LoanRow, select_rows(LoanRow).where(Loan.status == LoanStatus.ACTIVE).order_by(Loan.id))
+
+
+@query_cache.cached("loan_installments")
+def get_loan_schedule(loan_id: int) -> list:
+    """Get a loan's installment schedule as InstallmentRow tuples (empty for loans without a term)"""
+    with session_scope() as session:
+        return fetch_rows(
+            session, InstallmentRow,
+            select_rows(InstallmentRow).where(LoanInstallment.loan_id == loan_id).order_by(LoanInstallment.number),
+        )
+
+
+def rebuild_loan_schedules(loan_ids=None) -> int:
+    """Regenerate the schedules of the given loans, or of every pending and active loan; returns the loan count"""
+    with session_scope() as session:
+        conn = session.connection()
+        member_ids = None
+        if loan_ids is not None:
+            loan_ids = list(loan_ids)
+            member_ids = [row.member_id for row in session.execute(
+                select(Loan.member_id).where(Loan.id.in_(loan_ids)).distinct()
+            )]
+        scheduled = amortization.rebuild_schedules(conn, loan_ids)
+        arrears.refresh_loan_arrears(conn, loan_ids)
+        # total_interest may have changed, and with it the outstanding balances
+        if member_ids is None:
+            summaries.rebuild_member_balances(conn)
+        else:
+            summaries.refresh_member_loans(conn, member_ids)
+        _tables_changed(session, "loans", "loan_installments", "loan_arrears", "member_balances")
+    return scheduled
 
 
 # ==================== LOAN REPAYMENT OPERATIONS ====================
 
+# amount_repaid is incremented in SQL so concurrent payments on one loan never
+# overwrite each other, and the Paid transition is decided in the same statement.
+_apply_repayment = (
+    update(Loan)
+    .where(Loan.id == bindparam("loan_pk"))
+    .values(
+        amount_repaid=Loan.amount_repaid + bindparam("paid_amount"),
+        status=case(
+            (Loan.amount_repaid + bindparam("paid_amount") >= Loan.amount + Loan.total_interest, LoanStatus.PAID.name),
+            else_=Loan.status,
+        ),
+        # A loan keeps the end date of the payment that paid it off
+        end_date=case(
+            ((Loan.status != LoanStatus.PAID)
+             & (Loan.amount_repaid + bindparam("paid_amount") >= Loan.amount + Loan.total_interest),
+             bindparam("paid_at")),
+            else_=Loan.end_date,
+        ),
+        updated_at=bindparam("paid_at"),
+    )
+)
+
+
+def _post_repayments(session: Session, payments: list) -> list:
+    """
+    Insert repayment rows and apply them to their loans
+
+    Amounts are summed per loan so each loan gets one UPDATE, and all
+    UPDATEs go out as one executemany.
+    """
+    loan_ids = sorted({p["loan_id"] for p in payments})
+    loan_members = {}
+    for start in range(0, len(loan_ids), _ID_CHUNK_SIZE):
+        chunk = loan_ids[start:start + _ID_CHUNK_SIZE]
+        loan_members.update(session.execute(select(Loan.id, Loan.member_id).where(Loan.id.in_(chunk))).all())
+    unknown = [loan_id for loan_id in loan_ids if loan_id not in loan_members]
+    if unknown:
+        raise ValueError(f"Unknown loan ids: {unknown[:10]}")
+
+    now = datetime.now()
+    for p in payments:
+        p.setdefault("payment_date", now)
+    ids = session.scalars(
+        insert(LoanRepayment).returning(LoanRepayment.id, sort_by_parameter_order=True),
+        payments,
+    ).all()
+
+    totals = {}
+    for p in payments:
+        totals[p["loan_id"]] = totals.get(p["loan_id"], 0.0) + p["amount_paid"]
+    session.connection().execute(
+        _apply_repayment,
+        [{"loan_pk": loan_id, "paid_amount": amount, "paid_at": now} for loan_id, amount in totals.items()],
+    )
+    summaries.refresh_member_loans(session.connection(), [loan_members[loan_id] for loan_id in totals])
+    summaries.add_monthly_activity(session.connection(), summaries.repayment_activity(payments))
+    arrears.refresh_loan_arrears(session.connection(), list(totals), as_of=now)
+    _tables_changed(session, "loans", "loan_repayments", "loan_arrears", "member_balances", "monthly_rollups")
+
+    # Loans already loaded in this session no longer match the database
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Loan) and obj.id in totals:
+            session.expire(obj)
+    return ids
+
+
+def _check_payment(loan_id, amount_paid, notes=None) -> dict:
+    """Validate one repayment and build its insert parameters"""
+    amount_paid = float(amount_paid)
+    if amount_paid <= 0:
+        raise ValueError("amount must be positive")
+    return {"loan_id": int(loan_id), "amount_paid": amount_paid, "notes": notes}
+
+
 def record_repayment(loan_id: int, amount_paid: float, notes: str = None) -> LoanRepayment:
     """Record a loan repayment"""
-    session = get_session()
     try:
-        repayment = LoanRepayment(loan_id=loan_id, amount_paid=amount_paid, notes=notes)
-        session.add(repayment)
-        
-        # Update loan's amount_repaid
-        loan = session.query(Loan).filter(Loan.id == loan_id).first()
-        if loan:
-            loan.amount_repaid += amount_paid
-            # Check if loan is fully paid
-            if loan.amount_repaid >= (loan.amount + loan.total_interest):
-                loan.status = "Paid"
-                loan.end_date = datetime.now()
-        
-        session.commit()
-        session.refresh(repayment)
-        return repayment
+        with session_scope() as session:
+            repayment_id = _post_repayments(session, [_check_payment(loan_id, amount_paid, notes)])[0]
+            return session.get(LoanRepayment, repayment_id)
     except Exception as e:
-        session.rollback()
-        print(f"Error recording repayment: {e}")
+        _write_failed("recording repayment", e)
         return None
-    finally:
-        close_session(session)
 
 
-def get_repayments_by_loan(loan_id: int):
-    """Get all repayments for a loan"""
-    session = get_session()
+def bulk_record_repayments(payments) -> list:
+    """
+    Record many repayments in one transaction
+
+    Args:
+        payments: Iterable of (loan_id, amount, notes) tuples; notes may be omitted
+
+    Returns:
+        The new repayment ids, in input order. An empty list if posting failed.
+
+    Raises:
+        ValueError: If any payment is invalid. Nothing is written in that case.
+    """
+    params = []
+    for index, payment in enumerate(payments):
+        try:
+            params.append(_check_payment(*payment))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid repayment at row {index}: {e}") from e
+
+    if not params:
+        return []
+
     try:
-        repayments = session.query(LoanRepayment).filter(LoanRepayment.loan_id == loan_id).all()
-        return repayments
-    finally:
-        close_session(session)
+        with session_scope() as session:
+            return _post_repayments(session, params)
+    except ValueError:
+        raise
+    except Exception as e:
+        _write_failed("recording repayments", e)
+        return []
+
+
+@query_cache.cached("loan_repayments")
+def get_repayments_by_loan(loan_id: int) -> list:
+    """Get all repayments for a loan as RepaymentRow tuples"""
+    with session_scope() as session:
+        return fetch_rows(
+            session, RepaymentRow,
+            select_rows(RepaymentRow).where(LoanRepayment.loan_id == loan_id)
+            .order_by(LoanRepayment.payment_date, LoanRepayment.id),
+        )
 
 
 # ==================== CONTRIBUTION OPERATIONS ====================
 
+MONTH_PATTERN = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+# SQLite allows at most 999 bound parameters per statement before 3.32
+_ID_CHUNK_SIZE = 900
+
+
+def _check_month(month: str) -> str:
+    """Default an empty month to the current one and validate the YYYY-MM format"""
+    if not month:
+        return datetime.now().strftime("%Y-%m")
+    if not MONTH_PATTERN.match(month):
+        raise ValueError(f"Month must be in YYYY-MM format, got '{month}'")
+    return month
+
+
+def _check_members_exist(session, member_ids):
+    """Raise ValueError unless every member ID exists"""
+    member_ids = sorted(set(member_ids))
+    known = set()
+    for start in range(0, len(member_ids), _ID_CHUNK_SIZE):
+        chunk = member_ids[start:start + _ID_CHUNK_SIZE]
+        known.update(session.scalars(select(Member.id).where(Member.id.in_(chunk))))
+    unknown = [member_id for member_id in member_ids if member_id not in known]
+    if unknown:
+        raise ValueError(f"Unknown member ids: {unknown[:10]}")
+
+
 def record_contribution(member_id: int, amount: float, contribution_type: str = "Monthly", month: str = None, notes: str = None) -> Contribution:
-    """Record a contribution"""
-    session = get_session()
+    """
+    Record a contribution
+
+    Like the other writes, returns None (and writes nothing) if the member
+    does not exist or month is not YYYY-MM; inside a unit of work the error
+    is raised instead.
+    """
     try:
-        if not month:
-            month = datetime.now().strftime("%Y-%m")
-        
-        contribution = Contribution(
-            member_id=member_id,
-            amount=amount,
-            contribution_type=contribution_type,
-            month=month,
-            notes=notes
-        )
-        session.add(contribution)
-        session.commit()
-        session.refresh(contribution)
+        with session_scope() as session:
+            _check_members_exist(session, [member_id])
+            contribution = Contribution(
+                member_id=member_id,
+                amount=amount,
+                contribution_type=_as_enum(ContributionType, contribution_type),
+                month=_check_month(month),
+                notes=notes
+            )
+            session.add(contribution)
+            session.flush()
+            summaries.add_member_contributions(session.connection(), {member_id: (contribution.amount, 1)})
+            summaries.add_monthly_activity(session.connection(), summaries.contribution_activity([contribution]))
+            _tables_changed(session, "contributions", "member_balances", "monthly_rollups")
         return contribution
     except Exception as e:
-        session.rollback()
-        print(f"Error recording contribution: {e}")
+        _write_failed("recording contribution", e)
         return None
-    finally:
-        close_session(session)
 
 
-def get_all_contributions():
-    """Get all contributions"""
-    session = get_session()
+def bulk_record_contributions(rows) -> list:
+    """
+    Record many contributions in one transaction (e.g. a month-end payroll run)
+
+    Args:
+        rows: Iterable of dicts with member_id and amount, and optionally
+            contribution_type, month, notes and contribution_date. Tuples in
+            record_contribution's argument order are accepted too.
+
+    Returns:
+        The new contribution ids, in the same order as rows. An empty list
+        if the insert failed.
+
+    Raises:
+        ValueError: If any row is invalid. Nothing is written in that case.
+    """
+    fields = ("member_id", "amount", "contribution_type", "month", "notes")
+    posted_at = datetime.now()
+    default_month = posted_at.strftime("%Y-%m")
+    params = []
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            row = dict(zip(fields, row))
+        try:
+            amount = float(row["amount"])
+            if amount <= 0:
+                raise ValueError("amount must be positive")
+            param = {
+                "member_id": int(row["member_id"]),
+                "amount": amount,
+                "contribution_type": _as_enum(ContributionType, row.get("contribution_type") or ContributionType.MONTHLY),
+                "month": _check_month(row.get("month") or default_month),
+                "notes": row.get("notes"),
+                "contribution_date": row.get("contribution_date") or posted_at,
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid contribution at row {index}: {e}") from e
+        params.append(param)
+
+    if not params:
+        return []
+
     try:
-        contributions = session.query(Contribution).all()
-        return contributions
-    finally:
-        close_session(session)
+        with session_scope() as session:
+            _check_members_exist(session, [p["member_id"] for p in params])
+
+            # executemany with insertmanyvalues: rows go out in large multi-VALUES batches
+            ids = session.scalars(
+                insert(Contribution).returning(Contribution.id, sort_by_parameter_order=True),
+                params,
+            ).all()
+
+            deltas = {}
+            for p in params:
+                amount, count = deltas.get(p["member_id"], (0.0, 0))
+                deltas[p["member_id"]] = (amount + p["amount"], count + 1)
+            summaries.add_member_contributions(session.connection(), deltas)
+            summaries.add_monthly_activity(session.connection(), summaries.contribution_activity(params))
+            _tables_changed(session, "contributions", "member_balances", "monthly_rollups")
+        return ids
+    except ValueError:
+        raise
+    except Exception as e:
+        _write_failed("recording contributions", e)
+        return []
+
 
+@query_cache.cached("contributions")
+def get_all_contributions() -> list:
+    """Get all contributions as ContributionRow tuples (use iter_contributions() for exports)"""
+    with session_scope() as session:
+        return fetch_rows(session, ContributionRow, select_rows(ContributionRow).order_by(Contribution.id))
 
-def get_contributions_by_member(member_id: int):
+
+@query_cache.cached("contributions")
+def get_contributions_by_member(member_id: int) -> list:
     """Get all contributions for a member"""
-    session = get_session()
-    try:
-        contributions = session.query(Contribution).filter(Contribution.member_id == member_id).all()
-        return contributions
-    finally:
-        close_session(session)
+    with session_scope() as session:
+        return fetch_rows(
+            session, ContributionRow,
+            select_rows(ContributionRow).where(Contribution.member_id == member_id)
+            .order_by(Contribution.contribution_date, Contribution.id),
+        )
 
 
-def get_contributions_by_month(month: str):
+@query_cache.cached("contributions")
+def get_contributions_by_month(month: str) -> list:
     """Get all contributions for a specific month (YYYY-MM format)"""
-    session = get_session()
+    with session_scope() as session:
+        return fetch_rows(
+            session, ContributionRow,
+            select_rows(ContributionRow).where(Contribution.month == month).order_by(Contribution.id),
+        )
+
+
+def delete_contribution(contribution_id: int) -> bool:
+    """Delete a contribution"""
     try:
-        contributions = session.query(Contribution).filter(Contribution.month == month).all()
-        return contributions
-    finally:
-        close_session(session)
+        with session_scope() as session:
+            contribution = session.query(Contribution).filter(Contribution.id == contribution_id).first()
+            if not contribution:
+                return False
+            session.delete(contribution)
+            session.flush()
+            summaries.add_member_contributions(
+                session.connection(), {contribution.member_id: (-contribution.amount, -1)}
+            )
+            summaries.add_monthly_activity(
+                session.connection(), summaries.contribution_activity([contribution], sign=-1)
+            )
+            _tables_changed(session, "contributions", "member_balances", "monthly_rollups")
+        return True
+    except Exception as e:
+        _write_failed("deleting contribution", e)
+        return False
+
+
+# ==================== PAGINATED QUERIES ====================
+
+class Page(NamedTuple):
+    """
+    One page of a keyset-paginated query
+
+    Pass next_cursor as after= to get the following page and prev_cursor as
+    before= to get the preceding one. A cursor is None when there is no
+    page in that direction.
+    """
+    items: list
+    next_cursor: tuple = None
+    prev_cursor: tuple = None
+
+
+# Sort keys each paginated query accepts. Every key is backed by an index
+# (with the id as tie-breaker), so a page costs O(limit) whatever the offset.
+MEMBER_SORT_KEYS = {"name": Member.name, "id": Member.id, "created_at": Member.created_at}
+LOAN_SORT_KEYS = {"id": Loan.id, "created_at": Loan.created_at}
+CONTRIBUTION_SORT_KEYS = {
+    "contribution_date": Contribution.contribution_date,
+    "id": Contribution.id,
+    "created_at": Contribution.created_at,
+}
+REPAYMENT_SORT_KEYS = {
+    "payment_date": LoanRepayment.payment_date,
+    "id": LoanRepayment.id,
+    "created_at": LoanRepayment.created_at,
+}
+
+
+def _keyset_page(session, row_type, query, sort_keys: dict, sort: str, id_column, after, before, limit: int, descending: bool) -> Page:
+    """Run a select_rows() query one page at a time, ordered by (sort column, id)"""
+    if sort not in sort_keys:
+        raise ValueError(f"Cannot sort by '{sort}'. Available: {', '.join(sort_keys)}")
+    if after is not None and before is not None:
+        raise ValueError("Pass either after or before, not both")
+
+    sort_column = sort_keys[sort]
+    backwards = before is not None
+    # Scanning towards smaller keys: a descending page, or going back on an ascending one
+    towards_smaller = descending != backwards
+    cursor = before if backwards else after
+
+    if cursor is not None:
+        if sort_column is id_column:
+            key, value = id_column, cursor[1]
+        else:
+            key, value = tuple_(sort_column, id_column), tuple_(*cursor)
+        query = query.where(key < value if towards_smaller else key > value)
+
+    if towards_smaller:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    items = fetch_rows(session, row_type, query.limit(limit + 1))
+    has_more = len(items) > limit
+    items = items[:limit]
+    if backwards:
+        items.reverse()
+    if not items:
+        return Page([], None, None)
+
+    def cursor_of(item):
+        return (getattr(item, sort_column.key), item.id)
+
+    if backwards:
+        return Page(items, cursor_of(items[-1]), cursor_of(items[0]) if has_more else None)
+    return Page(items, cursor_of(items[-1]) if has_more else None, cursor_of(items[0]) if after is not None else None)
+
+
+@query_cache.cached("members")
+def get_members_page(sort: str = "name", after=None, before=None, limit: int = 50,
+                     descending: bool = False, status=None) -> Page:
+    """Get one page of members, optionally only those with a given status"""
+    with session_scope() as session:
+        query = select_rows(MemberRow)
+        if status:
+            query = query.where(Member.status == _as_enum(MemberStatus, status))
+        return _keyset_page(session, MemberRow, query, MEMBER_SORT_KEYS, sort, Member.id, after, before, limit, descending)
+
+
+@query_cache.cached("loans")
+def get_loans_page(sort: str = "id", after=None, before=None, limit: int = 50,
+                   descending: bool = True, status=None, member_id: int = None) -> Page:
+    """Get one page of loans, optionally filtered by status and member"""
+    with session_scope() as session:
+        query = select_rows(LoanRow)
+        if status:
+            query = query.where(Loan.status == _as_enum(LoanStatus, status))
+        if member_id:
+            query = query.where(Loan.member_id == member_id)
+        return _keyset_page(session, LoanRow, query, LOAN_SORT_KEYS, sort, Loan.id, after, before, limit, descending)
+
+
+@query_cache.cached("contributions")
+def get_contributions_page(sort: str = "contribution_date", after=None, before=None, limit: int = 50,
+                           descending: bool = True, member_id: int = None,
+                           month_from: str = None, month_to: str = None) -> Page:
+    """Get one page of contributions, optionally filtered by member and a YYYY-MM month range"""
+    with session_scope() as session:
+        query = select_rows(ContributionRow)
+        if member_id:
+            query = query.where(Contribution.member_id == member_id)
+        if month_from:
+            query = query.where(Contribution.month >= _check_month(month_from))
+        if month_to:
+            query = query.where(Contribution.month <= _check_month(month_to))
+        return _keyset_page(session, ContributionRow, query, CONTRIBUTION_SORT_KEYS, sort, Contribution.id, after, before, limit, descending)
+
+
+@query_cache.cached("loan_repayments")
+def get_repayments_page(loan_id: int = None, sort: str = "payment_date", after=None, before=None,
+                        limit: int = 50, descending: bool = True) -> Page:
+    """Get one page of repayments, optionally for a single loan"""
+    with session_scope() as session:
+        query = select_rows(RepaymentRow)
+        if loan_id:
+            query = query.where(LoanRepayment.loan_id == loan_id)
+        return _keyset_page(session, RepaymentRow, query, REPAYMENT_SORT_KEYS, sort, LoanRepayment.id, after, before, limit, descending)
+
+
+# ==================== STREAMING READS ====================
+
+# Rows fetched from the cursor per round; only this many are in memory at once
+STREAM_BATCH_SIZE = 1000
+
+
+def _stream(query, batch_size: int):
+    """Yield the rows of a Core select as lightweight Row tuples, batch_size at a time"""
+    with session_scope() as session:
+        result = session.execute(query.execution_options(yield_per=batch_size))
+        for row in result:
+            yield row
+
+
+def iter_members(batch_size: int = STREAM_BATCH_SIZE):
+    """Stream all members as (id, name, contact, email, status, join_date) rows"""
+    return _stream(
+        select(Member.id, Member.name, Member.contact, Member.email, Member.status, Member.join_date)
+        .order_by(Member.id),
+        batch_size,
+    )
+
+
+def iter_loans(batch_size: int = STREAM_BATCH_SIZE):
+    """Stream all loans as (id, member_id, amount, interest_rate, total_interest, amount_repaid, status, start_date, end_date) rows"""
+    return _stream(
+        select(
+            Loan.id, Loan.member_id, Loan.amount, Loan.interest_rate, Loan.total_interest,
+            Loan.amount_repaid, Loan.status, Loan.start_date, Loan.end_date,
+        ).order_by(Loan.id),
+        batch_size,
+    )
+
+
+def iter_contributions(batch_size: int = STREAM_BATCH_SIZE):
+    """Stream all contributions as (id, member_id, amount, contribution_type, contribution_date, month, notes) rows"""
+    return _stream(
+        select(
+            Contribution.id, Contribution.member_id, Contribution.amount, Contribution.contribution_type,
+            Contribution.contribution_date, Contribution.month, Contribution.notes,
+        ).order_by(Contribution.id),
+        batch_size,
+    )
+
+
+def iter_repayments(batch_size: int = STREAM_BATCH_SIZE):
+    """Stream all repayments as (id, loan_id, amount_paid, payment_date, notes) rows"""
+    return _stream(
+        select(
+            LoanRepayment.id, LoanRepayment.loan_id, LoanRepayment.amount_paid,
+            LoanRepayment.payment_date, LoanRepayment.notes,
+        ).order_by(LoanRepayment.id),
+        batch_size,
+    )
+
+
+# ==================== MEMBER STATEMENT ====================
+
+STATEMENT_OPENING = "Opening balance"
+STATEMENT_DISBURSEMENT = "Disbursement"
+STATEMENT_INTEREST = "Interest"
+STATEMENT_CONTRIBUTION = "Contribution"
+STATEMENT_REPAYMENT = "Repayment"
+
+
+def _statement_branch(kind: str, position: int, entry_date, reference_id, loan_id, description,
+                      savings_change=0.0, loan_change=0.0):
+    """One source of statement entries, with the columns every branch of the UNION shares"""
+    return select(
+        literal(1).label("section"),  # 0 is the opening balance, which comes first
+        entry_date.label("entry_date"),
+        literal(kind).label("kind"),
+        literal(position).label("position"),  # Order of entries on the same date
+        reference_id.label("reference_id"),
+        loan_id.label("loan_id"),
+        description.label("description"),
+        (literal(savings_change, Float) if isinstance(savings_change, float) else savings_change).label("savings_change"),
+        (literal(loan_change, Float) if isinstance(loan_change, float) else loan_change).label("loan_change"),
+    )
+
+
+def _statement_entries(member_id: int):
+    """Every statement entry of a member (disbursements, interest charges, contributions, repayments), unordered"""
+    member_loans = Loan.member_id == member_id
+    return union_all(
+        _statement_branch(
+            STATEMENT_DISBURSEMENT, 1, Loan.start_date, Loan.id, Loan.id, null(), loan_change=Loan.amount,
+        ).where(member_loans),
+        # The interest charge is owed from the start, as in the loan's outstanding balance
+        _statement_branch(
+            STATEMENT_INTEREST, 2, Loan.start_date, Loan.id, Loan.id, null(), loan_change=Loan.total_interest,
+        ).where(member_loans, Loan.total_interest > 0),
+        _statement_branch(
+            STATEMENT_CONTRIBUTION, 3, Contribution.contribution_date, Contribution.id, null(), Contribution.notes,
+            savings_change=Contribution.amount,
+        ).where(Contribution.member_id == member_id),
+        _statement_branch(
+            STATEMENT_REPAYMENT, 4, LoanRepayment.payment_date, LoanRepayment.id, LoanRepayment.loan_id,
+            LoanRepayment.notes, loan_change=-LoanRepayment.amount_paid,
+        ).join(Loan, Loan.id == LoanRepayment.loan_id).where(member_loans),
+    ).subquery()
+
+
+def member_statement_query(member_id: int, start: datetime = None, end: datetime = None):
+    """
+    The statement query of a member, selecting StatementRow columns in date order
+
+    The first row is the opening balance: everything before start (zero
+    without a start). Every entry from start up to (but not including) end
+    follows, with savings and loan balances running from it as SQL window
+    sums. member_id may be a bindparam() to reuse the query across members.
+    """
+    entries = _statement_entries(member_id)
+    if start is not None:
+        opening_totals = (
+            func.coalesce(func.sum(entries.c.savings_change), 0.0),
+            func.coalesce(func.sum(entries.c.loan_change), 0.0),
+        )
+    else:
+        opening_totals = (literal(0.0, Float), literal(0.0, Float))
+    opening = select(
+        literal(0).label("section"),
+        literal(start, DateTime).label("entry_date"),
+        literal(STATEMENT_OPENING).label("kind"),
+        literal(0).label("position"),
+        null().label("reference_id"),
+        null().label("loan_id"),
+        null().label("description"),
+        opening_totals[0].label("savings_change"),
+        opening_totals[1].label("loan_change"),
+    )
+    period = select(entries)
+    if start is not None:
+        opening = opening.where(entries.c.entry_date < start)
+        period = period.where(entries.c.entry_date >= start)
+    if end is not None:
+        period = period.where(entries.c.entry_date < end)
+
+    ledger = union_all(opening, period).subquery()
+    order = (ledger.c.section, ledger.c.entry_date, ledger.c.position, ledger.c.reference_id)
+    return select(
+        ledger.c.entry_date,
+        ledger.c.kind,
+        ledger.c.reference_id,
+        ledger.c.loan_id,
+        ledger.c.description,
+        ledger.c.savings_change,
+        ledger.c.loan_change,
+        func.sum(ledger.c.savings_change).over(order_by=order, rows=(None, 0)),
+        func.sum(ledger.c.loan_change).over(order_by=order, rows=(None, 0)),
+    ).order_by(*order)
+
+
+def get_member_statement(member_id: int, start: datetime = None, end: datetime = None,
+                         batch_size: int = STREAM_BATCH_SIZE):
+    """
+    Stream a member's statement as StatementRow tuples (see member_statement_query)
+
+    Rows arrive from the cursor batch_size at a time, so a long history is
+    never held in memory.
+    """
+    for row in _stream(member_statement_query(member_id, start, end), batch_size):
+        yield StatementRow._make(row)
+
+
+# ==================== MEMBER BALANCE OPERATIONS ====================
+
+@query_cache.cached("member_balances")
+def get_member_balances(member_ids=None) -> dict:
+    """Get the maintained balances as BalanceRow tuples keyed by member ID (all members, or just member_ids)"""
+    with session_scope() as session:
+        query = select_rows(BalanceRow)
+        if member_ids is not None:
+            query = query.where(MemberBalance.member_id.in_(list(member_ids)))
+        return {b.member_id: b for b in fetch_rows(session, BalanceRow, query)}
+
+
+@query_cache.cached("member_balances")
+def get_member_balance(member_id: int) -> BalanceRow:
+    """Get the maintained balance of one member (None if it has no activity yet)"""
+    with session_scope() as session:
+        return fetch_row(session, BalanceRow, select_rows(BalanceRow).where(MemberBalance.member_id == member_id))
+
+
+def rebuild_member_balances() -> dict:
+    """Recompute member_balances from scratch and report any drift found"""
+    with session_scope() as session:
+        _tables_changed(session, "member_balances")
+        return summaries.rebuild_member_balances(session.connection())
+
+
+OTHERS_LABEL = "Others"
+
+
+@query_cache.cached("members", "member_balances", "contributions")
+def get_top_contributors(limit: int = 8, start: datetime = None, end: datetime = None) -> list:
+    """
+    Get the members who contributed most, plus one "Others" entry for the rest
+
+    Args:
+        limit: Number of members to list individually
+        start: Only count contributions on or after this date
+        end: Only count contributions before this date
+
+    Returns:
+        [(member_name, total), ...] largest first, followed by
+        ("Others", total) when more than `limit` members contributed
+    """
+    if start is None and end is None:
+        # All-time totals are already maintained per member
+        totals = (
+            select(MemberBalance.member_id, MemberBalance.total_contributions.label("total"))
+            .where(MemberBalance.total_contributions > 0)
+            .subquery()
+        )
+    else:
+        query = select(Contribution.member_id, func.sum(Contribution.amount).label("total"))
+        if start is not None:
+            query = query.where(Contribution.contribution_date >= start)
+        if end is not None:
+            query = query.where(Contribution.contribution_date < end)
+        totals = query.group_by(Contribution.member_id).subquery()
+
+    # The window sums are computed over every group before LIMIT applies
+    query = (
+        select(
+            Member.name,
+            totals.c.total,
+            func.sum(totals.c.total).over().label("grand_total"),
+            func.count().over().label("contributors"),
+        )
+        .join(Member, Member.id == totals.c.member_id)
+        .order_by(totals.c.total.desc(), Member.id)
+        .limit(limit)
+    )
+    with session_scope() as session:
+        rows = session.execute(query).all()
+
+    data = [(row.name, row.total) for row in rows]
+    if rows and rows[0].contributors > limit:
+        data.append((OTHERS_LABEL, rows[0].grand_total - sum(total for _, total in data)))
+    return data
+
+
+# ==================== ARREARS OPERATIONS ====================
+
+class BucketTotals(NamedTuple):
+    """Loans in one arrears aging bucket"""
+    bucket: str
+    loans: int
+    outstanding: float
+    arrears_amount: float
+
+
+class PortfolioAtRisk(NamedTuple):
+    """Arrears aging of the scheduled loan portfolio (see get_portfolio_at_risk)"""
+    as_of: datetime  # Oldest refresh in the snapshot; None when no loan is in it
+    loans: int
+    outstanding: float
+    arrears_amount: float
+    buckets: list  # BucketTotals for every arrears.BUCKETS entry, in aging order
+    par_30: float  # Share of outstanding owed by loans more than 30 days past due
+    par_60: float
+    par_90: float
+
+
+def refresh_loan_arrears(loan_ids=None) -> int:
+    """Recompute the arrears snapshot of the given loans, or of every loan; returns the rows written"""
+    with session_scope() as session:
+        written = arrears.refresh_loan_arrears(session.connection(), loan_ids)
+        _tables_changed(session, "loan_arrears")
+    return written
+
+
+@query_cache.cached("loans")
+def get_aged_loans_count() -> int:
+    """Get count of the loans the arrears snapshot covers: disbursed, with a schedule or an end date"""
+    with session_scope() as session:
+        return session.query(Loan).filter(
+            Loan.status.in_(summaries.DISBURSED_STATUSES),
+            or_(Loan.term_months.is_not(None), Loan.end_date.is_not(None)),
+        ).count()
+
+
+@query_cache.cached("loan_arrears")
+def get_portfolio_at_risk() -> PortfolioAtRisk:
+    """
+    Get arrears aging buckets and PAR ratios from the loan_arrears snapshot
+
+    Only disbursed (Active or Defaulted) loans with an installment schedule
+    or an end date are counted. PAR 30 is the outstanding amount of loans
+    more than 30 days past due divided by the outstanding amount of all of
+    them (likewise for 60 and 90).
+    """
+    query = (
+        select(
+            LoanArrears.bucket,
+            func.count(),
+            func.sum(LoanArrears.outstanding),
+            func.sum(LoanArrears.arrears_amount),
+            func.min(LoanArrears.as_of),
+        )
+        .group_by(LoanArrears.bucket)
+    )
+    with session_scope() as session:
+        rows = {row[0]: row for row in session.execute(query)}
+
+    buckets = []
+    par = {30: 0.0, 60: 0.0, 90: 0.0}
+    for name, first_day, _ in arrears.BUCKETS:
+        _, count, outstanding, arrears_amount, _ = rows.get(name, (name, 0, 0.0, 0.0, None))
+        buckets.append(BucketTotals(name, count, outstanding, arrears_amount))
+        for days in par:
+            if first_day > days:
+                par[days] += outstanding
+    total = sum(bucket.outstanding for bucket in buckets)
+    return PortfolioAtRisk(
+        as_of=min((row[4] for row in rows.values()), default=None),
+        loans=sum(bucket.loans for bucket in buckets),
+        outstanding=total,
+        arrears_amount=sum(bucket.arrears_amount for bucket in buckets),
+        buckets=buckets,
+        par_30=par[30] / total if total else 0.0,
+        par_60=par[60] / total if total else 0.0,
+        par_90=par[90] / total if total else 0.0,
+    )
+
+
+# ==================== BATCH JOBS ====================
+
+class AccrualRun(NamedTuple):
+    """Outcome of one run_accrual() call"""
+    run_key: str  # The period processed
+    processed: int  # Loans processed by this call
+    defaulted: int  # Loans this call marked Defaulted
+    chunks: int
+    finished: bool  # False if the time budget ran out or a chunk failed; run again to resume
+    elapsed: float  # Seconds
+
+
+def run_accrual(day: date = None, time_budget: float = None, chunk_size: int = accrual.CHUNK_SIZE,
+                default_after_days: int = accrual.DEFAULT_AFTER_DAYS, pause: float = accrual.CHUNK_PAUSE) -> AccrualRun:
+    """
+    Accrue interest and auto-default active loans for a period, resuming an unfinished run
+
+    Each chunk of loans commits with its checkpoint, so this must not be
+    called inside unit_of_work(). Calling it again for a finished period
+    does nothing.
+
+    Args:
+        day: The period to process (default: today)
+        time_budget: Stop after this many seconds; the next call resumes
+        chunk_size: Loans per transaction
+        default_after_days: Days past due after which an active loan is Defaulted
+        pause: Seconds to leave the database to other writers between chunks
+    """
+    day = day or date.today()
+    run_key = day.isoformat()
+    as_of = accrual.period_end(day)
+    started = time.monotonic()
+    processed = defaulted = chunks = 0
+
+    def outcome(finished: bool) -> AccrualRun:
+        return AccrualRun(run_key, processed, defaulted, chunks, finished, time.monotonic() - started)
+
+    try:
+        with session_scope() as session:
+            last_id = accrual.load_checkpoint(session.connection(), run_key)
+        if last_id is None:
+            return outcome(True)
+
+        while time_budget is None or time.monotonic() - started < time_budget:
+            with session_scope() as session:
+                conn = session.connection()
+                loans = accrual.next_chunk(conn, last_id, chunk_size)
+                if not loans:
+                    accrual.save_checkpoint(conn, last_id, 0, finished=True)
+                    return outcome(True)
+                loan_ids = [loan.id for loan in loans]
+                newly_defaulted = set(accrual.process_chunk(conn, loan_ids, as_of, default_after_days))
+                if newly_defaulted:
+                    summaries.refresh_member_loans(
+                        conn, [member_id for loan_id, member_id in loans if loan_id in newly_defaulted]
+                    )
+                accrual.save_checkpoint(conn, loan_ids[-1], len(loans))
+                _tables_changed(session, "loans", "loan_arrears", "member_balances")
+            last_id = loan_ids[-1]
+            processed += len(loans)
+            defaulted += len(newly_defaulted)
+            chunks += 1
+            time.sleep(pause)
+        return outcome(False)
+    except Exception as e:
+        _write_failed("accruing interest", e)
+        return outcome(False)
+
+
+# ==================== MONTHLY ROLLUP OPERATIONS ====================
+
+@query_cache.cached("monthly_rollups", ttl=60)
+def get_monthly_trend(months: int = 12, kind: str = summaries.ROLLUP_CONTRIBUTION, until: datetime = None):
+    """
+    Get monthly totals for the last N months from the maintained rollups
+
+    Months without activity are returned as 0 so charts stay continuous.
+
+    Returns:
+        (["YYYY-MM", ...], [amount, ...]), oldest month first
+    """
+    until = until or datetime.now()
+    year, month = until.year, until.month
+    labels = []
+    for _ in range(months):
+        labels.append(f"{year:04d}-{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    labels.reverse()
+
+    with session_scope() as session:
+        totals = summaries.monthly_totals(session.connection(), kind, labels[0])
+    return labels, [totals.get(label, 0.0) for label in labels]
+
+
+def rebuild_monthly_rollups() -> int:
+    """Recompute monthly_rollups from scratch; returns the number of rollup rows"""
+    with session_scope() as session:
+        _tables_changed(session, "monthly_rollups")
+        return summaries.rebuild_monthly_rollups(session.connection())
 
 
 # ==================== STATISTICS OPERATIONS ====================
 
+@query_cache.cached("contributions")
 def get_total_contributions():
     """Get total contributions across all members"""
-    session = get_session()
-    try:
+    with session_scope() as session:
         from sqlalchemy import func
         total = session.query(func.sum(Contribution.amount)).scalar()
         return total or 0.0
-    finally:
-        close_session(session)
 
 
+@query_cache.cached("loans")
 def get_total_loans_issued():
     """Get total amount of loans issued"""
-    session = get_session()
-    try:
+    with session_scope() as session:
         from sqlalchemy import func
         total = session.query(func.sum(Loan.amount)).scalar()
         return total or 0.0
-    finally:
-        close_session(session)
 
 
+@query_cache.cached("loans")
 def get_active_loans_count():
     """Get count of active loans"""
-    session = get_session()
-    try:
-        count = session.query(Loan).filter(Loan.status == "Active").count()
-        return count
-    finally:
-        close_session(session)
+    with session_scope() as session:
+        return session.query(Loan).filter(Loan.status == LoanStatus.ACTIVE).count()
 
 
+@query_cache.cached("members")
 def get_total_members():
     """Get total number of members"""
-    session = get_session()
-    try:
-        count = session.query(Member).count()
-        return count
-    finally:
-        close_session(session)
+    with session_scope() as session:
+        return session.query(Member).count()
 
 
-def get_recent_activities(limit: int = 10):
-    """Get recent activities (contributions and repayments)"""
-    session = get_session()
-    try:
-        from sqlalchemy import union_all
-        
-        # Get recent contributions
-        contributions = session.query(
+class DashboardSnapshot(NamedTuple):
+    """Headline dashboard figures (see get_dashboard_snapshot)"""
+    total_members: int
+    total_contributions: float
+    total_loans_issued: float
+    active_loans: int
+    outstanding_principal: float
+    interest_earned: float
+    overdue_loans: int
+
+
+@query_cache.cached("members", "loans", "monthly_rollups", ttl=60)
+def get_dashboard_snapshot(as_of: datetime = None) -> DashboardSnapshot:
+    """
+    Get every headline dashboard figure in one query
+
+    Repayments are split between principal and interest in proportion to
+    the loan's amount and total_interest: interest_earned is the interest
+    share of everything repaid, and outstanding_principal is the principal
+    still owed on disbursed (Active or Defaulted) loans. overdue_loans
+    counts active loans whose end_date has passed.
+    """
+    as_of = as_of or datetime.now()
+    total_due = Loan.amount + Loan.total_interest
+    repaid = case((Loan.amount_repaid > total_due, total_due), else_=Loan.amount_repaid)
+    interest_repaid = case((total_due > 0, repaid * Loan.total_interest / total_due), else_=0.0)
+    is_active = Loan.status == LoanStatus.ACTIVE
+
+    loans = select(
+        func.coalesce(func.sum(Loan.amount), 0.0).label("total_loans_issued"),
+        func.coalesce(func.sum(case((is_active, 1), else_=0)), 0).label("active_loans"),
+        func.coalesce(func.sum(case(
+            (Loan.status.in_(summaries.DISBURSED_STATUSES), Loan.amount - (repaid - interest_repaid)), else_=0.0
+        )), 0.0).label("outstanding_principal"),
+        func.coalesce(func.sum(interest_repaid), 0.0).label("interest_earned"),
+        func.coalesce(func.sum(case((is_active & (Loan.end_date < as_of), 1), else_=0)), 0).label("overdue_loans"),
+    ).subquery()
+
+    query = select(
+        select(func.count(Member.id)).scalar_subquery(),
+        # Contribution total comes from the monthly rollups: one row per month and type
+        select(func.coalesce(func.sum(MonthlyRollup.amount), 0.0))
+        .where(MonthlyRollup.kind == summaries.ROLLUP_CONTRIBUTION)
+        .scalar_subquery(),
+        loans.c.total_loans_issued,
+        loans.c.active_loans,
+        loans.c.outstanding_principal,
+        loans.c.interest_earned,
+        loans.c.overdue_loans,
+    )
+    with session_scope() as session:
+        return DashboardSnapshot(*session.execute(query).one())
+
+
+ACTIVITY_CONTRIBUTION = "Contribution"
+ACTIVITY_REPAYMENT = "Repayment"
+
+
+def _activity_branch(kind: str, query, created_at, id_column, before, limit: int):
+    """One side of the activity UNION: newest first, after the cursor, at most limit rows"""
+    if before is not None:
+        cursor_created_at, cursor_kind, cursor_id = before
+        # Feed order is (created_at, kind, id) descending and kind is constant per branch
+        if kind < cursor_kind:
+            query = query.where(created_at <= cursor_created_at)
+        elif kind == cursor_kind:
+            query = query.where(tuple_(created_at, id_column) < tuple_(cursor_created_at, cursor_id))
+        else:
+            query = query.where(created_at < cursor_created_at)
+    # Ordering and limiting each branch lets it stop early on its created_at index
+    return query.order_by(created_at.desc(), id_column.desc()).limit(limit).subquery()
+
+
+@query_cache.cached("members", "loans", "contributions", "loan_repayments")
+def get_recent_activities(limit: int = 10, before=None) -> Page:
+    """
+    Get the newest contributions and repayments as one feed, in one query
+
+    Items are rows with kind ("Contribution"/"Repayment"), id, member_id,
+    member_name, amount, date and created_at, newest first. Pass the
+    returned next_cursor as before= to load older activity.
+    """
+    contributions = _activity_branch(
+        ACTIVITY_CONTRIBUTION,
+        select(
+            literal(ACTIVITY_CONTRIBUTION).label("kind"),
             Contribution.id,
             Contribution.member_id,
-            Contribution.amount,
+            Member.name.label("member_name"),
+            Contribution.amount.label("amount"),
             Contribution.contribution_date.label("date"),
             Contribution.created_at,
-            "Contribution" .label("type")
-        )
-        
-        # Get recent repayments
-        repayments = session.query(
+        ).join(Member, Member.id == Contribution.member_id),
+        Contribution.created_at, Contribution.id, before, limit + 1,
+    )
+    repayments = _activity_branch(
+        ACTIVITY_REPAYMENT,
+        select(
+            literal(ACTIVITY_REPAYMENT).label("kind"),
             LoanRepayment.id,
             Loan.member_id,
+            Member.name.label("member_name"),
             LoanRepayment.amount_paid.label("amount"),
             LoanRepayment.payment_date.label("date"),
             LoanRepayment.created_at,
-            "Repayment".label("type")
-        ).join(Loan, LoanRepayment.loan_id == Loan.id)
-        
-        # Combine and sort by created_at
-        activities = session.query(contributions.union_all(repayments)).order_by(
-            "-created_at"
-        ).limit(limit).all()
-        
-        return activities
+        ).join(Loan, Loan.id == LoanRepayment.loan_id).join(Member, Member.id == Loan.member_id),
+        LoanRepayment.created_at, LoanRepayment.id, before, limit + 1,
+    )
+    feed = union_all(select(contributions), select(repayments)).subquery()
+    query = (
+        select(feed)
+        .order_by(feed.c.created_at.desc(), feed.c.kind.desc(), feed.c.id.desc())
+        .limit(limit + 1)
+    )
+
+    try:
+        with session_scope() as session:
+            items = session.execute(query).all()
     except Exception as e:
         print(f"Error getting recent activities: {e}")
-        return []
-    finally:
-        close_session(session)
+        return Page([])
+
+    has_more = len(items) > limit
+    items = items[:limit]
+    next_cursor = (items[-1].created_at, items[-1].kind, items[-1].id) if has_more else None
+    return Page(items, next_cursor, None)
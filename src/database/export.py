@@ -0,0 +1,224 @@
+"""
+CSV export of members, loans and contributions
+
+export_tables() reads every table inside one transaction, so the files
+agree with each other even while clerks keep saving: a loan in loans.csv
+always has its member in members.csv. On SQLite that is one BEGIN shared by
+all the cursors; on PostgreSQL a REPEATABLE READ transaction.
+
+The calling thread owns the transaction and takes batch_size rows from
+each table's cursor in turn. Every table has a writer thread that formats its
+rows as CSV and, optionally, gzips them. The reader and writers pass
+batches through queues that hold at most QUEUE_DEPTH batches, so memory
+stays the same whatever the row count.
+
+Files are written under a temporary name and renamed when complete; a
+cancelled or failed export leaves no partial files behind.
+"""
+import csv
+import gzip
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import NamedTuple
+from sqlalchemy import func, select
+from . import connection
+from .models import Contribution, Loan, Member
+
+
+# Batches waiting for each writer; the reader blocks when a writer falls behind
+QUEUE_DEPTH = 4
+
+# zlib's default: most of level 9's size for a fraction of its time
+GZIP_LEVEL = 6
+
+
+def _day(value: datetime) -> str:
+    return value.strftime("%Y-%m-%d") if value else ""
+
+
+class ExportTable(NamedTuple):
+    """One exported table: the file name, CSV header, query and row formatter"""
+    name: str
+    header: tuple
+    query: object
+    format_row: object
+
+
+EXPORT_TABLES = (
+    ExportTable(
+        "members",
+        ("ID", "Name", "Contact", "Email", "Status", "Join Date"),
+        select(Member.id, Member.name, Member.contact, Member.email, Member.status, Member.join_date)
+        .order_by(Member.id),
+        lambda m: (m.id, m.name, m.contact or "", m.email or "", m.status.value, _day(m.join_date)),
+    ),
+    ExportTable(
+        "loans",
+        ("ID", "Member ID", "Amount", "Interest %", "Repaid", "Status", "Start Date"),
+        select(
+            Loan.id, Loan.member_id, Loan.amount, Loan.interest_rate, Loan.amount_repaid, Loan.status, Loan.start_date,
+        ).order_by(Loan.id),
+        lambda l: (l.id, l.member_id, l.amount, l.interest_rate, l.amount_repaid, l.status.value, _day(l.start_date)),
+    ),
+    ExportTable(
+        "contributions",
+        ("ID", "Member ID", "Amount", "Type", "Date", "Month"),
+        select(
+            Contribution.id, Contribution.member_id, Contribution.amount, Contribution.contribution_type,
+            Contribution.contribution_date, Contribution.month,
+        ).order_by(Contribution.id),
+        lambda c: (c.id, c.member_id, c.amount, c.contribution_type.value, _day(c.contribution_date), c.month or ""),
+    ),
+)
+
+
+class ExportResult(NamedTuple):
+    """Outcome of one export_tables() call"""
+    files: list  # Paths written, empty if cancelled
+    rows: int
+    cancelled: bool
+    elapsed: float  # Seconds
+
+
+# ==================== SNAPSHOT ====================
+
+def _begin_snapshot(conn):
+    """Start a transaction in which every read sees the database as of one moment"""
+    if conn.dialect.name == "sqlite":
+        # pysqlite only opens a transaction before writes; reads would each see the latest commit
+        conn.exec_driver_sql("BEGIN")
+    else:
+        conn.execution_options(isolation_level="REPEATABLE READ")
+
+
+def _read_tables(conn, tables, queues, batch_size: int, stopped):
+    """Feed every table's rows to its writer, batch_size at a time and one table after another"""
+    results = [conn.execute(table.query.execution_options(yield_per=batch_size)) for table in tables]
+    active = list(range(len(tables)))
+    while active and not stopped():
+        for index in list(active):
+            batch = results[index].fetchmany(batch_size)
+            if not batch:
+                active.remove(index)  # The empty batch tells the writer its table is done
+            if not _put(queues[index], batch, stopped):
+                return
+
+
+def _put(batches: queue.Queue, batch: list, stopped) -> bool:
+    """Hand a batch to a writer, giving up if the export is stopped while waiting"""
+    while not stopped():
+        try:
+            batches.put(batch, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+# ==================== WRITERS ====================
+
+def _open(path: str, compress: bool):
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=GZIP_LEVEL)
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def _write_table(table: ExportTable, path: str, compress: bool, batches: queue.Queue, stopped, on_rows):
+    """Write one table's batches to path (writer thread); an empty batch ends the table"""
+    with _open(path, compress) as file:
+        writer = csv.writer(file)
+        writer.writerow(table.header)
+        while not stopped():
+            try:
+                batch = batches.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if not batch:
+                return
+            writer.writerows(map(table.format_row, batch))
+            on_rows(len(batch))
+
+
+# ==================== EXPORT ====================
+
+def export_tables(exports_dir: str, compress: bool = False, progress=None, cancel: threading.Event = None,
+                  batch_size: int = connection.STREAM_BATCH_SIZE, tables=EXPORT_TABLES) -> ExportResult:
+    """
+    Export tables to timestamped CSV files (.csv.gz when compress) from one consistent snapshot
+
+    Args:
+        exports_dir: Directory for the files (created if missing)
+        compress: gzip the files
+        progress: Called with (rows written, total rows) after every batch, from the writer threads
+        cancel: Set it to stop the export; no files are kept
+        batch_size: Rows per batch read from the database and handed to a writer
+
+    Raises:
+        The first error of the reader or a writer; no files are kept
+    """
+    started = time.monotonic()
+    os.makedirs(exports_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    extension = ".csv.gz" if compress else ".csv"
+    paths = [os.path.join(exports_dir, f"{table.name}_{timestamp}{extension}") for table in tables]
+
+    cancel = cancel or threading.Event()
+    failed = threading.Event()
+    errors = []
+    counted = {"rows": 0}
+    lock = threading.Lock()
+
+    with connection.engine.connect() as conn:
+        _begin_snapshot(conn)
+        total = sum(
+            conn.execute(select(func.count()).select_from(table.query.order_by(None).subquery())).scalar()
+            for table in tables
+        )
+
+        def stopped() -> bool:
+            return cancel.is_set() or failed.is_set()
+
+        def on_rows(count: int):
+            with lock:
+                counted["rows"] += count
+                done = counted["rows"]
+            if progress:
+                progress(done, total)
+
+        def guarded(function, *args):
+            try:
+                function(*args)
+            except Exception as e:
+                errors.append(e)
+                failed.set()
+
+        queues = [queue.Queue(QUEUE_DEPTH) for _ in tables]
+        writers = [
+            threading.Thread(
+                target=guarded, args=(_write_table, table, path + ".tmp", compress, batches, stopped, on_rows),
+                name=f"lms-export-{table.name}", daemon=True,
+            )
+            for table, path, batches in zip(tables, paths, queues)
+        ]
+        for writer in writers:
+            writer.start()
+        guarded(_read_tables, conn, tables, queues, batch_size, stopped)
+        for writer in writers:
+            writer.join()
+        conn.rollback()
+
+    cancelled = cancel.is_set()
+    if errors or cancelled:
+        for path in paths:
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+        if errors:
+            raise errors[0]
+        return ExportResult([], counted["rows"], True, time.monotonic() - started)
+
+    for path in paths:
+        os.replace(path + ".tmp", path)
+    return ExportResult(paths, counted["rows"], False, time.monotonic() - started)
@@ -0,0 +1,95 @@
+"""
+Process-wide directory of member names
+
+The loan and contribution screens need every member's name for their tables
+and member pickers. Before the directory existed, each screen queried all
+members every time it was built. The directory loads the names once and
+keeps two indexes: id -> name, and (name, id) pairs sorted by name.
+create_member, update_member and delete_member in connection.py patch it
+after their transaction commits, so it never shows uncommitted or
+rolled-back changes.
+"""
+import bisect
+import threading
+
+
+class MemberDirectory:
+    """Cached id -> name map and sorted name index, loaded on first use"""
+
+    def __init__(self, loader):
+        # loader() returns an iterable of (member_id, name) pairs
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._names = None
+        self._sorted = None
+
+    def _ensure_loaded(self):
+        """Load the directory if it is empty; caller holds the lock"""
+        if self._names is None:
+            self._names = dict(self._loader())
+            self._sorted = sorted(
+                (self._sort_key(name), member_id, name) for member_id, name in self._names.items()
+            )
+
+    @staticmethod
+    def _sort_key(name: str) -> str:
+        return name.casefold()
+
+    # ==================== READS ====================
+
+    def name_of(self, member_id: int, default: str = "Unknown") -> str:
+        """Get the name of a member"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._names.get(member_id, default)
+
+    def names(self) -> dict:
+        """Get a copy of the id -> name map"""
+        with self._lock:
+            self._ensure_loaded()
+            return dict(self._names)
+
+    def sorted_members(self) -> list:
+        """Get (member_id, name) pairs ordered by name"""
+        with self._lock:
+            self._ensure_loaded()
+            return [(member_id, name) for _, member_id, name in self._sorted]
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._names)
+
+    # ==================== WRITE-THROUGH ====================
+
+    def put(self, member_id: int, name: str):
+        """Add a member or rename an existing one"""
+        with self._lock:
+            if self._names is None:
+                return  # Not loaded yet; the next read loads the current names
+            self._discard(member_id)
+            self._names[member_id] = name
+            bisect.insort(self._sorted, (self._sort_key(name), member_id, name))
+
+    def remove(self, member_id: int):
+        """Drop a deleted member"""
+        with self._lock:
+            if self._names is None:
+                return
+            self._discard(member_id)
+
+    def invalidate(self):
+        """Forget everything; the next read reloads from the database"""
+        with self._lock:
+            self._names = None
+            self._sorted = None
+
+    def _discard(self, member_id: int):
+        """Remove a member from both indexes; caller holds the lock"""
+        name = self._names.pop(member_id, None)
+        if name is None:
+            return
+        entry = (self._sort_key(name), member_id, name)
+        index = bisect.bisect_left(self._sorted, entry)
+        if index < len(self._sorted) and self._sorted[index] == entry:
+            del self._sorted[index]
@@ -0,0 +1,278 @@
+"""
+Versioned schema migrations
+
+The schema version is stored in SQLite's PRAGMA user_version, or in a
+one-row schema_version table on other databases. init_db() runs
+create_all() for missing tables and then upgrade() to apply every migration
+newer than the stored version, so existing loan_manager.db files are
+upgraded in place at startup.
+
+SQLite commits DDL as it runs, so every migration must be safe to run again
+(CREATE ... IF NOT EXISTS) in case it was interrupted half-way. Migrations
+also run on PostgreSQL, so any SQLite-only statement needs a dialect check.
+
+Backfills are written out as SQL here rather than calling the data layer,
+so a later change to summaries.py or arrears.py does not change what an old
+migration computes.
+"""
+from datetime import datetime
+from sqlalchemy import DateTime, bindparam, inspect, text
+from sqlalchemy.exc import OperationalError
+
+
+def _add_filter_indexes(conn):
+    """Secondary indexes for the member, status, month and date filters"""
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_members_created_at ON members (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_loans_member_id ON loans (member_id)",
+        "CREATE INDEX IF NOT EXISTS ix_loans_status ON loans (status)",
+        "CREATE INDEX IF NOT EXISTS ix_loans_created_at ON loans (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_loans_active_member ON loans (member_id) WHERE status = 'ACTIVE'",
+        "CREATE INDEX IF NOT EXISTS ix_loans_active_end_date ON loans (end_date) WHERE status = 'ACTIVE'",
+        "CREATE INDEX IF NOT EXISTS ix_loan_repayments_loan_date ON loan_repayments (loan_id, payment_date)",
+        "CREATE INDEX IF NOT EXISTS ix_loan_repayments_created_at ON loan_repayments (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_contributions_member_date ON contributions (member_id, contribution_date)",
+        "CREATE INDEX IF NOT EXISTS ix_contributions_month ON contributions (month)",
+        "CREATE INDEX IF NOT EXISTS ix_contributions_contribution_date ON contributions (contribution_date)",
+        "CREATE INDEX IF NOT EXISTS ix_contributions_created_at ON contributions (created_at)",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+    if conn.dialect.name == "sqlite":
+        # Refresh planner statistics so the new (partial) indexes get picked
+        conn.execute(text("ANALYZE"))
+
+
+def _backfill_member_balances(conn):
+    """Fill member_balances from the existing transaction tables"""
+    conn.execute(text("DELETE FROM member_balances"))
+    conn.execute(text("""
+        INSERT INTO member_balances (
+            member_id, total_contributions, contribution_count, loan_count, active_loan_count,
+            total_borrowed, total_repaid, outstanding_balance, updated_at)
+        SELECT m.id,
+               COALESCE(c.total_contributions, 0.0), COALESCE(c.contribution_count, 0),
+               COALESCE(l.loan_count, 0), COALESCE(l.active_loan_count, 0),
+               COALESCE(l.total_borrowed, 0.0), COALESCE(l.total_repaid, 0.0),
+               COALESCE(l.outstanding_balance, 0.0), :now
+        FROM members m
+        LEFT JOIN (
+            SELECT member_id, SUM(amount) AS total_contributions, COUNT(id) AS contribution_count
+            FROM contributions GROUP BY member_id
+        ) c ON c.member_id = m.id
+        LEFT JOIN (
+            SELECT member_id, COUNT(id) AS loan_count,
+                   SUM(CASE WHEN status = 'ACTIVE' THEN 1 ELSE 0 END) AS active_loan_count,
+                   SUM(amount) AS total_borrowed, SUM(amount_repaid) AS total_repaid,
+                   SUM(amount + total_interest - amount_repaid) AS outstanding_balance
+            FROM loans GROUP BY member_id
+        ) l ON l.member_id = m.id
+    """).bindparams(bindparam("now", datetime.now(), type_=DateTime)))
+
+
+def _backfill_monthly_rollups(conn):
+    """Fill monthly_rollups from the existing transaction tables"""
+    if conn.dialect.name == "postgresql":
+        contribution_month = "to_char(contribution_date, 'YYYY-MM')"
+        repayment_month = "to_char(payment_date, 'YYYY-MM')"
+    else:
+        contribution_month = "strftime('%Y-%m', contribution_date)"
+        repayment_month = "strftime('%Y-%m', payment_date)"
+    conn.execute(text("DELETE FROM monthly_rollups"))
+    conn.execute(text(f"""
+        INSERT INTO monthly_rollups (month, kind, contribution_type, amount, "count")
+        SELECT {contribution_month}, 'Contribution', contribution_type, SUM(amount), COUNT(*)
+        FROM contributions GROUP BY {contribution_month}, contribution_type
+        UNION ALL
+        SELECT {repayment_month}, 'Repayment', '', SUM(amount_paid), COUNT(*)
+        FROM loan_repayments GROUP BY {repayment_month}
+    """))
+
+
+def _add_pagination_indexes(conn):
+    """Indexes behind the sort keys offered by the paginated queries"""
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_members_name ON members (name)",
+        "CREATE INDEX IF NOT EXISTS ix_members_status_name ON members (status, name)",
+        "CREATE INDEX IF NOT EXISTS ix_loans_status_created_at ON loans (status, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_loan_repayments_payment_date ON loan_repayments (payment_date)",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def _add_member_search_index(conn):
+    """FTS5 index over member name, contact and email, kept in sync by triggers (SQLite only)"""
+    if conn.dialect.name != "sqlite":
+        return
+    try:
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS members_fts USING fts5("
+            "name, contact, email, content='members', content_rowid='id', tokenize='unicode61')"
+        ))
+    except OperationalError as e:
+        # SQLite built without FTS5: search_members() falls back to LIKE
+        print(f"Member search index not created: {e}")
+        return
+    statements = [
+        """CREATE TRIGGER IF NOT EXISTS members_fts_insert AFTER INSERT ON members BEGIN
+            INSERT INTO members_fts (rowid, name, contact, email)
+            VALUES (new.id, new.name, new.contact, new.email);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS members_fts_delete AFTER DELETE ON members BEGIN
+            INSERT INTO members_fts (members_fts, rowid, name, contact, email)
+            VALUES ('delete', old.id, old.name, old.contact, old.email);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS members_fts_update AFTER UPDATE OF name, contact, email ON members BEGIN
+            INSERT INTO members_fts (members_fts, rowid, name, contact, email)
+            VALUES ('delete', old.id, old.name, old.contact, old.email);
+            INSERT INTO members_fts (rowid, name, contact, email)
+            VALUES (new.id, new.name, new.contact, new.email);
+        END""",
+        # Index the members that already exist
+        "INSERT INTO members_fts (members_fts) VALUES ('rebuild')",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def _add_columns(conn, table: str, columns: list):
+    """ALTER TABLE ... ADD COLUMN for each (name, definition) the table does not have yet"""
+    existing = {column["name"] for column in inspect(conn).get_columns(table)}
+    for name, definition in columns:
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {definition}"))
+
+
+def _add_loan_terms(conn):
+    """Loan term and interest method columns for amortization schedules"""
+    _add_columns(conn, "loans", [
+        ("term_months", "INTEGER"),
+        ("interest_method", "VARCHAR(16) NOT NULL DEFAULT 'FLAT'"),
+    ])
+    # loan_installments itself is created by create_all(); existing loans have no
+    # term, so they keep their single flat charge and get no schedule
+
+
+def _backfill_loan_arrears(conn):
+    """Fill loan_arrears from the existing schedules and repayments"""
+    if conn.dialect.name == "postgresql":
+        days_past_due = "CAST(:as_of AS DATE) - CAST(oldest_unpaid AS DATE)"
+    else:
+        days_past_due = "CAST(julianday(date(:as_of)) - julianday(date(oldest_unpaid)) AS INTEGER)"
+    conn.execute(text("DELETE FROM loan_arrears"))
+    # Disbursed loans only; a loan without a term is owed in full on its end date
+    conn.execute(text(f"""
+        WITH scheduled AS (
+            SELECT i.loan_id, i.due_date, i.amount_due,
+                   SUM(i.amount_due) OVER (PARTITION BY i.loan_id ORDER BY i.number) AS cumulative_due
+            FROM loan_installments i JOIN loans l ON l.id = i.loan_id
+            WHERE l.status IN ('ACTIVE', 'DEFAULTED')
+            UNION ALL
+            SELECT id, end_date, amount + total_interest, amount + total_interest
+            FROM loans
+            WHERE status IN ('ACTIVE', 'DEFAULTED') AND term_months IS NULL AND end_date IS NOT NULL
+        ),
+        paid AS (
+            SELECT loan_id, SUM(amount_paid) AS paid FROM loan_repayments GROUP BY loan_id
+        ),
+        positions AS (
+            SELECT s.loan_id,
+                   SUM(CASE WHEN s.due_date <= :as_of THEN s.amount_due ELSE 0.0 END) AS expected,
+                   SUM(s.amount_due) AS scheduled_total,
+                   COALESCE(MAX(p.paid), 0.0) AS paid,
+                   MIN(CASE WHEN s.due_date <= :as_of AND s.cumulative_due > COALESCE(p.paid, 0.0) + 0.005
+                            THEN s.due_date END) AS oldest_unpaid
+            FROM scheduled s LEFT JOIN paid p ON p.loan_id = s.loan_id
+            GROUP BY s.loan_id
+        ),
+        aged AS (
+            SELECT positions.loan_id, loans.member_id,
+                   CASE WHEN oldest_unpaid IS NULL THEN 0 ELSE {days_past_due} END AS days_past_due,
+                   expected - paid AS arrears_amount,
+                   scheduled_total - paid AS outstanding
+            FROM positions JOIN loans ON loans.id = positions.loan_id
+        )
+        INSERT INTO loan_arrears (loan_id, member_id, as_of, days_past_due, bucket, arrears_amount, outstanding)
+        SELECT loan_id, member_id, :as_of, days_past_due,
+               CASE WHEN days_past_due <= 0 THEN 'Current'
+                    WHEN days_past_due <= 30 THEN '1-30'
+                    WHEN days_past_due <= 60 THEN '31-60'
+                    WHEN days_past_due <= 90 THEN '61-90'
+                    ELSE '90+' END,
+               CASE WHEN arrears_amount > 0.005 THEN arrears_amount ELSE 0.0 END,
+               CASE WHEN outstanding > 0 THEN outstanding ELSE 0.0 END
+        FROM aged
+    """).bindparams(bindparam("as_of", datetime.now(), type_=DateTime)))
+
+
+def _add_interest_accrual(conn):
+    """Accrued interest columns for the accrual batch job (batch_checkpoints comes from create_all())"""
+    _add_columns(conn, "loans", [
+        ("accrued_interest", "FLOAT NOT NULL DEFAULT 0"),
+        ("accrued_through", "TIMESTAMP" if conn.dialect.name == "postgresql" else "DATETIME"),
+    ])
+
+
+def _exclude_pending_loans_from_balances(conn):
+    """Recompute total_borrowed and outstanding_balance without loans that have not been paid out"""
+    conn.execute(text("""
+        UPDATE member_balances SET
+            total_borrowed = (
+                SELECT COALESCE(SUM(amount), 0.0) FROM loans
+                WHERE loans.member_id = member_balances.member_id AND status <> 'PENDING'),
+            outstanding_balance = (
+                SELECT COALESCE(SUM(amount + total_interest - amount_repaid), 0.0) FROM loans
+                WHERE loans.member_id = member_balances.member_id AND status IN ('ACTIVE', 'DEFAULTED'))
+    """))
+
+
+# (version, description, function) in ascending version order. Never edit a
+# shipped migration; append a new one instead.
+MIGRATIONS = [
+    (1, "Add secondary indexes for filters", _add_filter_indexes),
+    (2, "Backfill member balances", _backfill_member_balances),
+    (3, "Backfill monthly rollups", _backfill_monthly_rollups),
+    (4, "Add indexes for paginated sorting", _add_pagination_indexes),
+    (5, "Add full-text member search index", _add_member_search_index),
+    (6, "Add loan terms for amortization schedules", _add_loan_terms),
+    (7, "Backfill loan arrears", _backfill_loan_arrears),
+    (8, "Add interest accrual columns", _add_interest_accrual),
+    (9, "Leave pending loans out of member balances", _exclude_pending_loans_from_balances),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn) -> int:
+    """Get the schema version stored in the database"""
+    if conn.dialect.name == "sqlite":
+        return conn.execute(text("PRAGMA user_version")).scalar() or 0
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def _set_schema_version(conn, version: int):
+    """Store the schema version in the database"""
+    if conn.dialect.name == "sqlite":
+        conn.execute(text(f"PRAGMA user_version = {int(version)}"))
+        return
+    conn.execute(text("DELETE FROM schema_version"))
+    conn.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": int(version)})
+
+
+def upgrade(engine) -> int:
+    """Apply all pending migrations and return the resulting schema version"""
+    with engine.begin() as conn:
+        version = get_schema_version(conn)
+
+    for number, description, migrate in MIGRATIONS:
+        if number <= version:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            _set_schema_version(conn, number)
+        print(f"✓ Migrated database to version {number}: {description}")
+        version = number
+
+    return version
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Boolean, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -20,6 +20,11 @@ class LoanStatus(enum.Enum):
     DEFAULTED = "Defaulted"
 
 
+class InterestMethod(enum.Enum):
+    FLAT = "Flat"
+    REDUCING_BALANCE = "Reducing balance"
+
+
 class ContributionType(enum.Enum):
     MONTHLY = "Monthly"
     WEEKLY = "Weekly"
@@ -29,6 +34,11 @@ class ContributionType(enum.Enum):
 class Member(Base):
     """Member model - stores information about group members"""
     __tablename__ = "members"
+    __table_args__ = (
+        Index("ix_members_created_at", "created_at"),
+        Index("ix_members_name", "name"),
+        Index("ix_members_status_name", "status", "name"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(100), nullable=False)
@@ -50,30 +60,95 @@ class Member(Base):
 class Loan(Base):
     """Loan model - stores loan information for members"""
     __tablename__ = "loans"
+    __table_args__ = (
+        Index("ix_loans_member_id", "member_id"),
+        Index("ix_loans_status", "status"),
+        Index("ix_loans_created_at", "created_at"),
+        Index("ix_loans_status_created_at", "status", "created_at"),
+        # Partial indexes: only active loans, which is what the dashboard and batch jobs scan
+        Index("ix_loans_active_member", "member_id",
+              sqlite_where=text("status = 'ACTIVE'"), postgresql_where=text("status = 'ACTIVE'")),
+        Index("ix_loans_active_end_date", "end_date",
+              sqlite_where=text("status = 'ACTIVE'"), postgresql_where=text("status = 'ACTIVE'")),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     member_id = Column(Integer, ForeignKey("members.id"), nullable=False)
     amount = Column(Float, nullable=False)
-    interest_rate = Column(Float, default=0.0, nullable=False)  # Interest rate in percentage
+    interest_rate = Column(Float, default=0.0, nullable=False)  # Interest rate in percentage (per year when term_months is set)
+    term_months = Column(Integer, nullable=True)  # Number of monthly installments; None for a single flat charge
+    interest_method = Column(Enum(InterestMethod, native_enum=False), default=InterestMethod.FLAT,
+                             server_default="FLAT", nullable=False)
     start_date = Column(DateTime, default=datetime.now, nullable=False)
     end_date = Column(DateTime, nullable=True)
     status = Column(Enum(LoanStatus), default=LoanStatus.PENDING, nullable=False)
     total_interest = Column(Float, default=0.0, nullable=False)
     amount_repaid = Column(Float, default=0.0, nullable=False)
+    accrued_interest = Column(Float, default=0.0, server_default="0", nullable=False)  # Interest earned so far (see accrual.py)
+    accrued_through = Column(DateTime, nullable=True)  # End of the last accrual period
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
     # Relationships
     member = relationship("Member", back_populates="loans")
     repayments = relationship("LoanRepayment", back_populates="loan", cascade="all, delete-orphan")
+    installments = relationship("LoanInstallment", back_populates="loan", cascade="all, delete-orphan",
+                                order_by="LoanInstallment.number")
+    arrears = relationship("LoanArrears", cascade="all, delete-orphan", uselist=False)
 
     def __repr__(self):
         return f"<Loan(id={self.id}, member_id={self.member_id}, amount={self.amount}, status={self.status})>"
 
 
+class LoanInstallment(Base):
+    """Loan installment model - one row of a loan's amortization schedule"""
+    __tablename__ = "loan_installments"
+    # Clustered on (loan_id, number): one B-tree instead of a rowid table plus a key index.
+    # Rebuilding every schedule rewrites most of this table, so it has no other index.
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    loan_id = Column(Integer, ForeignKey("loans.id"), primary_key=True)
+    number = Column(Integer, primary_key=True)  # 1 for the first installment
+    due_date = Column(DateTime, nullable=False)
+    principal = Column(Float, nullable=False)
+    interest = Column(Float, nullable=False)
+    amount_due = Column(Float, nullable=False)  # principal + interest
+    balance = Column(Float, nullable=False)  # Principal still owed after this installment
+
+    # Relationships
+    loan = relationship("Loan", back_populates="installments")
+
+    def __repr__(self):
+        return f"<LoanInstallment(loan_id={self.loan_id}, number={self.number}, amount_due={self.amount_due})>"
+
+
+class LoanArrears(Base):
+    """Loan arrears model - how far behind schedule a loan was at the last refresh (see arrears.py)"""
+    __tablename__ = "loan_arrears"
+    __table_args__ = (
+        Index("ix_loan_arrears_bucket", "bucket"),
+    )
+
+    loan_id = Column(Integer, ForeignKey("loans.id"), primary_key=True)
+    member_id = Column(Integer, ForeignKey("members.id"), nullable=False)
+    as_of = Column(DateTime, nullable=False)  # When these figures were computed
+    days_past_due = Column(Integer, default=0, nullable=False)  # Age of the oldest unpaid installment
+    bucket = Column(String(16), nullable=False)  # Aging bucket, e.g. "1-30"
+    arrears_amount = Column(Float, default=0.0, nullable=False)  # Installments due but not yet paid
+    outstanding = Column(Float, default=0.0, nullable=False)  # Scheduled total still owed
+
+    def __repr__(self):
+        return f"<LoanArrears(loan_id={self.loan_id}, days_past_due={self.days_past_due}, bucket={self.bucket})>"
+
+
 class LoanRepayment(Base):
     """Loan Repayment model - tracks individual loan repayments"""
     __tablename__ = "loan_repayments"
+    __table_args__ = (
+        Index("ix_loan_repayments_loan_date", "loan_id", "payment_date"),
+        Index("ix_loan_repayments_created_at", "created_at"),
+        Index("ix_loan_repayments_payment_date", "payment_date"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     loan_id = Column(Integer, ForeignKey("loans.id"), nullable=False)
@@ -92,6 +167,12 @@ class LoanRepayment(Base):
 class Contribution(Base):
     """Contribution model - tracks member contributions"""
     __tablename__ = "contributions"
+    __table_args__ = (
+        Index("ix_contributions_member_date", "member_id", "contribution_date"),
+        Index("ix_contributions_month", "month"),
+        Index("ix_contributions_contribution_date", "contribution_date"),
+        Index("ix_contributions_created_at", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     member_id = Column(Integer, ForeignKey("members.id"), nullable=False)
@@ -107,3 +188,51 @@ class Contribution(Base):
 
     def __repr__(self):
         return f"<Contribution(id={self.id}, member_id={self.member_id}, amount={self.amount})>"
+
+
+class MemberBalance(Base):
+    """Member balance model - running totals per member, kept up to date by every write"""
+    __tablename__ = "member_balances"
+
+    member_id = Column(Integer, ForeignKey("members.id"), primary_key=True)
+    total_contributions = Column(Float, default=0.0, server_default="0", nullable=False)
+    contribution_count = Column(Integer, default=0, server_default="0", nullable=False)
+    loan_count = Column(Integer, default=0, server_default="0", nullable=False)
+    active_loan_count = Column(Integer, default=0, server_default="0", nullable=False)
+    total_borrowed = Column(Float, default=0.0, server_default="0", nullable=False)  # Loans paid out, not Pending
+    total_repaid = Column(Float, default=0.0, server_default="0", nullable=False)
+    outstanding_balance = Column(Float, default=0.0, server_default="0", nullable=False)  # Principal + interest - repaid on disbursed loans
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f"<MemberBalance(member_id={self.member_id}, total_contributions={self.total_contributions}, outstanding_balance={self.outstanding_balance})>"
+
+
+class MonthlyRollup(Base):
+    """Monthly rollup model - contribution and repayment totals per month, kept up to date by every write"""
+    __tablename__ = "monthly_rollups"
+
+    month = Column(String(7), primary_key=True)  # Format: YYYY-MM
+    kind = Column(String(12), primary_key=True)  # "Contribution" or "Repayment"
+    contribution_type = Column(String(10), primary_key=True, default="")  # ContributionType name; "" for repayments
+    amount = Column(Float, default=0.0, server_default="0", nullable=False)
+    count = Column(Integer, default=0, server_default="0", nullable=False)
+
+    def __repr__(self):
+        return f"<MonthlyRollup(month='{self.month}', kind='{self.kind}', amount={self.amount}, count={self.count})>"
+
+
+class BatchCheckpoint(Base):
+    """Batch checkpoint model - how far a resumable batch job got (see accrual.py)"""
+    __tablename__ = "batch_checkpoints"
+
+    job = Column(String(50), primary_key=True)
+    run_key = Column(String(32), nullable=False)  # The period being processed, e.g. "2026-10-18"
+    last_id = Column(Integer, default=0, nullable=False)  # Highest ID already processed in this run
+    processed = Column(Integer, default=0, nullable=False)
+    started_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    finished_at = Column(DateTime, nullable=True)  # None while the run is incomplete
+
+    def __repr__(self):
+        return f"<BatchCheckpoint(job={self.job}, run_key={self.run_key}, last_id={self.last_id})>"
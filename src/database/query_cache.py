@@ -0,0 +1,161 @@
+"""
+Memoization for the read functions in connection.py
+
+Results are keyed by function and arguments. Each entry records the version
+of every table the function reads. The write functions bump a table's
+version, and an entry read against an older version counts as a miss and is
+dropped, so a cached result never outlives a change to its tables. Entries
+are evicted least-recently-used first once the entry count or the
+estimated memory of the cache goes over its limits.
+"""
+import functools
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+
+class CacheStats(NamedTuple):
+    """Counters for monitoring the query cache"""
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    size_bytes: int
+
+
+def _sizeof(value, budget: int) -> int:
+    """Rough deep size of a result in bytes; stops counting once past budget"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        children = (item for pair in value.items() for item in pair)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        children = iter(value)
+    else:
+        return size
+    for child in children:
+        if size > budget:
+            break
+        size += _sizeof(child, budget - size)
+    return size
+
+
+def _make_key(function, args, kwargs):
+    """Hashable cache key for a call, or None if an argument cannot be hashed"""
+    def freeze(value):
+        if isinstance(value, (list, set, frozenset)):
+            return tuple(value)
+        return value
+
+    key = (
+        function.__qualname__,
+        tuple(freeze(arg) for arg in args),
+        tuple(sorted((name, freeze(value)) for name, value in kwargs.items())),
+    )
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class QueryCache:
+    """LRU cache of read results, invalidated by per-table version counters"""
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 32 * 1024 * 1024, bypass=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # bypass() returning True skips the cache (e.g. inside an uncommitted transaction)
+        self._bypass = bypass or (lambda: False)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (versions, expires_at, size, value)
+        self._versions = {}
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    # ==================== INVALIDATION ====================
+
+    def bump(self, *tables: str):
+        """Mark tables as changed; every cached result that read them goes stale"""
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def clear(self):
+        """Drop every entry (the counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> CacheStats:
+        """Get the hit, miss and eviction counters and the current size"""
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions, len(self._entries), self._size)
+
+    # ==================== MEMOIZATION ====================
+
+    def cached(self, *tables: str, ttl: float = None):
+        """
+        Decorator caching a read function that depends on the given tables
+
+        Pass ttl (seconds) for results that also depend on the clock, such
+        as "overdue as of now". Results are shared between callers and must
+        be treated as read-only; top-level lists and dicts are copied.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                key = None if self._bypass() else _make_key(function, args, kwargs)
+                if key is None:
+                    return function(*args, **kwargs)
+
+                with self._lock:
+                    versions = tuple(self._versions.get(table, 0) for table in tables)
+                    entry = self._entries.get(key)
+                    if entry is not None:
+                        if entry[0] == versions and (entry[1] is None or entry[1] > time.monotonic()):
+                            self._entries.move_to_end(key)
+                            self._hits += 1
+                            return _copy(entry[3])
+                        self._drop(key)
+                    self._misses += 1
+
+                value = function(*args, **kwargs)
+                self._store(key, versions, None if ttl is None else time.monotonic() + ttl, value)
+                return _copy(value)
+
+            wrapper.cache_tables = tables
+            return wrapper
+        return decorator
+
+    def _store(self, key, versions: tuple, expires_at, value):
+        """Add an entry and evict the least recently used ones over the limits"""
+        # A single result bigger than a quarter of the cache is not worth keeping
+        size = _sizeof(value, self.max_bytes // 4)
+        if size > self.max_bytes // 4:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (versions, expires_at, size, value)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _drop(self, key):
+        """Remove one entry; caller holds the lock"""
+        entry = self._entries.pop(key)
+        self._size -= entry[2]
+
+
+def _copy(value):
+    """Shallow copy of mutable top-level containers so callers cannot alter the cached one"""
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, dict):
+        return dict(value)
+    return value
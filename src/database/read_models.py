@@ -0,0 +1,129 @@
+"""
+Read models returned by the query functions
+
+Each row type is a named tuple filled from a Core select() of just its
+columns. Unlike ORM instances, these rows have no identity map and no
+instrumentation state, and they never try to lazy-load after the session
+closes. Each row costs one tuple. Writes still go through the ORM models
+in models.py.
+"""
+from datetime import datetime
+from typing import NamedTuple
+from sqlalchemy import select
+from .models import (
+    Contribution, ContributionType, InterestMethod, Loan, LoanInstallment, LoanRepayment, LoanStatus, Member,
+    MemberBalance, MemberStatus,
+)
+
+
+class MemberRow(NamedTuple):
+    """A member as shown in lists and dialogs"""
+    id: int
+    name: str
+    contact: str
+    email: str
+    join_date: datetime
+    status: MemberStatus
+    created_at: datetime
+
+
+class LoanRow(NamedTuple):
+    """A loan as shown in lists and dialogs"""
+    id: int
+    member_id: int
+    amount: float
+    interest_rate: float
+    total_interest: float
+    amount_repaid: float
+    status: LoanStatus
+    start_date: datetime
+    end_date: datetime
+    created_at: datetime
+    term_months: int
+    interest_method: InterestMethod
+
+
+class InstallmentRow(NamedTuple):
+    """One installment of a loan's amortization schedule"""
+    loan_id: int
+    number: int
+    due_date: datetime
+    principal: float
+    interest: float
+    amount_due: float
+    balance: float
+
+
+class RepaymentRow(NamedTuple):
+    """A single loan repayment"""
+    id: int
+    loan_id: int
+    amount_paid: float
+    payment_date: datetime
+    notes: str
+    created_at: datetime
+
+
+class ContributionRow(NamedTuple):
+    """A single member contribution"""
+    id: int
+    member_id: int
+    amount: float
+    contribution_type: ContributionType
+    contribution_date: datetime
+    month: str
+    notes: str
+    created_at: datetime
+
+
+class BalanceRow(NamedTuple):
+    """The maintained running totals of one member"""
+    member_id: int
+    total_contributions: float
+    contribution_count: int
+    loan_count: int
+    active_loan_count: int
+    total_borrowed: float
+    total_repaid: float
+    outstanding_balance: float
+
+
+class StatementRow(NamedTuple):
+    """One line of a member statement (computed by get_member_statement, not read from one table)"""
+    entry_date: datetime
+    kind: str
+    reference_id: int  # ID of the contribution, loan or repayment; None for the opening balance
+    loan_id: int
+    description: str
+    savings_change: float
+    loan_change: float
+    savings_balance: float  # Contributions to date
+    loan_balance: float  # Loan principal and interest still owed
+
+
+# Table each row type is read from; field names match the column names
+_SOURCES = {
+    MemberRow: Member,
+    LoanRow: Loan,
+    InstallmentRow: LoanInstallment,
+    RepaymentRow: LoanRepayment,
+    ContributionRow: Contribution,
+    BalanceRow: MemberBalance,
+}
+
+
+def select_rows(row_type):
+    """SELECT of exactly the columns of a row type"""
+    model = _SOURCES[row_type]
+    return select(*[getattr(model, name) for name in row_type._fields])
+
+
+def fetch_rows(session, row_type, query) -> list:
+    """Run a select_rows() query and return its rows as row_type tuples"""
+    return [row_type._make(row) for row in session.execute(query)]
+
+
+def fetch_row(session, row_type, query):
+    """Run a select_rows() query and return its first row, or None"""
+    row = session.execute(query.limit(1)).first()
+    return row_type._make(row) if row is not None else None
@@ -0,0 +1,303 @@
+"""
+Member statements rendered to files in bulk (year-end runs)
+
+generate_statements() splits the selected members into chunks and renders
+them in a pool of worker processes. Each worker opens its own read-only
+engine (config.create_readonly_engine), streams every member's statement
+with connection.member_statement_query() and writes member_<id>.html and/or
+member_<id>.csv to the output directory. Files are written under a
+temporary name and renamed, so a statement file that exists is complete.
+
+Progress is kept in statements.manifest in the output directory. Its first
+line records the period and formats, and the member IDs of every finished
+chunk are appended to it. Running the same command again skips those
+members, so an interrupted or failed run resumes where it stopped. A
+different period or format starts over.
+
+From the src directory:
+
+    python -m database statements OUTPUT_DIR [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+        [--format html|csv] [--member ID ...] [--status STATUS] [--workers N]
+"""
+import csv
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from html import escape
+from typing import NamedTuple
+from sqlalchemy import bindparam, select
+from .config import create_readonly_engine
+from .connection import STREAM_BATCH_SIZE, member_statement_query
+from .models import Member, MemberStatus
+from .read_models import StatementRow
+
+
+FORMATS = ("html", "csv")
+
+MANIFEST_NAME = "statements.manifest"
+
+# Members per task handed to a worker: large enough that the hand-off is
+# noise, small enough that the workers finish close together
+CHUNK_SIZE = 50
+
+CSV_HEADER = (
+    "Date", "Entry", "Reference", "Loan", "Details",
+    "Savings change", "Loan change", "Savings balance", "Loan balance",
+)
+
+_HTML_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Statement: {name}</title>
+<style>
+body {{ font-family: sans-serif; }}
+table {{ border-collapse: collapse; }}
+th, td {{ padding: 4px 10px; border-bottom: 1px solid #ddd; text-align: left; }}
+td.amount {{ text-align: right; }}
+</style>
+</head>
+<body>
+<h1>{name}</h1>
+<p>Member #{member_id}{contact}<br>Period: {period}</p>
+<table>
+<tr><th>Date</th><th>Entry</th><th>Details</th><th>Amount</th><th>Savings</th><th>Loan Balance</th></tr>
+"""
+
+_HTML_LINE = (
+    "<tr><td>{date}</td><td>{kind}</td><td>{details}</td><td class=\"amount\">{amount}</td>"
+    "<td class=\"amount\">{savings:.2f}</td><td class=\"amount\">{loan:.2f}</td></tr>\n"
+)
+
+_HTML_FOOT = """</table>
+<p>Generated {generated}</p>
+</body>
+</html>
+"""
+
+
+class StatementRun(NamedTuple):
+    """Outcome of one generate_statements() call"""
+    output_dir: str
+    members: int  # Members selected
+    written: int  # Statements rendered by this call
+    skipped: int  # Members already done by an earlier run of the same period
+    failed: list  # Member IDs whose chunk failed; run again to retry them
+    elapsed: float  # Seconds
+
+
+# ==================== RENDERING ====================
+
+def statement_path(output_dir: str, member_id: int, fmt: str) -> str:
+    return os.path.join(output_dir, f"member_{member_id}.{fmt}")
+
+
+def _period(start: datetime, end: datetime) -> str:
+    first = start.strftime("%Y-%m-%d") if start else "beginning"
+    last = end.strftime("%Y-%m-%d") + " (excluded)" if end else "today"
+    return f"{first} to {last}"
+
+
+def _details(line: StatementRow) -> str:
+    details = f"Loan #{line.loan_id}" if line.loan_id is not None else ""
+    return f"{details} {line.description or ''}".strip()
+
+
+def _html_line(line: StatementRow) -> str:
+    # The opening balance has no amount of its own; the entry kind says which way the others go
+    amount = abs(line.savings_change or line.loan_change) if line.reference_id is not None else None
+    return _HTML_LINE.format(
+        date=line.entry_date.strftime("%Y-%m-%d") if line.entry_date else "",
+        kind=escape(line.kind),
+        details=escape(_details(line)),
+        amount=f"{amount:.2f}" if amount is not None else "",
+        savings=line.savings_balance,
+        loan=line.loan_balance,
+    )
+
+
+def _csv_line(line: StatementRow) -> tuple:
+    return (
+        line.entry_date.strftime("%Y-%m-%d %H:%M:%S") if line.entry_date else "",
+        line.kind,
+        line.reference_id if line.reference_id is not None else "",
+        line.loan_id if line.loan_id is not None else "",
+        line.description or "",
+        f"{line.savings_change:.2f}",
+        f"{line.loan_change:.2f}",
+        f"{line.savings_balance:.2f}",
+        f"{line.loan_balance:.2f}",
+    )
+
+
+def write_statement(output_dir: str, member, lines, start: datetime, end: datetime, formats) -> None:
+    """Write one member's statement in every format, in a single pass over the lines"""
+    paths = {fmt: statement_path(output_dir, member.id, fmt) for fmt in formats}
+    files = {fmt: open(path + ".tmp", "w", encoding="utf-8", newline="") for fmt, path in paths.items()}
+    try:
+        html = files.get("html")
+        writer = csv.writer(files["csv"]) if "csv" in files else None
+        if html:
+            html.write(_HTML_HEAD.format(
+                name=escape(member.name),
+                member_id=member.id,
+                contact=f" · {escape(member.contact)}" if member.contact else "",
+                period=_period(start, end),
+            ))
+        if writer:
+            writer.writerow(CSV_HEADER)
+
+        for line in lines:
+            if html:
+                html.write(_html_line(line))
+            if writer:
+                writer.writerow(_csv_line(line))
+
+        if html:
+            html.write(_HTML_FOOT.format(generated=datetime.now().strftime("%Y-%m-%d %H:%M")))
+        for file in files.values():
+            file.close()
+        for fmt, path in paths.items():
+            os.replace(path + ".tmp", path)
+    finally:
+        # After a failure: no half-written file is left behind
+        for fmt, file in files.items():
+            file.close()
+            if os.path.exists(paths[fmt] + ".tmp"):
+                os.remove(paths[fmt] + ".tmp")
+
+
+# ==================== WORKERS ====================
+
+# The read-only engine of this worker process (see _start_worker)
+_engine = None
+
+
+def _start_worker(url: str):
+    global _engine
+    _engine = create_readonly_engine(url)
+
+
+def render_members(member_ids: list, output_dir: str, start: datetime, end: datetime, formats) -> list:
+    """
+    Render the statements of a chunk of members (runs in a worker process)
+
+    Returns:
+        IDs of the members rendered (members deleted since the run started are left out)
+    """
+    with _engine.connect() as conn:
+        members = conn.execute(
+            select(Member.id, Member.name, Member.contact).where(Member.id.in_(member_ids)).order_by(Member.id)
+        ).all()
+        # Built once for the chunk; constructing the UNION costs more than running it for a small member
+        query = member_statement_query(bindparam("member_id"), start, end)
+        query = query.execution_options(yield_per=STREAM_BATCH_SIZE)
+        for member in members:
+            lines = conn.execute(query, {"member_id": member.id})
+            write_statement(output_dir, member, map(StatementRow._make, lines), start, end, formats)
+    return [member.id for member in members]
+
+
+# ==================== BATCH RUN ====================
+
+def select_members(conn, member_ids=None, status: str = None) -> list:
+    """IDs of the members to render, in ID order"""
+    query = select(Member.id).order_by(Member.id)
+    if member_ids:
+        query = query.where(Member.id.in_(member_ids))
+    if status:
+        query = query.where(Member.status == MemberStatus(status))
+    return conn.execute(query).scalars().all()
+
+
+def _read_manifest(path: str, run_key: str) -> set:
+    """Member IDs finished by an earlier run of the same run_key (empty for a new run)"""
+    try:
+        with open(path, encoding="utf-8") as manifest:
+            if manifest.readline().rstrip("\n") != run_key:
+                return set()
+            # A line without its newline was cut off by a crash mid-write
+            return {int(line) for line in manifest if line.endswith("\n")}
+    except FileNotFoundError:
+        return set()
+
+
+def generate_statements(output_dir: str, start: datetime = None, end: datetime = None, formats=FORMATS,
+                        member_ids=None, status: str = None, workers: int = None, chunk_size: int = CHUNK_SIZE,
+                        url: str = None, progress=None) -> StatementRun:
+    """
+    Render member statements to files with a pool of worker processes, resuming an unfinished run
+
+    Args:
+        output_dir: Directory for the statement files and the manifest (created if missing)
+        start, end: The statement period, end excluded (default: the whole history)
+        formats: Any of FORMATS
+        member_ids: Only these members (default: every member)
+        status: Only members with this status, e.g. "Active"
+        workers: Worker processes (default: one per CPU)
+        chunk_size: Members per task handed to a worker
+        url: Database URL (default: LMS_DATABASE_URL or the bundled file)
+        progress: Called with (members done, members to do) as chunks finish
+    """
+    started = time.monotonic()
+    formats = tuple(fmt for fmt in FORMATS if fmt in formats)
+    os.makedirs(output_dir, exist_ok=True)
+
+    engine = create_readonly_engine(url)
+    try:
+        with engine.connect() as conn:
+            selected = select_members(conn, member_ids, status)
+    finally:
+        engine.dispose()
+
+    run_key = json.dumps({
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+        "formats": formats,
+    })
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    done = _read_manifest(manifest_path, run_key)
+    pending = [member_id for member_id in selected if member_id not in done]
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    written = 0
+    failed = []
+
+    # Rewritten rather than appended to, which also drops a line cut off by a crash
+    with open(manifest_path, "w", encoding="utf-8") as manifest:
+        manifest.write(run_key + "\n")
+        manifest.write("".join(f"{member_id}\n" for member_id in sorted(done)))
+        manifest.flush()
+        if chunks:
+            # spawn: workers start clean instead of inheriting this process's open connections
+            pool = ProcessPoolExecutor(
+                min(workers or os.cpu_count() or 1, len(chunks)),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_start_worker,
+                initargs=(url,),
+            )
+            try:
+                futures = {
+                    pool.submit(render_members, chunk, output_dir, start, end, formats): chunk for chunk in chunks
+                }
+                for future in as_completed(futures):
+                    chunk = futures[future]
+                    try:
+                        rendered = future.result()
+                    except Exception as e:
+                        print(f"\n✗ Error rendering statements for members {chunk[0]}-{chunk[-1]}: {e}")
+                        failed.extend(chunk)
+                    else:
+                        manifest.write("".join(f"{member_id}\n" for member_id in rendered))
+                        manifest.flush()
+                        written += len(rendered)
+                    if progress:
+                        progress(written + len(failed), len(pending))
+            finally:
+                # On Ctrl+C, drop the chunks not started yet instead of rendering them all first
+                pool.shutdown(cancel_futures=True)
+
+    return StatementRun(output_dir, len(selected), written, len(selected) - len(pending), failed,
+                        time.monotonic() - started)
@@ -0,0 +1,275 @@
+"""
+Summary tables maintained alongside the transaction tables
+
+Every function takes a SQLAlchemy Connection (session.connection() inside the
+data layer) so summary rows are written in the same transaction as the
+change that caused them.
+"""
+from datetime import datetime
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from .models import Contribution, Loan, LoanRepayment, LoanStatus, Member, MemberBalance, MonthlyRollup
+
+
+ROLLUP_CONTRIBUTION = "Contribution"
+ROLLUP_REPAYMENT = "Repayment"
+
+# Loans that have been paid out and are still owed; nothing is owed on a Pending loan yet
+DISBURSED_STATUSES = (LoanStatus.ACTIVE, LoanStatus.DEFAULTED)
+
+
+_BALANCE_FIELDS = (
+    "total_contributions",
+    "contribution_count",
+    "loan_count",
+    "active_loan_count",
+    "total_borrowed",
+    "total_repaid",
+    "outstanding_balance",
+)
+
+_LOAN_FIELDS = (
+    "loan_count",
+    "active_loan_count",
+    "total_borrowed",
+    "total_repaid",
+    "outstanding_balance",
+)
+
+
+def _upsert(conn, table):
+    """INSERT ... ON CONFLICT construct for the connection's dialect"""
+    if conn.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def _month_of(conn, column):
+    """SQL expression formatting a datetime column as YYYY-MM"""
+    if conn.dialect.name == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+
+def _loan_totals(member_ids=None):
+    """
+    SELECT of the loan columns of member_balances, grouped per member
+
+    total_borrowed leaves out Pending loans, which have not been paid out,
+    and outstanding_balance counts only disbursed loans (DISBURSED_STATUSES).
+    """
+    is_disbursed = Loan.status.in_(DISBURSED_STATUSES)
+    query = (
+        select(
+            Member.id.label("member_id"),
+            func.count(Loan.id).label("loan_count"),
+            func.coalesce(func.sum(case((Loan.status == LoanStatus.ACTIVE, 1), else_=0)), 0).label("active_loan_count"),
+            func.coalesce(func.sum(case((Loan.status != LoanStatus.PENDING, Loan.amount), else_=0.0)), 0.0)
+            .label("total_borrowed"),
+            func.coalesce(func.sum(Loan.amount_repaid), 0.0).label("total_repaid"),
+            func.coalesce(func.sum(case(
+                (is_disbursed, Loan.amount + Loan.total_interest - Loan.amount_repaid), else_=0.0
+            )), 0.0).label("outstanding_balance"),
+        )
+        .select_from(Member)
+        .outerjoin(Loan, Loan.member_id == Member.id)
+        .group_by(Member.id)
+    )
+    if member_ids is not None:
+        query = query.where(Member.id.in_(member_ids))
+    return query
+
+
+# ==================== MEMBER BALANCES ====================
+
+def add_member_contributions(conn, deltas: dict):
+    """
+    Add contribution totals to member balances
+
+    Args:
+        deltas: {member_id: (amount, count)}; negative values for deletions
+    """
+    if not deltas:
+        return
+    table = MemberBalance.__table__
+    insert = _upsert(conn, table)
+    statement = insert.on_conflict_do_update(
+        index_elements=[table.c.member_id],
+        set_={
+            "total_contributions": table.c.total_contributions + insert.excluded.total_contributions,
+            "contribution_count": table.c.contribution_count + insert.excluded.contribution_count,
+            "updated_at": insert.excluded.updated_at,
+        },
+    )
+    now = datetime.now()
+    conn.execute(statement, [
+        {"member_id": member_id, "total_contributions": amount, "contribution_count": count, "updated_at": now}
+        for member_id, (amount, count) in deltas.items()
+    ])
+
+
+def refresh_member_loans(conn, member_ids):
+    """Recompute the loan columns of member balances for the given members"""
+    member_ids = sorted(set(member_ids))
+    if not member_ids:
+        return
+    table = MemberBalance.__table__
+    insert = _upsert(conn, table)
+    statement = insert.from_select(["member_id", *_LOAN_FIELDS], _loan_totals(member_ids))
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.member_id],
+        set_={**{name: insert.excluded[name] for name in _LOAN_FIELDS}, "updated_at": datetime.now()},
+    )
+    conn.execute(statement)
+
+
+def remove_member_balance(conn, member_id: int):
+    """Drop the balance row of a deleted member"""
+    conn.execute(delete(MemberBalance).where(MemberBalance.member_id == member_id))
+
+
+def rebuild_member_balances(conn) -> dict:
+    """
+    Recompute every member balance from the transaction tables
+
+    Returns:
+        {"members": number of rows written,
+         "drift": [(member_id, field, stored, actual), ...] for every value
+                  that did not match what was stored}
+    """
+    contributions = (
+        select(
+            Contribution.member_id,
+            func.sum(Contribution.amount).label("total_contributions"),
+            func.count(Contribution.id).label("contribution_count"),
+        )
+        .group_by(Contribution.member_id)
+        .subquery()
+    )
+    loans = _loan_totals().subquery()
+    actual_rows = conn.execute(
+        select(
+            loans.c.member_id,
+            func.coalesce(contributions.c.total_contributions, 0.0).label("total_contributions"),
+            func.coalesce(contributions.c.contribution_count, 0).label("contribution_count"),
+            *[loans.c[name] for name in _LOAN_FIELDS],
+        ).outerjoin(contributions, contributions.c.member_id == loans.c.member_id)
+    ).mappings().all()
+
+    stored = {
+        row["member_id"]: row
+        for row in conn.execute(select(MemberBalance.__table__)).mappings()
+    }
+
+    drift = []
+    for row in actual_rows:
+        current = stored.pop(row["member_id"], None)
+        if current is None and not any(row[name] for name in _BALANCE_FIELDS):
+            continue  # A member without activity has no row yet; that is not drift
+        for name in _BALANCE_FIELDS:
+            value = current[name] if current else None
+            if value is None or abs(value - row[name]) > 1e-6:
+                drift.append((row["member_id"], name, value, row[name]))
+    # Rows left over belong to members that no longer exist
+    for member_id in stored:
+        drift.append((member_id, "member_id", member_id, None))
+
+    now = datetime.now()
+    conn.execute(delete(MemberBalance))
+    if actual_rows:
+        conn.execute(
+            MemberBalance.__table__.insert(),
+            [{**row, "updated_at": now} for row in actual_rows],
+        )
+    return {"members": len(actual_rows), "drift": drift}
+
+
+# ==================== MONTHLY ROLLUPS ====================
+
+def add_monthly_activity(conn, deltas: dict):
+    """
+    Add amounts to the monthly rollups
+
+    Args:
+        deltas: {(month, kind, contribution_type): (amount, count)}, where
+            kind is ROLLUP_CONTRIBUTION or ROLLUP_REPAYMENT and
+            contribution_type is a ContributionType name ("" for repayments).
+            Use negative values for deletions.
+    """
+    if not deltas:
+        return
+    table = MonthlyRollup.__table__
+    insert = _upsert(conn, table)
+    statement = insert.on_conflict_do_update(
+        index_elements=[table.c.month, table.c.kind, table.c.contribution_type],
+        set_={
+            "amount": table.c.amount + insert.excluded.amount,
+            "count": table.c.count + insert.excluded.count,
+        },
+    )
+    conn.execute(statement, [
+        {"month": month, "kind": kind, "contribution_type": contribution_type, "amount": amount, "count": count}
+        for (month, kind, contribution_type), (amount, count) in deltas.items()
+    ])
+
+
+def contribution_activity(contributions, sign: int = 1) -> dict:
+    """Rollup deltas for Contribution objects (or dicts with the same keys)"""
+    deltas = {}
+    for c in contributions:
+        if isinstance(c, dict):
+            date, ctype, amount = c["contribution_date"], c["contribution_type"], c["amount"]
+        else:
+            date, ctype, amount = c.contribution_date, c.contribution_type, c.amount
+        key = (date.strftime("%Y-%m"), ROLLUP_CONTRIBUTION, ctype.name)
+        total, count = deltas.get(key, (0.0, 0))
+        deltas[key] = (total + sign * amount, count + sign)
+    return deltas
+
+
+def repayment_activity(repayments, sign: int = 1) -> dict:
+    """Rollup deltas for LoanRepayment objects (or dicts with the same keys)"""
+    deltas = {}
+    for r in repayments:
+        if isinstance(r, dict):
+            date, amount = r["payment_date"], r["amount_paid"]
+        else:
+            date, amount = r.payment_date, r.amount_paid
+        key = (date.strftime("%Y-%m"), ROLLUP_REPAYMENT, "")
+        total, count = deltas.get(key, (0.0, 0))
+        deltas[key] = (total + sign * amount, count + sign)
+    return deltas
+
+
+def rebuild_monthly_rollups(conn) -> int:
+    """Recompute every monthly rollup from the transaction tables; returns the row count"""
+    contribution_month = _month_of(conn, Contribution.contribution_date)
+    repayment_month = _month_of(conn, LoanRepayment.payment_date)
+    rows = [
+        {"month": month, "kind": ROLLUP_CONTRIBUTION, "contribution_type": ctype.name, "amount": amount, "count": count}
+        for month, ctype, amount, count in conn.execute(
+            select(contribution_month, Contribution.contribution_type, func.sum(Contribution.amount), func.count())
+            .group_by(contribution_month, Contribution.contribution_type)
+        )
+    ]
+    rows += [
+        {"month": month, "kind": ROLLUP_REPAYMENT, "contribution_type": "", "amount": amount, "count": count}
+        for month, amount, count in conn.execute(
+            select(repayment_month, func.sum(LoanRepayment.amount_paid), func.count())
+            .group_by(repayment_month)
+        )
+    ]
+
+    conn.execute(delete(MonthlyRollup))
+    if rows:
+        conn.execute(MonthlyRollup.__table__.insert(), rows)
+    return len(rows)
+
+
+def monthly_totals(conn, kind: str, first_month: str) -> dict:
+    """{month: total amount} of one kind from first_month (YYYY-MM) onwards"""
+    return dict(conn.execute(
+        select(MonthlyRollup.month, func.sum(MonthlyRollup.amount))
+        .where(MonthlyRollup.kind == kind, MonthlyRollup.month >= first_month)
+        .group_by(MonthlyRollup.month)
+    ).all())
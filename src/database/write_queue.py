@@ -0,0 +1,121 @@
+"""
+Serialized write queue with group commit
+
+SQLite allows one writer at a time. When many clerks save at once, each
+write commits (and syncs) on its own, and the writers queue up on the
+database lock until busy_timeout runs out with "database is locked".
+This module funnels write commands to one writer thread instead:
+
+    future = write_queue.submit(record_contribution, member_id, 500.0)
+    contribution = future.result()
+
+The writer takes the first command waiting in the queue, gathers whatever
+else arrives within max_delay (up to max_batch commands) and runs them all in
+one unit_of_work(), so the batch costs a single commit. If any command in
+the batch fails, the batch rolls back and every command runs again on its
+own. That way one bad command cannot take the others down. Each command
+then gets the result or error it would have had if called directly.
+
+Commands must not wait on another queued command's future from inside the
+writer thread, since that thread is the only one that can resolve it.
+"""
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from . import connection
+
+
+class WriteQueue:
+    """A writer thread that runs queued write commands in group-committed batches"""
+
+    def __init__(self, max_batch: int = 64, max_delay: float = 0.002):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.commands = 0
+        self.retried_batches = 0
+
+    def submit(self, function, *args, **kwargs) -> Future:
+        """Queue a write command; the returned future resolves to its return value"""
+        future = Future()
+        self._queue.put((future, function, args, kwargs))
+        self._ensure_started()
+        return future
+
+    def stop(self, timeout: float = None):
+        """Run every queued command, then stop the writer thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="lms-writer", daemon=True)
+                self._thread.start()
+
+    # ==================== WRITER THREAD ====================
+
+    def _run(self):
+        while True:
+            command = self._queue.get()
+            if command is None:
+                return
+            batch = [command]
+            stopping = self._collect(batch)
+            self._execute(batch)
+            if stopping:
+                return
+
+    def _collect(self, batch: list) -> bool:
+        """Add the commands that arrive within max_delay to batch; True if a stop was queued"""
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                command = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                return False
+            if command is None:
+                return True
+            batch.append(command)
+        return False
+
+    def _execute(self, batch: list):
+        """Run a batch in one transaction, falling back to one command at a time"""
+        batch = [command for command in batch if command[0].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        self.batches += 1
+        self.commands += len(batch)
+
+        results = []
+        try:
+            with connection.unit_of_work():
+                for _, function, args, kwargs in batch:
+                    results.append(function(*args, **kwargs))
+        except Exception:
+            # Inside a unit of work a failing write raises; rerun each on its own so
+            # only the failing command sees the error (as a direct call would)
+            self.retried_batches += 1
+            for future, function, args, kwargs in batch:
+                try:
+                    future.set_result(function(*args, **kwargs))
+                except Exception as e:
+                    future.set_exception(e)
+            return
+
+        for (future, _, _, _), result in zip(batch, results):
+            future.set_result(result)
+
+
+# Process-wide queue used by async_api for every write
+write_queue = WriteQueue()
+atexit.register(write_queue.stop)
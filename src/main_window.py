@@ -1,16 +1,16 @@
 import flet as ft
 from database.connection import (
-    get_total_contributions,
-    get_total_loans_issued,
-    get_active_loans_count,
-    get_total_members,
-    get_all_contributions,
-    get_repayments_by_loan,
-    get_all_loans,
-    get_all_members,
+    get_dashboard_snapshot,
+    get_recent_activities,
+    get_top_contributors,
+    get_monthly_trend,
+    get_portfolio_at_risk,
+    OTHERS_LABEL,
 )
+from database import async_api
+from database.arrears import BUCKET_CURRENT
 from components.navigation import create_app_bar
-from datetime import datetime, timedelta
+from datetime import date, datetime, time, timedelta
 
 
 def create_summary_card(title: str, value: str, icon: str, color: str = ft.Colors.BLUE_200):
@@ -36,75 +36,81 @@ def create_summary_card(title: str, value: str, icon: str, color: str = ft.Color
 
 def get_contribution_trend_data():
     """Get contribution data for the last 12 months for line chart"""
-    contributions = get_all_contributions()
-    
-    # Group by month
-    monthly_data = {}
-    for contrib in contributions:
-        month_key = contrib.contribution_date.strftime("%Y-%m")
-        if month_key not in monthly_data:
-            monthly_data[month_key] = 0
-        monthly_data[month_key] += contrib.amount
-    
-    # Sort by month
-    sorted_months = sorted(monthly_data.keys())[-12:]  # Last 12 months
-    values = [monthly_data.get(month, 0) for month in sorted_months]
-    
-    return sorted_months, values
+    # Reads at most 12 rows from the maintained monthly rollups; empty months come back as 0
+    return get_monthly_trend(12)
 
 
-def get_member_contribution_data():
-    """Get contribution breakdown by member for pie chart"""
-    members = get_all_members()
-    contributions = get_all_contributions()
-    
-    # Group by member
-    member_totals = {}
-    for contrib in contributions:
-        if contrib.member_id not in member_totals:
-            member_totals[contrib.member_id] = 0
-        member_totals[contrib.member_id] += contrib.amount
-    
-    # Get member names
-    data = []
-    for member_id, total in member_totals.items():
-        member = next((m for m in members if m.id == member_id), None)
-        if member:
-            data.append((member.name, total))
-    
-    return data
+# Periods offered by the pie chart: label -> days back from today (None = all time)
+CONTRIBUTION_PERIODS = {
+    "All time": None,
+    "Last 12 months": 365,
+    "Last 3 months": 90,
+    "Last 30 days": 30,
+}
 
 
-def get_recent_activities():
-    """Get recent activities for the activity table"""
-    activities = []
-    
-    # Get recent contributions
-    contributions = get_all_contributions()
-    for contrib in sorted(contributions, key=lambda x: x.created_at, reverse=True)[:5]:
-        activities.append({
-            "type": "Contribution",
-            "member_id": contrib.member_id,
-            "amount": f"₹{contrib.amount:.2f}",
-            "date": contrib.contribution_date.strftime("%Y-%m-%d"),
-            "description": f"Contribution recorded"
-        })
-    
-    # Get recent repayments
-    loans = get_all_loans()
-    for loan in loans:
-        repayments = get_repayments_by_loan(loan.id)
-        for repay in sorted(repayments, key=lambda x: x.created_at, reverse=True)[:5]:
-            activities.append({
-                "type": "Repayment",
-                "member_id": loan.member_id,
-                "amount": f"₹{repay.amount_paid:.2f}",
-                "date": repay.payment_date.strftime("%Y-%m-%d"),
-                "description": f"Loan repayment"
-            })
-    
-    # Sort by date and return top 10
-    return sorted(activities, key=lambda x: x["date"], reverse=True)[:10]
+def get_member_contribution_data(period: str = "All time"):
+    """Get the top 8 contributors plus an "Others" slice for the pie chart"""
+    days = CONTRIBUTION_PERIODS[period]
+    # Start at midnight so repeated calls during the day hit the query cache
+    start = datetime.combine(date.today() - timedelta(days=days), time.min) if days else None
+    return get_top_contributors(8, start=start)
+
+
+def create_pie_sections(member_data):
+    """Create pie chart sections for (name, amount) pairs"""
+    return [
+        ft.PieChartSection(
+            value=amount,
+            title=name[:15],  # Truncate long names
+            color=ft.Colors.GREY if name == OTHERS_LABEL else ft.colors.random_color(),
+        )
+        for name, amount in member_data
+    ]
+
+
+def create_risk_cards(portfolio):
+    """Create the arrears aging cards from a PortfolioAtRisk"""
+    in_arrears = [bucket for bucket in portfolio.buckets if bucket.bucket != BUCKET_CURRENT]
+    return [
+        create_summary_card(
+            title="Portfolio at Risk (30+ days)",
+            value=f"{portfolio.par_30:.1%}",
+            icon=ft.Icons.SHIELD,
+            color=ft.Colors.RED_400,
+        ),
+        create_summary_card(
+            title="Loans in Arrears",
+            value=str(sum(bucket.loans for bucket in in_arrears)),
+            icon=ft.Icons.SCHEDULE,
+            color=ft.Colors.ORANGE_400,
+        ),
+        create_summary_card(
+            title="Arrears Amount",
+            value=f"₹{portfolio.arrears_amount:.2f}",
+            icon=ft.Icons.MONEY_OFF,
+            color=ft.Colors.ORANGE_400,
+        ),
+        create_summary_card(
+            title="Days Past Due (" + " / ".join(bucket.bucket for bucket in in_arrears) + ")",
+            value=" / ".join(str(bucket.loans) for bucket in in_arrears),
+            icon=ft.Icons.BAR_CHART,
+            color=ft.Colors.BLUE_200,
+        ),
+    ]
+
+
+def create_activity_row(activity):
+    """Create a DataRow for one entry of the recent activity feed"""
+    description = "Contribution recorded" if activity.kind == "Contribution" else "Loan repayment"
+    return ft.DataRow(
+        cells=[
+            ft.DataCell(ft.Text(activity.kind, size=12, color=ft.Colors.WHITE)),
+            ft.DataCell(ft.Text(f"₹{activity.amount:.2f}", size=12, weight="bold", color=ft.Colors.GREEN_400)),
+            ft.DataCell(ft.Text(activity.date.strftime("%Y-%m-%d"), size=12, color=ft.Colors.GREY)),
+            ft.DataCell(ft.Text(f"{description} - {activity.member_name}", size=12, color=ft.Colors.GREY)),
+        ]
+    )
 
 
 def MainWindow(page: ft.Page):
@@ -206,11 +212,12 @@ def MainWindow(page: ft.Page):
         expand=True,
     )
     
-    # Summary statistics
-    total_members = str(get_total_members())
-    total_contributions = f"₹{get_total_contributions():.2f}"
-    total_loans = f"₹{get_total_loans_issued():.2f}"
-    active_loans = str(get_active_loans_count())
+    # Summary statistics (one query for every headline figure)
+    snapshot = get_dashboard_snapshot()
+    total_members = str(snapshot.total_members)
+    total_contributions = f"₹{snapshot.total_contributions:.2f}"
+    total_loans = f"₹{snapshot.total_loans_issued:.2f}"
+    active_loans = str(snapshot.active_loans)
     
     # Summary cards
     summary_row = ft.Row(
@@ -245,6 +252,49 @@ def MainWindow(page: ft.Page):
         wrap=False,
     )
     
+    # Portfolio cards
+    portfolio_row = ft.Row(
+        controls=[
+            create_summary_card(
+                title="Outstanding Principal",
+                value=f"₹{snapshot.outstanding_principal:.2f}",
+                icon=ft.Icons.ACCOUNT_BALANCE,
+                color=ft.Colors.ORANGE_400,
+            ),
+            create_summary_card(
+                title="Interest Earned",
+                value=f"₹{snapshot.interest_earned:.2f}",
+                icon=ft.Icons.PERCENT,
+                color=ft.Colors.GREEN_400,
+            ),
+            create_summary_card(
+                title="Overdue Loans",
+                value=str(snapshot.overdue_loans),
+                icon=ft.Icons.WARNING_AMBER,
+                color=ft.Colors.RED_400,
+            ),
+        ],
+        spacing=12,
+        wrap=False,
+    )
+    
+    # Arrears aging cards, from the loan_arrears snapshot
+    portfolio = get_portfolio_at_risk()
+    risk_row = ft.Row(controls=create_risk_cards(portfolio), spacing=12, wrap=False)
+    
+    async def refresh_stale_arrears():
+        # Days past due grow daily, so recompute a snapshot taken before today
+        if portfolio.as_of is not None and portfolio.as_of.date() >= date.today():
+            return
+        # An empty snapshot is only stale if some loan should be in it
+        if portfolio.as_of is None and not await async_api.get_aged_loans_count():
+            return
+        await async_api.refresh_loan_arrears()
+        risk_row.controls = create_risk_cards(await async_api.get_portfolio_at_risk())
+        page.update()
+    
+    page.run_task(refresh_stale_arrears)
+    
     # Contribution Trend Line Chart
     months, values = get_contribution_trend_data()
     
@@ -281,21 +331,26 @@ def MainWindow(page: ft.Page):
     )
     
     # Member Contribution Pie Chart
-    member_data = get_member_contribution_data()
     pie_chart = ft.PieChart(
-        sections=[
-            ft.PieChartSection(
-                value=amount,
-                title=name[:15],  # Truncate long names
-                color=ft.colors.random_color(),
-            )
-            for name, amount in member_data[:8]  # Limit to 8 slices
-        ],
+        sections=create_pie_sections(get_member_contribution_data()),
         animate=500,
         height=300,
         expand=True,
     )
     
+    async def change_contribution_period(e):
+        member_data = await async_api.run(get_member_contribution_data, e.control.value)
+        pie_chart.sections = create_pie_sections(member_data)
+        page.update()
+    
+    period_dropdown = ft.Dropdown(
+        options=[ft.dropdown.Option(period) for period in CONTRIBUTION_PERIODS],
+        value="All time",
+        width=170,
+        dense=True,
+        on_change=change_contribution_period,
+    )
+    
     # Charts container
     charts_row = ft.Row(
         controls=[
@@ -317,7 +372,13 @@ def MainWindow(page: ft.Page):
             ft.Container(
                 content=ft.Column(
                     controls=[
-                        ft.Text("Contributions by Member", size=17, weight="bold", color=ft.Colors.WHITE),
+                        ft.Row(
+                            controls=[
+                                ft.Text("Contributions by Member", size=17, weight="bold", color=ft.Colors.WHITE),
+                                period_dropdown,
+                            ],
+                            alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
+                        ),
                         ft.Container(height=15),
                         pie_chart,
                     ],
@@ -334,19 +395,10 @@ def MainWindow(page: ft.Page):
         spacing=20,
     )
     
-    # Recent Activities Table
-    activities = get_recent_activities()
-    activity_rows = [
-        ft.DataRow(
-            cells=[
-                ft.DataCell(ft.Text(activity["type"], size=12, color=ft.Colors.WHITE)),
-                ft.DataCell(ft.Text(activity["amount"], size=12, weight="bold", color=ft.Colors.GREEN_400)),
-                ft.DataCell(ft.Text(activity["date"], size=12, color=ft.Colors.GREY)),
-                ft.DataCell(ft.Text(activity["description"], size=12, color=ft.Colors.GREY)),
-            ]
-        )
-        for activity in activities
-    ]
+    # Recent Activities Table (one query however many loans exist)
+    activities = get_recent_activities(10)
+    activity_cursor = {"before": activities.next_cursor}
+    activity_rows = [create_activity_row(activity) for activity in activities.items]
     
     recent_activities_table = ft.DataTable(
         columns=[
@@ -359,14 +411,29 @@ def MainWindow(page: ft.Page):
         bgcolor="#2a2a2a",
     )
     
+    async def load_older_activities(e):
+        older = await async_api.get_recent_activities(10, before=activity_cursor["before"])
+        activity_cursor["before"] = older.next_cursor
+        recent_activities_table.rows.extend(create_activity_row(activity) for activity in older.items)
+        load_older_button.visible = older.next_cursor is not None
+        page.update()
+    
+    load_older_button = ft.TextButton(
+        "Load older",
+        on_click=load_older_activities,
+        visible=activities.next_cursor is not None,
+    )
+    
     recent_activities_container = ft.Container(
         content=ft.Column(
             controls=[
                 ft.Text("Recent Activities", size=17, weight="bold", color=ft.Colors.WHITE),
                 ft.Container(height=15),
                 recent_activities_table,
+                load_older_button,
             ],
             spacing=0,
+            scroll=ft.ScrollMode.AUTO,
         ),
         padding=30,
         border_radius=15,
@@ -389,7 +456,6 @@ def MainWindow(page: ft.Page):
                 ),
                 ft.Container(height=20),
                 # Top section: Summary cards (left) and Recent Activities (right)
-                # Top section: Summary cards (left) and Recent Activities (right)
                 ft.Container(
                     content=ft.Row(
                         controls=[
@@ -410,6 +476,10 @@ def MainWindow(page: ft.Page):
                     ),
                     height=150,
                 ),
+                ft.Container(height=15),
+                ft.Container(content=portfolio_row, height=150),
+                ft.Container(height=15),
+                ft.Container(content=risk_row, height=150),
                 ft.Container(height=25),
                 # Bottom section: Charts
                 charts_row,
@@ -1,33 +1,34 @@
 import flet as ft
-from database.connection import (
-    get_all_contributions,
-    get_all_members,
+from database.connection import member_directory
+from database.async_api import (
+    get_contributions_page,
     record_contribution,
+    delete_contribution as delete_contribution_record,
 )
 from components.navigation import create_app_bar
+from components.pagination import create_pagination_bar
+from components.progress import create_progress_bar
+from components.member_picker import create_member_picker
 from datetime import datetime
 
+PAGE_SIZE = 50
+
 
 def ContributionScreen(page: ft.Page):
     """Contributions management screen with DataTable and dialogs"""
     
-    # State management
-    contributions_list = get_all_contributions()
-    members_dict = {m.id: m.name for m in get_all_members()}
+    # State management: only the visible page of contributions is loaded (newest first)
+    contributions_page = {"page": None, "number": 1}
+    
+    # Member search field (type-ahead over search_members)
+    member_picker, member_selection = create_member_picker(page)
     
     # Dialog for recording contribution
     contribution_dialog = ft.AlertDialog(
         title=ft.Text("Record Contribution"),
         content=ft.Column(
             controls=[
-                ft.Dropdown(
-                    label="Member",
-                    options=[
-                        ft.dropdown.Option(str(m.id), m.name)
-                        for m in get_all_members()
-                    ],
-                    width=400,
-                ),
+                member_picker,
                 ft.TextField(label="Amount", keyboard_type="number", width=400),
                 ft.Dropdown(
                     label="Contribution Type",
@@ -46,7 +47,7 @@ def ContributionScreen(page: ft.Page):
         ),
         actions=[
             ft.TextButton("Cancel", on_click=lambda e: close_contribution_dialog()),
-            ft.TextButton("Record", on_click=lambda e: record_new_contribution()),
+            ft.TextButton("Record", on_click=lambda e: page.run_task(record_new_contribution)),
         ],
     )
     
@@ -54,29 +55,44 @@ def ContributionScreen(page: ft.Page):
         contribution_dialog.open = False
         page.update()
     
-    def record_new_contribution():
-        member_id = int(contribution_dialog.content.controls[0].value or 0)
+    # Database calls run on the async_api worker pool; the bar shows while they do
+    progress_bar, busy = create_progress_bar(page)
+    
+    async def record_new_contribution():
+        member_id = member_selection["member_id"]
         amount = float(contribution_dialog.content.controls[1].value or 0)
         contrib_type = contribution_dialog.content.controls[2].value or "Monthly"
         notes = contribution_dialog.content.controls[3].value or None
         
         if member_id and amount > 0:
-            record_contribution(member_id, amount, contrib_type, notes=notes)
+            async with busy():
+                contribution = await record_contribution(member_id, amount, contrib_type, notes=notes)
             close_contribution_dialog()
-            refresh_contributions()
-            page.snack_bar = ft.SnackBar(ft.Text("Contribution recorded successfully!"))
+            await refresh_contributions()
+            message = "Contribution recorded successfully!" if contribution else "Could not record contribution"
+            page.snack_bar = ft.SnackBar(ft.Text(message))
             page.snack_bar.open = True
             page.update()
     
-    def refresh_contributions():
-        nonlocal contributions_list
-        contributions_list = get_all_contributions()
+    async def load_contributions_page(after=None, before=None, number=1):
+        async with busy():
+            contributions_page["page"] = await get_contributions_page(after=after, before=before, limit=PAGE_SIZE)
+        contributions_page["number"] = number
         update_contributions_table()
     
+    async def refresh_contributions():
+        await load_contributions_page()
+    
+    async def next_contributions_page():
+        await load_contributions_page(after=contributions_page["page"].next_cursor, number=contributions_page["number"] + 1)
+    
+    async def previous_contributions_page():
+        await load_contributions_page(before=contributions_page["page"].prev_cursor, number=contributions_page["number"] - 1)
+    
     def update_contributions_table():
         rows = []
-        for contrib in sorted(contributions_list, key=lambda x: x.contribution_date, reverse=True):
-            member_name = members_dict.get(contrib.member_id, "Unknown")
+        for contrib in contributions_page["page"].items:
+            member_name = member_directory.name_of(contrib.member_id)
             
             rows.append(
                 ft.DataRow(
@@ -99,13 +115,38 @@ def ContributionScreen(page: ft.Page):
             )
         
         contributions_table.rows = rows
+        sync_pagination(contributions_page["page"], contributions_page["number"])
         page.update()
     
     def delete_contribution(contrib):
-        # Implementation for deleting contribution
-        refresh_contributions()
-        page.snack_bar = ft.SnackBar(ft.Text("Contribution deleted!"))
-        page.snack_bar.open = True
+        """Delete a contribution with confirmation"""
+        
+        async def confirm_delete():
+            async with busy():
+                await delete_contribution_record(contrib.id)
+            confirm_dialog.open = False
+            await refresh_contributions()
+            page.snack_bar = ft.SnackBar(ft.Text("Contribution deleted!"))
+            page.snack_bar.open = True
+            page.update()
+        
+        confirm_dialog = ft.AlertDialog(
+            title=ft.Text("Delete Contribution"),
+            content=ft.Text(
+                f"Are you sure? The ₹{contrib.amount:.2f} contribution of "
+                f"{member_directory.name_of(contrib.member_id)} will be deleted."
+            ),
+            actions=[
+                ft.TextButton("Cancel", on_click=lambda e: (
+                    setattr(confirm_dialog, 'open', False),
+                    page.update()
+                )),
+                ft.TextButton("Delete", on_click=lambda e: page.run_task(confirm_delete)),
+            ],
+        )
+        
+        page.overlay.append(confirm_dialog)
+        confirm_dialog.open = True
         page.update()
     
     # Contributions DataTable
@@ -123,7 +164,13 @@ def ContributionScreen(page: ft.Page):
         divider_thickness=1,
     )
     
-    update_contributions_table()
+    pagination_bar, sync_pagination = create_pagination_bar(
+        lambda: page.run_task(previous_contributions_page),
+        lambda: page.run_task(next_contributions_page),
+    )
+    
+    # The first page loads in the background once the screen is shown
+    page.run_task(load_contributions_page)
     
     # Add button
     add_contribution_button = ft.ElevatedButton(
@@ -136,7 +183,7 @@ def ContributionScreen(page: ft.Page):
     refresh_button = ft.IconButton(
         ft.Icons.REFRESH,
         tooltip="Refresh",
-        on_click=lambda e: refresh_contributions(),
+        on_click=lambda e: page.run_task(refresh_contributions),
     )
     
     # Top controls
@@ -154,6 +201,7 @@ def ContributionScreen(page: ft.Page):
             controls=[
                 ft.Text("Contribution Management", size=24, weight="bold", color=ft.Colors.BLUE_200),
                 top_row,
+                progress_bar,
                 ft.Container(
                     content=contributions_table,
                     bgcolor="#2a2a2a",
@@ -161,6 +209,7 @@ def ContributionScreen(page: ft.Page):
                     padding=10,
                     expand=True,
                 ),
+                pagination_bar,
             ],
             spacing=20,
             expand=True,
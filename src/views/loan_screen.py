@@ -1,45 +1,60 @@
 import flet as ft
-from database.connection import (
-    get_all_loans,
-    get_all_members,
+from database.connection import member_directory
+from database.async_api import (
+    get_loans_page,
     create_loan,
     update_loan,
+    delete_loan as delete_loan_record,
     record_repayment,
     get_loans_by_member,
+    get_loan_schedule,
 )
 from components.navigation import create_app_bar
+from components.pagination import create_pagination_bar
+from components.progress import create_progress_bar
+from components.member_picker import create_member_picker
+
+PAGE_SIZE = 50
 
 
 def LoanScreen(page: ft.Page):
     """Loans management screen with DataTable and dialogs"""
     
-    # State management
-    loans_list = get_all_loans()
-    members_dict = {m.id: m.name for m in get_all_members()}
+    # State management: only the visible page of loans is loaded
+    loans_page = {"page": None, "number": 1}
+    
+    # Loan the repayment dialog was opened for
+    selected_loan = {"loan": None}
+    
+    # Member search field (type-ahead over search_members)
+    member_picker, member_selection = create_member_picker(page)
     
     # Dialog for creating/editing loans
     loan_dialog = ft.AlertDialog(
         title=ft.Text("Add New Loan"),
         content=ft.Column(
             controls=[
+                member_picker,
+                ft.TextField(label="Loan Amount", keyboard_type="number", width=400),
+                ft.TextField(label="Interest Rate (%)", keyboard_type="number", width=400),
+                ft.TextField(label="Loan Duration (months)", keyboard_type="number", width=400,
+                             on_change=lambda e: update_rate_label()),
                 ft.Dropdown(
-                    label="Member",
+                    label="Interest Method",
                     options=[
-                        ft.dropdown.Option(str(m.id), m.name)
-                        for m in get_all_members()
+                        ft.dropdown.Option("Flat"),
+                        ft.dropdown.Option("Reducing balance"),
                     ],
+                    value="Flat",
                     width=400,
                 ),
-                ft.TextField(label="Loan Amount", keyboard_type="number", width=400),
-                ft.TextField(label="Interest Rate (%)", keyboard_type="number", width=400),
-                ft.TextField(label="Loan Duration (months)", keyboard_type="number", width=400),
             ],
             width=500,
             spacing=10,
         ),
         actions=[
             ft.TextButton("Cancel", on_click=lambda e: close_loan_dialog()),
-            ft.TextButton("Create", on_click=lambda e: create_new_loan()),
+            ft.TextButton("Create", on_click=lambda e: page.run_task(create_new_loan)),
         ],
     )
     
@@ -57,7 +72,27 @@ def LoanScreen(page: ft.Page):
         ),
         actions=[
             ft.TextButton("Cancel", on_click=lambda e: close_repayment_dialog()),
-            ft.TextButton("Confirm", on_click=lambda e: confirm_repayment()),
+            ft.TextButton("Confirm", on_click=lambda e: page.run_task(confirm_repayment)),
+        ],
+    )
+    
+    # Dialog showing a loan's installment schedule
+    schedule_table = ft.DataTable(
+        columns=[
+            ft.DataColumn(ft.Text("#")),
+            ft.DataColumn(ft.Text("Due Date")),
+            ft.DataColumn(ft.Text("Principal")),
+            ft.DataColumn(ft.Text("Interest")),
+            ft.DataColumn(ft.Text("Amount Due")),
+            ft.DataColumn(ft.Text("Balance")),
+        ],
+        rows=[],
+    )
+    schedule_dialog = ft.AlertDialog(
+        title=ft.Text("Repayment Schedule"),
+        content=ft.Column(controls=[schedule_table], width=600, height=400, scroll=ft.ScrollMode.AUTO),
+        actions=[
+            ft.TextButton("Close", on_click=lambda e: (setattr(schedule_dialog, 'open', False), page.update())),
         ],
     )
     
@@ -65,40 +100,90 @@ def LoanScreen(page: ft.Page):
         loan_dialog.open = False
         page.update()
     
+    def update_rate_label():
+        # The rate is yearly only for loans with a term; without one it is a single flat charge
+        rate_field, duration_field = loan_dialog.content.controls[2:4]
+        rate_field.label = "Interest Rate (% per year)" if duration_field.value else "Interest Rate (%)"
+        page.update()
+    
     def close_repayment_dialog():
         repayment_dialog.open = False
         page.update()
     
-    def create_new_loan():
-        member_id = int(loan_dialog.content.controls[0].value or 0)
+    # Database calls run on the async_api worker pool; the bar shows while they do
+    progress_bar, busy = create_progress_bar(page)
+    
+    async def create_new_loan():
+        member_id = member_selection["member_id"]
         amount = float(loan_dialog.content.controls[1].value or 0)
         interest_rate = float(loan_dialog.content.controls[2].value or 0)
         duration = int(loan_dialog.content.controls[3].value or 0)
+        interest_method = loan_dialog.content.controls[4].value or "Flat"
         
         if member_id and amount > 0:
-            create_loan(member_id, amount, interest_rate)
+            async with busy():
+                await create_loan(member_id, amount, interest_rate, term_months=duration or None,
+                                  interest_method=interest_method)
             close_loan_dialog()
-            refresh_loans()
+            await refresh_loans()
             page.snack_bar = ft.SnackBar(ft.Text("Loan created successfully!"))
             page.snack_bar.open = True
             page.update()
     
-    def confirm_repayment():
-        # Implementation for recording repayment
-        close_repayment_dialog()
-        page.snack_bar = ft.SnackBar(ft.Text("Repayment recorded successfully!"))
-        page.snack_bar.open = True
+    async def confirm_repayment():
+        loan = selected_loan["loan"]
+        amount = float(repayment_dialog.content.controls[1].value or 0)
+        notes = repayment_dialog.content.controls[2].value or None
+        
+        if loan and amount > 0:
+            async with busy():
+                repayment = await record_repayment(loan.id, amount, notes)
+            close_repayment_dialog()
+            await refresh_loans()
+            message = "Repayment recorded successfully!" if repayment else "Could not record repayment"
+            page.snack_bar = ft.SnackBar(ft.Text(message))
+            page.snack_bar.open = True
+            page.update()
+    
+    async def open_schedule_dialog(loan):
+        async with busy():
+            installments = await get_loan_schedule(loan.id)
+        schedule_dialog.title.value = f"Repayment Schedule - Loan #{loan.id} ({loan.interest_method.value})"
+        schedule_table.rows = [
+            ft.DataRow(
+                cells=[
+                    ft.DataCell(ft.Text(str(i.number))),
+                    ft.DataCell(ft.Text(i.due_date.strftime("%Y-%m-%d"))),
+                    ft.DataCell(ft.Text(f"₹{i.principal:.2f}")),
+                    ft.DataCell(ft.Text(f"₹{i.interest:.2f}")),
+                    ft.DataCell(ft.Text(f"₹{i.amount_due:.2f}")),
+                    ft.DataCell(ft.Text(f"₹{i.balance:.2f}")),
+                ]
+            )
+            for i in installments
+        ]
+        schedule_dialog.open = True
         page.update()
     
-    def refresh_loans():
-        nonlocal loans_list
-        loans_list = get_all_loans()
+    async def load_loans_page(after=None, before=None, number=1):
+        async with busy():
+            loans_page["page"] = await get_loans_page(after=after, before=before, limit=PAGE_SIZE)
+        loans_page["number"] = number
         update_loans_table()
     
+    async def refresh_loans():
+        await load_loans_page()
+    
+    async def next_loans_page():
+        await load_loans_page(after=loans_page["page"].next_cursor, number=loans_page["number"] + 1)
+    
+    async def previous_loans_page():
+        await load_loans_page(before=loans_page["page"].prev_cursor, number=loans_page["number"] - 1)
+    
     def update_loans_table():
         rows = []
-        for loan in loans_list:
-            member_name = members_dict.get(loan.member_id, "Unknown")
+        for loan in loans_page["page"].items:
+            member_name = member_directory.name_of(loan.member_id)
             total_amount = loan.amount + loan.total_interest
             remaining = total_amount - loan.amount_repaid
             
@@ -121,6 +206,13 @@ def LoanScreen(page: ft.Page):
                                         on_click=lambda e, l=loan: open_repayment_dialog(l),
                                         icon_size=18,
                                     ),
+                                    ft.IconButton(
+                                        ft.Icons.CALENDAR_MONTH,
+                                        tooltip="Schedule",
+                                        on_click=lambda e, l=loan: page.run_task(open_schedule_dialog, l),
+                                        icon_size=18,
+                                        disabled=not loan.term_months,
+                                    ),
                                     ft.IconButton(
                                         ft.Icons.DELETE,
                                         tooltip="Delete",
@@ -136,19 +228,47 @@ def LoanScreen(page: ft.Page):
             )
         
         loans_table.rows = rows
+        sync_pagination(loans_page["page"], loans_page["number"])
         page.update()
     
     def open_repayment_dialog(loan):
-        member_name = members_dict.get(loan.member_id, "Unknown")
+        member_name = member_directory.name_of(loan.member_id)
+        selected_loan["loan"] = loan
         repayment_dialog.content.controls[0].value = f"Loan #{loan.id} - {member_name}: ₹{loan.amount:.2f}"
+        repayment_dialog.content.controls[1].value = ""
+        repayment_dialog.content.controls[2].value = ""
         repayment_dialog.open = True
         page.update()
     
     def delete_loan(loan):
-        # Implementation for deleting loan
-        refresh_loans()
-        page.snack_bar = ft.SnackBar(ft.Text("Loan deleted!"))
-        page.snack_bar.open = True
+        """Delete a loan and its repayments with confirmation"""
+        
+        async def confirm_delete():
+            async with busy():
+                await delete_loan_record(loan.id)
+            confirm_dialog.open = False
+            await refresh_loans()
+            page.snack_bar = ft.SnackBar(ft.Text("Loan deleted!"))
+            page.snack_bar.open = True
+            page.update()
+        
+        confirm_dialog = ft.AlertDialog(
+            title=ft.Text("Delete Loan"),
+            content=ft.Text(
+                f"Are you sure? Loan #{loan.id} of {member_directory.name_of(loan.member_id)} "
+                "and all its repayments will be deleted."
+            ),
+            actions=[
+                ft.TextButton("Cancel", on_click=lambda e: (
+                    setattr(confirm_dialog, 'open', False),
+                    page.update()
+                )),
+                ft.TextButton("Delete", on_click=lambda e: page.run_task(confirm_delete)),
+            ],
+        )
+        
+        page.overlay.append(confirm_dialog)
+        confirm_dialog.open = True
         page.update()
     
     # Loans DataTable
@@ -168,7 +288,13 @@ def LoanScreen(page: ft.Page):
         divider_thickness=1,
     )
     
-    update_loans_table()
+    pagination_bar, sync_pagination = create_pagination_bar(
+        lambda: page.run_task(previous_loans_page),
+        lambda: page.run_task(next_loans_page),
+    )
+    
+    # The first page loads in the background once the screen is shown
+    page.run_task(load_loans_page)
     
     # Add button
     add_loan_button = ft.ElevatedButton(
@@ -181,7 +307,7 @@ def LoanScreen(page: ft.Page):
     refresh_button = ft.IconButton(
         ft.Icons.REFRESH,
         tooltip="Refresh",
-        on_click=lambda e: refresh_loans(),
+        on_click=lambda e: page.run_task(refresh_loans),
     )
     
     # Top controls
@@ -199,6 +325,7 @@ def LoanScreen(page: ft.Page):
             controls=[
                 ft.Text("Loan Management", size=24, weight="bold", color=ft.Colors.BLUE_200),
                 top_row,
+                progress_bar,
                 ft.Container(
                     content=loans_table,
                     bgcolor="#2a2a2a",
@@ -206,6 +333,7 @@ def LoanScreen(page: ft.Page):
                     padding=10,
                     expand=True,
                 ),
+                pagination_bar,
             ],
             spacing=20,
             expand=True,
@@ -217,6 +345,7 @@ def LoanScreen(page: ft.Page):
     
     page.overlay.append(loan_dialog)
     page.overlay.append(repayment_dialog)
+    page.overlay.append(schedule_dialog)
     
     return ft.View(
         "/loans",
@@ -1,20 +1,58 @@
 import flet as ft
-from database.connection import (
-    get_all_members,
+from contextlib import closing
+from datetime import datetime, timedelta
+from itertools import islice
+from database.connection import get_member_statement
+from database.async_api import (
+    get_members_page,
     create_member,
     update_member,
     delete_member,
-    get_contributions_by_member,
-    get_loans_by_member,
+    get_member_balances,
+    get_member_balance,
+    run,
 )
 from components.navigation import create_app_bar
+from components.pagination import create_pagination_bar
+from components.progress import create_progress_bar
+
+PAGE_SIZE = 50
+
+# The details dialog shows this period of the statement, at most STATEMENT_ROWS lines of it
+STATEMENT_DAYS = 365
+STATEMENT_ROWS = 200
+
+
+def load_statement(member_id: int, start: datetime) -> list:
+    """The first STATEMENT_ROWS statement lines from start (blocking; runs on the worker pool)"""
+    with closing(get_member_statement(member_id, start)) as rows:
+        return list(islice(rows, STATEMENT_ROWS))
+
+
+def create_statement_row(line):
+    """Create a DataRow for one statement line"""
+    # The opening balance has no amount of its own; the entry kind says which way the others go
+    amount = abs(line.savings_change or line.loan_change) if line.reference_id is not None else None
+    description = f"Loan #{line.loan_id}" if line.loan_id is not None else ""
+    if line.description:
+        description = f"{description} {line.description}".strip()
+    return ft.DataRow(
+        cells=[
+            ft.DataCell(ft.Text(line.entry_date.strftime("%Y-%m-%d") if line.entry_date else "", size=11)),
+            ft.DataCell(ft.Text(line.kind, size=11)),
+            ft.DataCell(ft.Text(description, size=11)),
+            ft.DataCell(ft.Text(f"₹{amount:.2f}" if amount is not None else "", size=11)),
+            ft.DataCell(ft.Text(f"₹{line.savings_balance:.2f}", size=11, color=ft.Colors.GREEN_400)),
+            ft.DataCell(ft.Text(f"₹{line.loan_balance:.2f}", size=11, color=ft.Colors.ORANGE_400)),
+        ]
+    )
 
 
 def MemberScreen(page: ft.Page):
     """Members management screen with DataTable and dialogs"""
     
-    # State management
-    members_list = get_all_members()
+    # State management: only the visible page of members is loaded (by name)
+    members_page = {"page": None, "number": 1, "balances": {}}
     
     # Dialog for creating/editing member
     member_dialog = ft.AlertDialog(
@@ -40,8 +78,22 @@ def MemberScreen(page: ft.Page):
         ),
         actions=[
             ft.TextButton("Cancel", on_click=lambda e: close_member_dialog()),
-            ft.TextButton("Save", on_click=lambda e: save_member()),
+            ft.TextButton("Save", on_click=lambda e: page.run_task(save_member)),
+        ],
+    )
+    
+    # Member statement shown in the details dialog
+    statement_table = ft.DataTable(
+        columns=[
+            ft.DataColumn(ft.Text("Date")),
+            ft.DataColumn(ft.Text("Entry")),
+            ft.DataColumn(ft.Text("Details")),
+            ft.DataColumn(ft.Text("Amount")),
+            ft.DataColumn(ft.Text("Savings")),
+            ft.DataColumn(ft.Text("Loan Balance")),
         ],
+        rows=[],
+        column_spacing=16,
     )
     
     # Dialog for viewing member details
@@ -57,9 +109,13 @@ def MemberScreen(page: ft.Page):
                 ft.Divider(),
                 ft.Text("Active Loans", weight="bold"),
                 ft.Text("", size=12),  # Loans info
+                ft.Divider(),
+                ft.Text(f"Statement (last {STATEMENT_DAYS} days)", weight="bold"),
+                ft.Column(controls=[statement_table], height=300, scroll=ft.ScrollMode.AUTO),
             ],
-            width=500,
+            width=700,
             spacing=10,
+            scroll=ft.ScrollMode.AUTO,
         ),
         actions=[
             ft.TextButton("Close", on_click=lambda e: close_details_dialog()),
@@ -74,32 +130,48 @@ def MemberScreen(page: ft.Page):
         details_dialog.open = False
         page.update()
     
-    def save_member():
+    # Database calls run on the async_api worker pool; the bar shows while they do
+    progress_bar, busy = create_progress_bar(page)
+    
+    async def save_member():
         name = member_dialog.content.controls[0].value
         contact = member_dialog.content.controls[1].value
         email = member_dialog.content.controls[2].value
         status = member_dialog.content.controls[3].value or "Active"
         
         if name:
-            create_member(name, contact or None, email or None, status)
+            async with busy():
+                await create_member(name, contact or None, email or None, status)
             close_member_dialog()
-            refresh_members()
+            await refresh_members()
             page.snack_bar = ft.SnackBar(ft.Text("Member added successfully!"))
             page.snack_bar.open = True
             page.update()
     
-    def refresh_members():
-        nonlocal members_list
-        members_list = get_all_members()
+    async def load_members_page(after=None, before=None, number=1):
+        async with busy():
+            members_page["page"] = await get_members_page(after=after, before=before, limit=PAGE_SIZE)
+            # Totals come from the maintained member_balances table: one row per member
+            members_page["balances"] = await get_member_balances([m.id for m in members_page["page"].items])
+        members_page["number"] = number
         update_members_table()
     
+    async def refresh_members():
+        await load_members_page()
+    
+    async def next_members_page():
+        await load_members_page(after=members_page["page"].next_cursor, number=members_page["number"] + 1)
+    
+    async def previous_members_page():
+        await load_members_page(before=members_page["page"].prev_cursor, number=members_page["number"] - 1)
+    
     def update_members_table():
         rows = []
-        for member in members_list:
-            contributions = get_contributions_by_member(member.id)
-            loans = get_loans_by_member(member.id)
-            total_contrib = sum(c.amount for c in contributions)
-            active_loans = sum(1 for l in loans if l.status.value == "Active")
+        balances = members_page["balances"]
+        for member in members_page["page"].items:
+            balance = balances.get(member.id)
+            total_contrib = balance.total_contributions if balance else 0.0
+            active_loans = balance.active_loan_count if balance else 0
             
             rows.append(
                 ft.DataRow(
@@ -116,13 +188,13 @@ def MemberScreen(page: ft.Page):
                                     ft.IconButton(
                                         ft.Icons.VISIBILITY,
                                         tooltip="View Details",
-                                        on_click=lambda e, m=member: view_member_details(m),
+                                        on_click=lambda e, m=member: page.run_task(view_member_details, m),
                                         icon_size=18,
                                     ),
                                     ft.IconButton(
                                         ft.Icons.DELETE,
                                         tooltip="Delete",
-                                        on_click=lambda e, m=member: delete_member_record(m),
+                                        on_click=lambda e, m=member: page.run_task(delete_member_record, m),
                                         icon_size=18,
                                     ),
                                 ],
@@ -134,26 +206,33 @@ def MemberScreen(page: ft.Page):
             )
         
         members_table.rows = rows
+        sync_pagination(members_page["page"], members_page["number"])
         page.update()
     
-    def view_member_details(member):
-        contributions = get_contributions_by_member(member.id)
-        loans = get_loans_by_member(member.id)
+    async def view_member_details(member):
+        async with busy():
+            balance = await get_member_balance(member.id)
+            statement = await run(load_statement, member.id, datetime.now() - timedelta(days=STATEMENT_DAYS))
         
-        total_contrib = sum(c.amount for c in contributions)
-        loan_info = f"Total: {len(loans)}, Active: {sum(1 for l in loans if l.status.value == 'Active')}"
+        total_contrib = balance.total_contributions if balance else 0.0
+        loan_count = balance.loan_count if balance else 0
+        active_loans = balance.active_loan_count if balance else 0
+        outstanding = balance.outstanding_balance if balance else 0.0
+        loan_info = f"Total: {loan_count}, Active: {active_loans}, Outstanding: ₹{outstanding:.2f}"
         
         details_dialog.content.controls[0].value = member.name
         details_dialog.content.controls[1].value = f"Contact: {member.contact or 'N/A'} | Email: {member.email or 'N/A'}"
         details_dialog.content.controls[3].value = f"Total Contributions: ₹{total_contrib:.2f}"
         details_dialog.content.controls[5].value = loan_info
+        statement_table.rows = [create_statement_row(line) for line in statement]
         
         details_dialog.open = True
         page.update()
     
-    def delete_member_record(member):
-        delete_member(member.id)
-        refresh_members()
+    async def delete_member_record(member):
+        async with busy():
+            await delete_member(member.id)
+        await refresh_members()
         page.snack_bar = ft.SnackBar(ft.Text("Member deleted!"))
         page.snack_bar.open = True
         page.update()
@@ -174,7 +253,13 @@ def MemberScreen(page: ft.Page):
         divider_thickness=1,
     )
     
-    update_members_table()
+    pagination_bar, sync_pagination = create_pagination_bar(
+        lambda: page.run_task(previous_members_page),
+        lambda: page.run_task(next_members_page),
+    )
+    
+    # The first page loads in the background once the screen is shown
+    page.run_task(load_members_page)
     
     # Add button
     add_member_button = ft.ElevatedButton(
@@ -194,7 +279,7 @@ def MemberScreen(page: ft.Page):
     refresh_button = ft.IconButton(
         ft.Icons.REFRESH,
         tooltip="Refresh",
-        on_click=lambda e: refresh_members(),
+        on_click=lambda e: page.run_task(refresh_members),
     )
     
     # Top controls
@@ -212,6 +297,7 @@ def MemberScreen(page: ft.Page):
             controls=[
                 ft.Text("Member Management", size=24, weight="bold", color=ft.Colors.BLUE_200),
                 top_row,
+                progress_bar,
                 ft.Container(
                     content=members_table,
                     bgcolor="#2a2a2a",
@@ -219,6 +305,7 @@ def MemberScreen(page: ft.Page):
                     padding=10,
                     expand=True,
                 ),
+                pagination_bar,
             ],
             spacing=20,
             expand=True,
@@ -1,9 +1,10 @@
 import flet as ft
 from components.navigation import create_app_bar
 from database.connection import init_db
-from datetime import datetime
+from database.async_api import export_tables, run
+from components.progress import create_progress_bar
 import os
-import csv
+import threading
 
 
 def SettingsScreen(page: ft.Page):
@@ -12,67 +13,52 @@ def SettingsScreen(page: ft.Page):
     # Export status text
     export_status = ft.Text("No export in progress", size=12, color=ft.Colors.GREY)
     
-    def export_to_csv():
-        """Export data to CSV files"""
+    # Database work runs on the async_api worker pool; the bar shows while it does
+    progress_bar, busy = create_progress_bar(page)
+    
+    # The running export's cancel flag, and the last progress shown
+    export_state = {"cancel": None, "percent": None}
+    
+    compress_switch = ft.Switch(label="gzip", value=False)
+    
+    def show_export_progress(done: int, total: int):
+        """Show how far the export is (called from the export's writer threads)"""
+        percent = done * 100 // total if total else 100
+        if percent == export_state["percent"]:
+            return
+        export_state["percent"] = percent
+        progress_bar.value = percent / 100
+        export_status.value = f"Exporting... {done:,} of {total:,} rows"
+        page.update()
+    
+    async def export_to_csv():
+        """Export data to CSV files without blocking the UI"""
+        exports_dir = os.path.join(os.path.dirname(__file__), "..", "exports")
+        export_state["cancel"] = threading.Event()
+        export_state["percent"] = None
+        export_button.disabled = True
+        cancel_button.visible = True
+        export_status.value = "Exporting..."
+        export_status.color = ft.Colors.GREY
         try:
-            from database.connection import (
-                get_all_members,
-                get_all_loans,
-                get_all_contributions,
-            )
+            async with busy():
+                result = await export_tables(
+                    exports_dir,
+                    compress=compress_switch.value,
+                    progress=show_export_progress,
+                    cancel=export_state["cancel"],
+                )
             
-            # Create exports folder if not exists
-            exports_dir = os.path.join(os.path.dirname(__file__), "..", "exports")
-            os.makedirs(exports_dir, exist_ok=True)
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            
-            # Export members
-            members = get_all_members()
-            members_file = os.path.join(exports_dir, f"members_{timestamp}.csv")
-            with open(members_file, "w", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow(["ID", "Name", "Contact", "Email", "Status", "Join Date"])
-                for m in members:
-                    writer.writerow([
-                        m.id, m.name, m.contact or "", m.email or "",
-                        m.status.value, m.join_date.strftime("%Y-%m-%d")
-                    ])
-            
-            # Export loans
-            loans = get_all_loans()
-            loans_file = os.path.join(exports_dir, f"loans_{timestamp}.csv")
-            with open(loans_file, "w", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    "ID", "Member ID", "Amount", "Interest %", "Repaid", "Status", "Start Date"
-                ])
-                for l in loans:
-                    writer.writerow([
-                        l.id, l.member_id, l.amount, l.interest_rate,
-                        l.amount_repaid, l.status.value, l.start_date.strftime("%Y-%m-%d")
-                    ])
-            
-            # Export contributions
-            contributions = get_all_contributions()
-            contrib_file = os.path.join(exports_dir, f"contributions_{timestamp}.csv")
-            with open(contrib_file, "w", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    "ID", "Member ID", "Amount", "Type", "Date", "Month"
-                ])
-                for c in contributions:
-                    writer.writerow([
-                        c.id, c.member_id, c.amount, c.contribution_type.value,
-                        c.contribution_date.strftime("%Y-%m-%d"), c.month or ""
-                    ])
-            
-            export_status.value = f"✓ Exported successfully to {exports_dir}"
-            export_status.color = ft.Colors.GREEN_700
-            page.snack_bar = ft.SnackBar(
-                ft.Text(f"Data exported to {exports_dir}")
-            )
-            page.snack_bar.open = True
+            if result.cancelled:
+                export_status.value = "Export cancelled"
+                export_status.color = ft.Colors.GREY
+            else:
+                export_status.value = f"✓ Exported {result.rows:,} rows to {exports_dir}"
+                export_status.color = ft.Colors.GREEN_700
+                page.snack_bar = ft.SnackBar(
+                    ft.Text(f"Data exported to {exports_dir}")
+                )
+                page.snack_bar.open = True
             
         except Exception as e:
             export_status.value = f"✗ Export failed: {str(e)}"
@@ -80,13 +66,38 @@ def SettingsScreen(page: ft.Page):
             page.snack_bar = ft.SnackBar(ft.Text(f"Export failed: {str(e)}"))
             page.snack_bar.open = True
         
+        finally:
+            progress_bar.value = None
+            export_button.disabled = False
+            cancel_button.visible = False
+        
         page.update()
     
+    def cancel_export():
+        """Stop the running export; it keeps no files"""
+        if export_state["cancel"] is not None:
+            export_state["cancel"].set()
+        export_status.value = "Cancelling..."
+        page.update()
+    
+    export_button = ft.ElevatedButton(
+        "Export to CSV",
+        icon=ft.Icons.DOWNLOAD,
+        on_click=lambda e: page.run_task(export_to_csv),
+    )
+    cancel_button = ft.TextButton(
+        "Cancel",
+        icon=ft.Icons.CLOSE,
+        visible=False,
+        on_click=lambda e: cancel_export(),
+    )
+    
     def reset_database():
         """Reset database with confirmation"""
         
-        def confirm_reset(e):
-            init_db()
+        async def confirm_reset():
+            async with busy():
+                await run(init_db)
             confirm_dialog.open = False
             page.snack_bar = ft.SnackBar(ft.Text("Database reset successfully!"))
             page.snack_bar.open = True
@@ -102,7 +113,7 @@ def SettingsScreen(page: ft.Page):
                     setattr(confirm_dialog, 'open', False),
                     page.update()
                 )),
-                ft.TextButton("Reset", on_click=confirm_reset),
+                ft.TextButton("Reset", on_click=lambda e: page.run_task(confirm_reset)),
             ],
         )
         
@@ -122,23 +133,22 @@ def SettingsScreen(page: ft.Page):
                             controls=[
                                 ft.Text("Export Data", size=12, weight="bold", color=ft.Colors.WHITE),
                                 ft.Text(
-                                    "Download all data as CSV files for backup or analysis",
+                                    "Download all data as CSV files (optionally gzipped) for backup or analysis",
                                     size=11,
                                     color=ft.Colors.GREY
                                 ),
                             ],
                             expand=True,
                         ),
-                        ft.ElevatedButton(
-                            "Export to CSV",
-                            icon=ft.Icons.DOWNLOAD,
-                            on_click=lambda e: export_to_csv(),
-                        ),
+                        compress_switch,
+                        export_button,
+                        cancel_button,
                     ],
                     spacing=20,
                     alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
                 ),
                 export_status,
+                progress_bar,
                 ft.Divider(),
                 ft.Row(
                     controls=[
@@ -0,0 +1,56 @@
+"""Shared fixtures: every test gets its own SQLite file behind the data layer"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import select
+
+from database import connection
+from database.config import create_app_engine
+from database.migrations import upgrade
+from database.models import MonthlyRollup
+
+
+@contextmanager
+def use_engine(engine):
+    """Point the data layer at engine for the duration of the block"""
+    previous = connection.engine
+    connection.engine = engine
+    connection.SessionLocal.configure(bind=engine)
+    connection.member_directory.invalidate()
+    connection.query_cache.clear()
+    try:
+        yield engine
+    finally:
+        connection.engine = previous
+        connection.SessionLocal.configure(bind=previous)
+        connection.member_directory.invalidate()
+        connection.query_cache.clear()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A fresh, fully migrated database file used by connection.py"""
+    engine = create_app_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    with use_engine(engine):
+        connection.Base.metadata.create_all(bind=engine)
+        upgrade(engine)
+        yield engine
+    engine.dispose()
+
+
+def rollup_rows() -> list:
+    """monthly_rollups as stored, in key order"""
+    with connection.session_scope() as session:
+        rows = session.execute(
+            select(MonthlyRollup.__table__).order_by(MonthlyRollup.month, MonthlyRollup.kind, MonthlyRollup.contribution_type)
+        ).all()
+    return [tuple(row) for row in rows]
+
+
+def assert_summaries_consistent():
+    """member_balances and monthly_rollups, kept up to date by every write, equal a full rebuild"""
+    assert connection.rebuild_member_balances()["drift"] == []
+    rollups = rollup_rows()
+    connection.rebuild_monthly_rollups()
+    # A month whose activity was all deleted keeps a row with a zero count
+    assert [row for row in rollups if row[4]] == rollup_rows()
@@ -0,0 +1,81 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from database import accrual, connection
+from database.models import BatchCheckpoint, Loan
+
+
+@pytest.fixture
+def active_loans(engine):
+    member = connection.create_member("Asha Rao")
+    loan_ids = []
+    for _ in range(7):
+        loan = connection.create_loan(member.id, 1200.0, 12.0, term_months=12)
+        connection.update_loan(loan.id, status="Active")
+        loan_ids.append(loan.id)
+    return loan_ids
+
+
+def accrued() -> dict:
+    with connection.session_scope() as session:
+        return {row.id: (row.accrued_interest, row.accrued_through) for row in session.execute(
+            select(Loan.id, Loan.accrued_interest, Loan.accrued_through).order_by(Loan.id)
+        )}
+
+
+def checkpoint():
+    with connection.session_scope() as session:
+        return session.scalars(select(BatchCheckpoint)).one()
+
+
+def test_a_failed_run_resumes_after_its_last_chunk(active_loans, monkeypatch):
+    day = date.today() + timedelta(days=95)
+    process_chunk = accrual.process_chunk
+    calls = []
+
+    def failing_on_the_third_chunk(conn, loan_ids, *args):
+        calls.append(list(loan_ids))
+        if len(calls) == 3:
+            raise RuntimeError("disk full")
+        return process_chunk(conn, loan_ids, *args)
+
+    monkeypatch.setattr(accrual, "process_chunk", failing_on_the_third_chunk)
+    first = connection.run_accrual(day, chunk_size=2, pause=0)
+    assert not first.finished
+    assert first.processed == 4
+    assert checkpoint().last_id == active_loans[3]
+    assert all(accrued()[loan_id][1] is None for loan_id in active_loans[4:])
+
+    monkeypatch.setattr(accrual, "process_chunk", process_chunk)
+    second = connection.run_accrual(day, chunk_size=2, pause=0)
+    assert second.finished
+    assert second.processed == 3
+    assert checkpoint().processed == 7 and checkpoint().finished_at is not None
+
+    # Three installments (of 100 principal and 12 interest) fell due within 95 days
+    for loan_id in active_loans:
+        interest, through = accrued()[loan_id]
+        assert interest == pytest.approx(36.0)
+        assert through == accrual.period_end(day)
+
+
+def test_a_finished_period_is_not_run_again(active_loans):
+    day = date.today()
+    assert connection.run_accrual(day, pause=0).processed == 7
+    assert connection.run_accrual(day, pause=0).processed == 0
+    # A new period starts over from the first loan
+    assert connection.run_accrual(day + timedelta(days=1), pause=0).processed == 7
+
+
+def test_time_budget_stops_between_chunks(active_loans):
+    run = connection.run_accrual(date.today(), time_budget=0, pause=0)
+    assert not run.finished and run.processed == 0
+    assert connection.run_accrual(date.today(), pause=0).processed == 7
+
+
+def test_loans_long_past_due_are_defaulted(active_loans):
+    run = connection.run_accrual(date.today() + timedelta(days=200), pause=0)
+    assert run.defaulted == 7
+    assert connection.get_active_loans() == []
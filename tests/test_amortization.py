@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from database.amortization import build_schedules
+
+
+def schedules():
+    """A flat, a reducing-balance and an unevenly divided loan, scheduled in one call"""
+    return build_schedules(
+        loan_ids=[1, 2, 3],
+        amounts=[1200.0, 10000.0, 1000.0],
+        interest_rates=[12.0, 12.0, 10.0],
+        terms=[12, 12, 3],
+        reducing=[False, True, False],
+        start_dates=[datetime(2024, 1, 10), datetime(2024, 1, 10), datetime(2024, 1, 31)],
+    )
+
+
+def installments(built, loan_id: int) -> np.ndarray:
+    return built.loan_id == loan_id
+
+
+def test_flat_installments_are_equal():
+    built = schedules()
+    flat = installments(built, 1)
+    assert built.principal[flat].tolist() == [100.0] * 12
+    assert built.interest[flat].tolist() == [12.0] * 12
+    assert built.amount_due[flat].tolist() == [112.0] * 12
+    assert built.total_interest[0] == 144.0
+
+
+def test_reducing_balance_installments_are_an_annuity():
+    built = schedules()
+    reducing = installments(built, 2)
+    # 10,000 at 1% a month over 12 months is 888.49 a month, with 100.00 interest in the first
+    assert built.amount_due[reducing][:11].tolist() == [888.49] * 11
+    assert (built.interest[reducing][0], built.principal[reducing][0]) == (100.0, 788.49)
+    assert np.all(np.diff(built.principal[reducing][:11]) > 0)
+    # The last installment takes the rounding left over
+    assert built.amount_due[reducing][-1] == 888.47
+    assert built.total_interest[1] == 661.86
+
+
+def test_installments_add_up_to_principal_plus_interest():
+    built = schedules()
+    for index, (loan_id, amount) in enumerate([(1, 1200.0), (2, 10000.0), (3, 1000.0)]):
+        rows = installments(built, loan_id)
+        assert built.principal[rows].sum() == pytest.approx(amount)
+        assert built.amount_due[rows].sum() == pytest.approx(amount + built.total_interest[index])
+        assert built.balance[rows][-1] == 0.0
+
+
+def test_the_last_installment_absorbs_rounding():
+    built = schedules()
+    uneven = installments(built, 3)
+    assert built.principal[uneven].tolist() == [333.33, 333.33, 333.34]
+    assert built.interest[uneven].tolist() == [8.33, 8.33, 8.34]
+    assert built.balance[uneven].tolist() == [666.67, 333.34, 0.0]
+    # Due on the start date's day, or the last day of a shorter month
+    assert built.due_date[uneven].astype("datetime64[D]").astype(str).tolist() == [
+        "2024-02-29", "2024-03-31", "2024-04-30",
+    ]
+
+
+def test_a_term_below_one_month_is_refused():
+    with pytest.raises(ValueError, match="at least one month"):
+        build_schedules([1], [1000.0], [10.0], [0], [False], [datetime(2024, 1, 10)])
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from database import connection
+from database.models import LoanArrears
+
+
+def arrears_rows() -> dict:
+    with connection.session_scope() as session:
+        return {row.loan_id: row for row in session.scalars(select(LoanArrears))}
+
+
+def test_pending_loans_are_not_in_arrears(engine):
+    member = connection.create_member("Asha Rao")
+    start_date = datetime.now() - timedelta(days=100)
+    pending = connection.create_loan(member.id, 1200.0, 12.0, term_months=12)
+    connection.update_loan(pending.id, start_date=start_date)
+    active = connection.create_loan(member.id, 1200.0, 12.0, term_months=12)
+    connection.update_loan(active.id, start_date=start_date, status="Active")
+
+    connection.refresh_loan_arrears()
+    assert list(arrears_rows()) == [active.id]
+    assert connection.get_aged_loans_count() == 1
+    assert arrears_rows()[active.id].days_past_due > 30
+
+    par = connection.get_portfolio_at_risk()
+    assert par.loans == 1
+    assert par.outstanding == pytest.approx(1344.0)
+    assert par.par_30 == 1.0
+
+    # Paying out the loan brings it into the snapshot
+    connection.update_loan(pending.id, status="Active")
+    assert sorted(arrears_rows()) == [pending.id, active.id]
+
+
+def test_only_disbursed_loans_with_a_due_date_are_aged(engine):
+    member = connection.create_member("Asha Rao")
+    connection.create_loan(member.id, 1200.0, 12.0, term_months=12)
+    undated = connection.create_loan(member.id, 500.0, 5.0)
+    connection.update_loan(undated.id, status="Active")
+
+    # The dashboard skips refreshing an empty snapshot that no loan belongs in
+    assert connection.get_portfolio_at_risk().as_of is None
+    assert connection.get_aged_loans_count() == 0
+
+    connection.update_loan(undated.id, end_date=datetime.now() + timedelta(days=30))
+    assert connection.get_aged_loans_count() == 1
+    assert connection.get_portfolio_at_risk().as_of is not None
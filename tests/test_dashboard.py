@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import connection
+from database.connection import OTHERS_LABEL, get_top_contributors
+
+
+@pytest.fixture
+def contributors(engine):
+    """Ten members contributing 100 to 1,000 this week, and one large contribution from last year"""
+    members = [connection.create_member(f"Member {n}").id for n in range(10)]
+    now = datetime.now()
+    connection.bulk_record_contributions(
+        [{"member_id": member_id, "amount": 100.0 * (n + 1), "contribution_date": now - timedelta(days=2)}
+         for n, member_id in enumerate(members)]
+        + [{"member_id": members[0], "amount": 5000.0, "contribution_date": now - timedelta(days=400)}]
+    )
+    return members
+
+
+def test_members_past_the_limit_are_grouped_as_others(contributors):
+    top = get_top_contributors(3)
+
+    assert top == [("Member 0", 5100.0), ("Member 9", 1000.0), ("Member 8", 900.0), (OTHERS_LABEL, 3500.0)]
+    assert sum(total for _, total in top) == connection.get_total_contributions()
+    # No Others slice when every contributor is listed
+    assert len(get_top_contributors(10)) == 10
+
+
+def test_a_period_counts_only_its_contributions(contributors):
+    last_month = get_top_contributors(2, start=datetime.now() - timedelta(days=30))
+    assert last_month == [("Member 9", 1000.0), ("Member 8", 900.0), (OTHERS_LABEL, 3600.0)]
+
+    last_year = get_top_contributors(2, end=datetime.now() - timedelta(days=30))
+    assert last_year == [("Member 0", 5000.0)]
+
+
+def test_the_pie_chart_periods(contributors):
+    pytest.importorskip("flet")
+    from main_window import get_member_contribution_data
+
+    assert get_member_contribution_data("All time")[0] == ("Member 0", 5100.0)
+    last_30_days = get_member_contribution_data("Last 30 days")
+    assert last_30_days[0] == ("Member 9", 1000.0)
+    assert last_30_days[-1] == (OTHERS_LABEL, 100.0 + 200.0)
@@ -0,0 +1,77 @@
+import csv
+import gzip
+import os
+import threading
+
+from sqlalchemy import event
+
+from database import connection
+from database.export import export_tables
+
+
+def add_members(count: int):
+    """count members, each with one loan and one contribution"""
+    for n in range(count):
+        member = connection.create_member(f"Member {n}")
+        connection.create_loan(member.id, 1000.0, 10.0)
+        connection.record_contribution(member.id, 100.0)
+
+
+def read_csv(path: str) -> list:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", newline="") as file:
+        return list(csv.reader(file))[1:]
+
+
+def test_compressed_export_writes_gzip_files(engine, tmp_path):
+    add_members(3)
+    exports = tmp_path / "exports"
+    result = export_tables(str(exports), compress=True, batch_size=2)
+
+    assert not result.cancelled
+    assert result.rows == 9
+    assert [os.path.basename(path).split("_")[0] for path in result.files] == ["members", "loans", "contributions"]
+    assert all(path.endswith(".csv.gz") for path in result.files)
+    members = read_csv(result.files[0])
+    assert [row[1] for row in members] == ["Member 0", "Member 1", "Member 2"]
+    assert sorted(os.listdir(exports)) == sorted(os.path.basename(path) for path in result.files)
+
+
+def test_a_cancelled_export_leaves_no_files(engine, tmp_path):
+    add_members(20)
+    cancel = threading.Event()
+
+    def on_progress(done, total):
+        cancel.set()
+
+    exports = tmp_path / "exports"
+    result = export_tables(str(exports), progress=on_progress, cancel=cancel, batch_size=1)
+
+    assert result.cancelled
+    assert result.files == []
+    assert 0 < result.rows < 60
+    assert os.listdir(exports) == []
+
+
+def test_every_table_comes_from_one_snapshot(engine, tmp_path):
+    add_members(3)
+    writes = []
+
+    def write_during_export(conn, cursor, statement, *args):
+        # Another clerk saves once the export has counted its rows and before it reads them
+        if "count(" in statement and not writes:
+            writes.append(threading.Thread(target=add_members, args=(1,)))
+            writes[0].start()
+            writes[0].join()
+
+    event.listen(engine, "after_cursor_execute", write_during_export)
+    try:
+        result = export_tables(str(tmp_path / "exports"), batch_size=1)
+    finally:
+        event.remove(engine, "after_cursor_execute", write_during_export)
+
+    assert writes
+    assert len(connection.get_all_members()) == 4
+    members, loans, contributions = map(read_csv, result.files)
+    assert (len(members), len(loans), len(contributions)) == (3, 3, 3)
+    assert result.rows == 9
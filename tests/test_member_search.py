@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import text
+
+from database import connection
+
+
+@pytest.fixture
+def members(engine):
+    return {
+        member.name: member.id
+        for member in (
+            connection.create_member("Jane Doe", contact="555-0101", email="jane@example.com"),
+            connection.create_member("Janet Smith", contact="555-0199"),
+            connection.create_member("Doug Jones", email="doug@example.com"),
+        )
+    }
+
+
+def names(prefix: str) -> list:
+    return sorted(member.name for member in connection.search_members(prefix))
+
+
+def indexed(match: str) -> list:
+    """Member IDs the FTS5 index itself returns for match"""
+    with connection.session_scope() as session:
+        return [row[0] for row in session.execute(
+            text("SELECT rowid FROM members_fts WHERE members_fts MATCH :match ORDER BY rowid"), {"match": match}
+        )]
+
+
+@pytest.mark.parametrize("fts5", [True, False])
+def test_words_match_by_prefix(members, monkeypatch, fts5):
+    if not fts5:
+        # As on a SQLite built without FTS5, or PostgreSQL: LIKE on the start of each field
+        monkeypatch.setattr(connection, "_has_member_search_index", lambda session: False)
+
+    assert names("jan") == ["Jane Doe", "Janet Smith"]
+    assert names("JANE") == ["Jane Doe", "Janet Smith"]
+    assert names("jane do") == ["Jane Doe"]
+    assert names("do") == ["Doug Jones", "Jane Doe"]
+    assert names("555") == ["Jane Doe", "Janet Smith"]
+    assert names("doug@") == ["Doug Jones"]
+    assert names("smithers") == []
+    assert names("  ") == []
+
+
+def test_the_index_follows_updates_and_deletes(members):
+    jane = members["Jane Doe"]
+    assert indexed('"jane"*') == [jane, members["Janet Smith"]]
+
+    connection.update_member(jane, name="Joan Doe", email="joan@example.com")
+    assert indexed('"jane"*') == [members["Janet Smith"]]
+    assert indexed('"joan"*') == [jane]
+    assert names("joan") == ["Joan Doe"]
+    assert names("jane") == ["Janet Smith"]
+
+    connection.delete_member(members["Janet Smith"])
+    assert indexed('"jan"*') == []
+    assert names("jan") == []
+
+
+def test_search_works_without_the_index(members):
+    # What migration 5 leaves behind when SQLite has no FTS5: no table and no triggers
+    with connection.session_scope() as session:
+        for trigger in ("members_fts_insert", "members_fts_delete", "members_fts_update"):
+            session.execute(text(f"DROP TRIGGER {trigger}"))
+        session.execute(text("DROP TABLE members_fts"))
+    connection.query_cache.clear()
+
+    connection.create_member("Jan Kowalski")
+    assert names("jan") == ["Jan Kowalski", "Jane Doe", "Janet Smith"]
+    assert names("doe ja") == ["Jane Doe"]
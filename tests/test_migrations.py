@@ -0,0 +1,159 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+
+from database import connection
+from database.models import Loan, LoanArrears, LoanStatus
+from database.migrations import LATEST_VERSION, get_schema_version, upgrade
+
+from conftest import assert_summaries_consistent, use_engine
+
+
+# The tables of a loan_manager.db from before the first migration
+ORIGINAL_SCHEMA = [
+    """CREATE TABLE members (
+        id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, contact VARCHAR(20), email VARCHAR(100),
+        join_date DATETIME NOT NULL, status VARCHAR(9) NOT NULL, created_at DATETIME, updated_at DATETIME,
+        PRIMARY KEY (id))""",
+    """CREATE TABLE loans (
+        id INTEGER NOT NULL, member_id INTEGER NOT NULL, amount FLOAT NOT NULL, interest_rate FLOAT NOT NULL,
+        start_date DATETIME NOT NULL, end_date DATETIME, status VARCHAR(9) NOT NULL, total_interest FLOAT NOT NULL,
+        amount_repaid FLOAT NOT NULL, created_at DATETIME, updated_at DATETIME,
+        PRIMARY KEY (id), FOREIGN KEY(member_id) REFERENCES members (id))""",
+    """CREATE TABLE contributions (
+        id INTEGER NOT NULL, member_id INTEGER NOT NULL, amount FLOAT NOT NULL, contribution_date DATETIME NOT NULL,
+        contribution_type VARCHAR(9) NOT NULL, month VARCHAR(7), notes VARCHAR(255), created_at DATETIME,
+        PRIMARY KEY (id), FOREIGN KEY(member_id) REFERENCES members (id))""",
+    """CREATE TABLE loan_repayments (
+        id INTEGER NOT NULL, loan_id INTEGER NOT NULL, amount_paid FLOAT NOT NULL, payment_date DATETIME NOT NULL,
+        notes VARCHAR(255), created_at DATETIME,
+        PRIMARY KEY (id), FOREIGN KEY(loan_id) REFERENCES loans (id))""",
+]
+
+ORIGINAL_ROWS = [
+    "INSERT INTO members VALUES (1, 'Asha Rao', '555-0101', NULL, '2024-01-05 09:00:00', 'ACTIVE', NULL, NULL)",
+    "INSERT INTO members VALUES (2, 'Ben Okafor', NULL, NULL, '2024-02-01 09:00:00', 'INACTIVE', NULL, NULL)",
+    "INSERT INTO loans VALUES (1, 1, 10000, 10, '2024-01-10 00:00:00', '2024-07-10 00:00:00', 'ACTIVE', 1000, 2500,"
+    " NULL, NULL)",
+    "INSERT INTO loans VALUES (2, 2, 4000, 5, '2024-02-10 00:00:00', NULL, 'PAID', 200, 4200, NULL, NULL)",
+    "INSERT INTO loans VALUES (3, 2, 3000, 5, '2024-03-10 00:00:00', '2024-09-10 00:00:00', 'PENDING', 150, 0,"
+    " NULL, NULL)",
+    "INSERT INTO contributions VALUES (1, 1, 500, '2024-01-31 00:00:00', 'MONTHLY', '2024-01', NULL, NULL)",
+    "INSERT INTO contributions VALUES (2, 1, 500, '2024-02-29 00:00:00', 'MONTHLY', '2024-02', NULL, NULL)",
+    "INSERT INTO contributions VALUES (3, 2, 250, '2024-02-15 00:00:00', 'VOLUNTARY', '2024-02', NULL, NULL)",
+    "INSERT INTO loan_repayments VALUES (1, 1, 2500, '2024-03-01 00:00:00', NULL, NULL)",
+    "INSERT INTO loan_repayments VALUES (2, 2, 4200, '2024-03-05 00:00:00', NULL, NULL)",
+]
+
+
+@pytest.fixture
+def original_engine(tmp_path):
+    """A database file with the original schema and some data, not migrated yet"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'original.db'}")
+    with engine.begin() as conn:
+        for statement in ORIGINAL_SCHEMA + ORIGINAL_ROWS:
+            conn.execute(text(statement))
+    with use_engine(engine):
+        yield engine
+    engine.dispose()
+
+
+def migrate(engine) -> int:
+    """What init_db() does at startup"""
+    connection.Base.metadata.create_all(bind=engine)
+    return upgrade(engine)
+
+
+def test_upgrade_runs_every_migration_in_order(original_engine):
+    with original_engine.connect() as conn:
+        assert get_schema_version(conn) == 0
+
+    assert migrate(original_engine) == LATEST_VERSION
+    with original_engine.connect() as conn:
+        assert get_schema_version(conn) == LATEST_VERSION
+        indexes = {index["name"] for index in inspect(conn).get_indexes("loans")}
+        columns = {column["name"] for column in inspect(conn).get_columns("loans")}
+    assert {"ix_loans_member_id", "ix_loans_active_member"} <= indexes
+    assert {"term_months", "interest_method", "accrued_interest", "accrued_through"} <= columns
+
+
+def test_upgrade_is_idempotent(original_engine, capsys):
+    migrate(original_engine)
+    capsys.readouterr()
+    assert migrate(original_engine) == LATEST_VERSION
+    assert "Migrated" not in capsys.readouterr().out
+
+
+def test_backfilled_summaries_match_the_data(original_engine):
+    migrate(original_engine)
+
+    balance = connection.get_member_balance(1)
+    assert balance.total_contributions == 1000
+    assert balance.total_repaid == 2500
+    assert balance.outstanding_balance == 10000 + 1000 - 2500
+    # The Pending loan has not been paid out
+    balance = connection.get_member_balance(2)
+    assert (balance.loan_count, balance.total_borrowed, balance.outstanding_balance) == (2, 4000, 0)
+    months, amounts = connection.get_monthly_trend(3, until=datetime(2024, 3, 31))
+    assert dict(zip(months, amounts)) == {"2024-01": 500.0, "2024-02": 750.0, "2024-03": 0.0}
+    assert_summaries_consistent()
+
+
+def test_backfilled_arrears_match_a_refresh(original_engine):
+    migrate(original_engine)
+
+    def arrears():
+        with connection.session_scope() as session:
+            return session.execute(
+                select(LoanArrears.loan_id, LoanArrears.days_past_due, LoanArrears.bucket,
+                       LoanArrears.arrears_amount, LoanArrears.outstanding)
+            ).all()
+
+    # The Active loan without a term fell due in full on its end date; the Paid one has no row
+    backfilled = arrears()
+    assert [row[:3] for row in backfilled] == [(1, (date.today() - date(2024, 7, 10)).days, "90+")]
+    assert backfilled[0][3:] == (8500.0, 8500.0)
+    connection.refresh_loan_arrears()
+    assert arrears() == backfilled
+
+
+def test_existing_loans_keep_their_flat_charge(original_engine):
+    migrate(original_engine)
+
+    loan = connection.get_loan_by_id(1)
+    assert loan.term_months is None
+    assert loan.total_interest == 1000
+    assert connection.get_loan_schedule(1) == []
+
+
+def test_existing_members_are_searchable(original_engine):
+    migrate(original_engine)
+
+    assert [member.name for member in connection.search_members("asha")] == ["Asha Rao"]
+
+
+def test_existing_loans_accrue_and_default_by_their_end_date(original_engine):
+    migrate(original_engine)
+    undated = connection.create_loan(1, 500.0, 5.0)
+    connection.update_loan(undated.id, status="Active")
+
+    def loan(loan_id):
+        with connection.session_scope() as session:
+            return session.execute(
+                select(Loan.status, Loan.accrued_interest, Loan.accrued_through, LoanArrears.days_past_due)
+                .outerjoin(LoanArrears, LoanArrears.loan_id == Loan.id)
+                .where(Loan.id == loan_id)
+            ).one()
+
+    # Half of the 182 days from start_date to end_date have passed
+    assert connection.run_accrual(date(2024, 4, 10), pause=0).defaulted == 0
+    assert loan(1) == (LoanStatus.ACTIVE, 500.0, datetime(2024, 4, 10, 23, 59, 59, 999999), 0)
+
+    # The whole balance fell due on end_date, 102 days before
+    assert connection.run_accrual(date(2024, 10, 20), pause=0).defaulted == 1
+    assert loan(1)[:2] == (LoanStatus.DEFAULTED, 1000.0)
+    assert loan(1)[3] == 102
+
+    # A loan with neither a term nor an end date has nothing to measure against
+    assert loan(undated.id) == (LoanStatus.ACTIVE, 0.0, None, None)
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from database import connection
+from database.models import Contribution, LoanRepayment
+
+
+NAMES = ["Chen", "Asha", "Ben", "Dara", "Asha", "Eli", "Faye"]
+
+
+@pytest.fixture
+def members(engine):
+    return [connection.create_member(name).id for name in NAMES]
+
+
+def walk_forward(**kwargs) -> list:
+    pages = [connection.get_members_page(limit=3, **kwargs)]
+    while pages[-1].next_cursor is not None:
+        pages.append(connection.get_members_page(after=pages[-1].next_cursor, limit=3, **kwargs))
+    return pages
+
+
+def ids(page) -> list:
+    return [member.id for member in page.items]
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_forward_pages_cover_every_row_once(members, descending):
+    pages = walk_forward(sort="name", descending=descending)
+
+    expected = sorted(zip(NAMES, members), reverse=descending)
+    assert [member_id for page in pages for member_id in ids(page)] == [member_id for _, member_id in expected]
+    assert [len(page.items) for page in pages] == [3, 3, 1]
+    assert pages[0].prev_cursor is None
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_backward_pages_retrace_the_forward_ones(members, descending):
+    forward = walk_forward(sort="name", descending=descending)
+
+    page = forward[-1]
+    backward = [page]
+    while page.prev_cursor is not None:
+        page = connection.get_members_page(before=page.prev_cursor, limit=3, sort="name", descending=descending)
+        backward.append(page)
+    assert [ids(page) for page in reversed(backward)] == [ids(page) for page in forward]
+
+
+def test_ties_on_the_sort_key_are_split_by_id(members):
+    first = connection.get_members_page(limit=1)
+    second = connection.get_members_page(after=first.next_cursor, limit=1)
+
+    assert [m.name for m in first.items + second.items] == ["Asha", "Asha"]
+    assert first.items[0].id < second.items[0].id
+
+
+def test_sorting_by_id_uses_the_id_alone(members):
+    page = connection.get_members_page(sort="id", limit=4)
+    assert ids(page) == members[:4]
+    assert ids(connection.get_members_page(sort="id", after=page.next_cursor, limit=4)) == members[4:]
+
+
+def test_invalid_arguments(members):
+    with pytest.raises(ValueError):
+        connection.get_members_page(sort="email")
+    with pytest.raises(ValueError):
+        connection.get_members_page(after=("Asha", 1), before=("Faye", 7))
+
+
+@pytest.fixture
+def activity(engine):
+    """Three contributions and three repayments, most of them saved in the same instant"""
+    member = connection.create_member("Asha")
+    loan = connection.create_loan(member.id, 1000.0, 10.0)
+    connection.update_loan(loan.id, status="Active")
+    contributions = [connection.record_contribution(member.id, 100.0 + n).id for n in range(3)]
+    repayments = [connection.record_repayment(loan.id, 10.0 + n).id for n in range(3)]
+
+    saved_at = datetime(2024, 6, 1, 12, 0, 0)
+    with connection.session_scope() as session:
+        session.execute(update(Contribution).values(created_at=saved_at))
+        session.execute(update(LoanRepayment).values(created_at=saved_at))
+        session.execute(update(Contribution).where(Contribution.id == contributions[0])
+                        .values(created_at=saved_at + timedelta(seconds=1)))
+        session.execute(update(LoanRepayment).where(LoanRepayment.id == repayments[0])
+                        .values(created_at=saved_at - timedelta(seconds=1)))
+
+    # Newest first; ties on created_at go Repayment before Contribution, then by descending id
+    return [
+        ("Contribution", contributions[0]),
+        ("Repayment", repayments[2]),
+        ("Repayment", repayments[1]),
+        ("Contribution", contributions[2]),
+        ("Contribution", contributions[1]),
+        ("Repayment", repayments[0]),
+    ]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 4])
+def test_activity_pages_split_ties_on_created_at(activity, limit):
+    pages = [connection.get_recent_activities(limit=limit)]
+    while pages[-1].next_cursor is not None:
+        pages.append(connection.get_recent_activities(limit=limit, before=pages[-1].next_cursor))
+
+    assert [(item.kind, item.id) for page in pages for item in page.items] == activity
+    assert all(len(page.items) == limit for page in pages[:-1])
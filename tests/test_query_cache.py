@@ -0,0 +1,191 @@
+import inspect
+import re
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+from database import connection, query_cache
+from database.query_cache import QueryCache
+
+
+def counting(cache: QueryCache, *tables: str, **options):
+    """A cached function returning its argument, with the calls that reached it"""
+    calls = []
+
+    @cache.cached(*tables, **options)
+    def read(value):
+        calls.append(value)
+        return value
+
+    return read, calls
+
+
+def test_bumped_tables_invalidate_only_their_readers():
+    cache = QueryCache()
+    read_members, member_calls = counting(cache, "members")
+    read_loans, loan_calls = counting(cache, "loans")
+    read_members(1), read_loans(1)
+
+    cache.bump("members")
+    read_members(1), read_loans(1)
+    assert member_calls == [1, 1]
+    assert loan_calls == [1]
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = QueryCache(max_entries=2)
+    read, calls = counting(cache, "members")
+    read(1), read(2), read(1), read(3)
+
+    read(1), read(2)
+    assert calls == [1, 2, 3, 2]
+    assert cache.stats().evictions == 2
+
+
+def test_memory_cap_evicts_and_skips_oversized_results():
+    cache = QueryCache(max_bytes=16_000)
+    read, calls = counting(cache, "members")
+    values = [str(n) * 3000 for n in range(6)]
+    for value in values:
+        read(value)
+    stats = cache.stats()
+    assert stats.size_bytes <= 16_000
+    assert (stats.entries, stats.evictions) == (5, 1)
+
+    # A single result over a quarter of the cap is never kept
+    huge = "x" * 5000
+    read(huge), read(huge)
+    assert calls.count(huge) == 2
+    assert cache.stats().entries == 5
+
+
+def test_ttl_expires_entries(monkeypatch):
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(query_cache, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    cache = QueryCache()
+    read, calls = counting(cache, "monthly_rollups", ttl=60)
+
+    read(1)
+    clock.now += 59
+    read(1)
+    clock.now += 2
+    read(1)
+    assert calls == [1, 1]
+
+
+def test_stats_count_hits_misses_and_entries():
+    cache = QueryCache()
+    read, _ = counting(cache, "members")
+    read(1), read(1), read(2)
+    cache.bump("members")
+    read(1)
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.evictions, stats.entries) == (1, 3, 0, 2)
+    assert stats.size_bytes > 0
+
+
+def test_bypass_and_unhashable_arguments_skip_the_cache():
+    bypassed = QueryCache(bypass=lambda: True)
+    read, calls = counting(bypassed, "members")
+    read(1), read(1)
+    assert calls == [1, 1]
+
+    cache = QueryCache()
+    read, calls = counting(cache, "members")
+    read({"a": 1}), read({"a": 1})
+    assert len(calls) == 2
+    assert cache.stats().entries == 0
+
+
+def test_a_commit_invalidates_cached_reads(engine):
+    connection.create_member("Asha Rao")
+    assert [member.name for member in connection.get_all_members()] == ["Asha Rao"]
+
+    connection.create_member("Ben Okafor")
+    assert [member.name for member in connection.get_all_members()] == ["Asha Rao", "Ben Okafor"]
+
+
+def test_a_rollback_invalidates_cached_reads(engine):
+    connection.create_member("Asha Rao")
+    connection.get_all_members()
+    misses = connection.get_query_cache_stats().misses
+
+    with pytest.raises(RuntimeError):
+        with connection.unit_of_work():
+            connection.create_member("Ben Okafor")
+            # Reads inside the block see its own writes and go straight to the database
+            assert len(connection.get_all_members()) == 2
+            raise RuntimeError("cancelled")
+
+    assert [member.name for member in connection.get_all_members()] == ["Asha Rao"]
+    assert connection.get_query_cache_stats().misses == misses + 1
+
+
+# Arguments for the cached readers that have required parameters; the others are called without any
+READER_CALLS = {
+    "get_member_by_id": [(1,)],
+    "search_members": [("asha",)],
+    "get_loans_by_member": [(1,)],
+    "get_loan_by_id": [(1,)],
+    "get_loan_schedule": [(1,)],
+    "get_repayments_by_loan": [(1,)],
+    "get_contributions_by_member": [(1,)],
+    "get_contributions_by_month": [(datetime.now().strftime("%Y-%m"),)],
+    "get_member_balance": [(1,)],
+    "get_top_contributors": [(), (8, datetime(2000, 1, 1))],
+}
+
+# Tables kept in step by triggers on another table, whose writes bump that table
+DERIVED_TABLES = {"members_fts": "members"}
+
+
+def cached_readers() -> list:
+    return sorted(
+        name for name, function in vars(connection).items()
+        if inspect.isfunction(function) and hasattr(function, "cache_tables")
+    )
+
+
+def tables_in(statement: str) -> set:
+    names = set(connection.Base.metadata.tables) | set(DERIVED_TABLES)
+    return {DERIVED_TABLES.get(name, name) for name in names if re.search(rf"\b{name}\b", statement)}
+
+
+@pytest.fixture
+def ledger(engine):
+    """One member with a contribution and a scheduled, part-repaid active loan"""
+    member = connection.create_member("Asha Rao")
+    connection.record_contribution(member.id, 500.0)
+    loan = connection.create_loan(member.id, 1200.0, 12.0, term_months=12)
+    connection.update_loan(loan.id, status="Active")
+    connection.record_repayment(loan.id, 112.0)
+    return engine
+
+
+@pytest.mark.parametrize("name", cached_readers())
+def test_cached_readers_declare_every_table_they_read(ledger, name):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(ledger, "before_cursor_execute", listener)
+    try:
+        for args in READER_CALLS.get(name, [()]):
+            connection.query_cache.clear()
+            getattr(connection, name)(*args)
+    finally:
+        event.remove(ledger, "before_cursor_execute", listener)
+
+    assert statements
+    read = set().union(*map(tables_in, statements))
+    assert read <= set(getattr(connection, name).cache_tables)
+
+
+def test_activity_feed_follows_a_loan_moved_to_another_member(ledger):
+    ben = connection.create_member("Ben Okafor")
+    assert connection.get_recent_activities().items[0].member_name == "Asha Rao"
+
+    connection.update_loan(1, member_id=ben.id)
+    repayments = [item for item in connection.get_recent_activities().items if item.kind == "Repayment"]
+    assert [item.member_name for item in repayments] == ["Ben Okafor"]
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from database import connection
+from database.models import LoanStatus
+
+
+def test_repayments_on_one_loan_are_applied_together(engine):
+    member = connection.create_member("Asha Rao")
+    loan = connection.create_loan(member.id, 1000.0, 10.0)
+    connection.update_loan(loan.id, status="Active")
+
+    ids = connection.bulk_record_repayments([(loan.id, 400.0), (loan.id, 300.0, "second")])
+    assert len(ids) == 2
+    assert len(connection.get_repayments_by_loan(loan.id)) == 2
+    loan = connection.get_loan_by_id(loan.id)
+    assert (loan.amount_repaid, loan.status) == (700.0, LoanStatus.ACTIVE)
+
+
+def test_a_paid_loan_keeps_the_end_date_it_was_paid_off_on(engine):
+    member = connection.create_member("Asha Rao")
+    loan = connection.create_loan(member.id, 1000.0, 10.0)
+    connection.update_loan(loan.id, status="Active")
+
+    connection.record_repayment(loan.id, 1100.0)
+    paid = connection.get_loan_by_id(loan.id)
+    assert paid.status == LoanStatus.PAID
+    assert paid.end_date.date() == datetime.now().date()
+
+    connection.update_loan(loan.id, end_date=datetime(2024, 5, 1))
+    connection.record_repayment(loan.id, 50.0)
+    loan = connection.get_loan_by_id(loan.id)
+    assert (loan.amount_repaid, loan.status, loan.end_date) == (1150.0, LoanStatus.PAID, datetime(2024, 5, 1))
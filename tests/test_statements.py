@@ -0,0 +1,104 @@
+import os
+from datetime import datetime
+
+from sqlalchemy import update
+
+from database import connection
+from database.models import LoanRepayment
+from database.statements import MANIFEST_NAME, generate_statements
+
+
+def statement(member_id: int, start: datetime = None, end: datetime = None) -> list:
+    """(date, kind, savings change, loan change, savings balance, loan balance) of every statement line"""
+    return [
+        (line.entry_date and line.entry_date.date().isoformat(), line.kind, line.savings_change, line.loan_change,
+         line.savings_balance, line.loan_balance)
+        for line in connection.get_member_statement(member_id, start, end, batch_size=2)
+    ]
+
+
+def ledger():
+    """A member with contributions, a loan and a repayment spread over five months, and another member"""
+    asha = connection.create_member("Asha Rao")
+    ben = connection.create_member("Ben Okafor")
+    connection.bulk_record_contributions([
+        {"member_id": asha.id, "amount": 500.0, "contribution_date": datetime(2024, 1, 15)},
+        {"member_id": asha.id, "amount": 300.0, "contribution_date": datetime(2024, 3, 15)},
+        {"member_id": asha.id, "amount": 50.0, "contribution_date": datetime(2024, 3, 15)},
+        {"member_id": asha.id, "amount": 200.0, "contribution_date": datetime(2024, 5, 1)},
+        {"member_id": ben.id, "amount": 999.0, "contribution_date": datetime(2024, 3, 1)},
+    ])
+    loan = connection.create_loan(asha.id, 1000.0, 10.0)
+    connection.update_loan(loan.id, status="Active", start_date=datetime(2024, 2, 1))
+    repayment = connection.record_repayment(loan.id, 400.0)
+    with connection.session_scope() as session:
+        session.execute(
+            update(LoanRepayment).where(LoanRepayment.id == repayment.id).values(payment_date=datetime(2024, 4, 1))
+        )
+    return asha
+
+
+def test_whole_history_runs_from_a_zero_opening_balance(engine):
+    asha = ledger()
+
+    assert statement(asha.id) == [
+        (None, "Opening balance", 0.0, 0.0, 0.0, 0.0),
+        ("2024-01-15", "Contribution", 500.0, 0.0, 500.0, 0.0),
+        ("2024-02-01", "Disbursement", 0.0, 1000.0, 500.0, 1000.0),
+        ("2024-02-01", "Interest", 0.0, 100.0, 500.0, 1100.0),
+        ("2024-03-15", "Contribution", 300.0, 0.0, 800.0, 1100.0),
+        ("2024-03-15", "Contribution", 50.0, 0.0, 850.0, 1100.0),
+        ("2024-04-01", "Repayment", 0.0, -400.0, 850.0, 700.0),
+        ("2024-05-01", "Contribution", 200.0, 0.0, 1050.0, 700.0),
+    ]
+
+
+def test_a_period_opens_with_the_balance_before_it(engine):
+    asha = ledger()
+
+    # The end date is excluded
+    assert statement(asha.id, datetime(2024, 3, 1), datetime(2024, 5, 1)) == [
+        ("2024-03-01", "Opening balance", 500.0, 1100.0, 500.0, 1100.0),
+        ("2024-03-15", "Contribution", 300.0, 0.0, 800.0, 1100.0),
+        ("2024-03-15", "Contribution", 50.0, 0.0, 850.0, 1100.0),
+        ("2024-04-01", "Repayment", 0.0, -400.0, 850.0, 700.0),
+    ]
+    # A period without entries is just the opening balance
+    assert statement(asha.id, datetime(2024, 6, 1)) == [
+        ("2024-06-01", "Opening balance", 1050.0, 700.0, 1050.0, 700.0),
+    ]
+
+
+def test_a_bulk_run_resumes_from_its_manifest(engine, tmp_path):
+    for name in ("Asha Rao", "Ben Okafor", "Chen Wei"):
+        connection.record_contribution(connection.create_member(name).id, 100.0)
+    output = tmp_path / "statements"
+    url = engine.url.render_as_string(hide_password=False)
+
+    def run(**options):
+        return generate_statements(str(output), url=url, workers=2, chunk_size=1, **options)
+
+    first = run()
+    assert (first.members, first.written, first.skipped, first.failed) == (3, 3, 0, [])
+    assert sorted(os.listdir(output)) == sorted(
+        [MANIFEST_NAME] + [f"member_{n}.{fmt}" for n in (1, 2, 3) for fmt in ("html", "csv")]
+    )
+
+    # As if the run had stopped after member 1, while writing member 2's line
+    manifest = output / MANIFEST_NAME
+    run_key = manifest.read_text(encoding="utf-8").splitlines()[0]
+    manifest.write_text(f"{run_key}\n1\n2", encoding="utf-8")
+    for name in os.listdir(output):
+        if name.startswith("member_"):
+            os.remove(output / name)
+
+    resumed = run()
+    assert (resumed.written, resumed.skipped) == (2, 1)
+    assert not (output / "member_1.html").exists()
+    assert (output / "member_2.html").exists() and (output / "member_3.csv").exists()
+    assert sorted(manifest.read_text(encoding="utf-8").splitlines()[1:]) == ["1", "2", "3"]
+
+    # Nothing is left to do; a different format is a new run
+    assert run().written == 0
+    csv_only = run(formats=("csv",))
+    assert (csv_only.written, csv_only.skipped) == (3, 0)
@@ -0,0 +1,78 @@
+import pytest
+
+from database import connection
+
+from conftest import assert_summaries_consistent
+
+
+def test_summaries_follow_every_write(engine):
+    asha = connection.create_member("Asha Rao")
+    ben = connection.create_member("Ben Okafor")
+    assert_summaries_consistent()
+
+    first = connection.record_contribution(asha.id, 500.0)
+    connection.bulk_record_contributions([
+        {"member_id": asha.id, "amount": 250.0, "contribution_type": "Voluntary"},
+        {"member_id": ben.id, "amount": 125.0},
+    ])
+    assert_summaries_consistent()
+
+    loan = connection.create_loan(asha.id, 10000.0, 10.0)
+    connection.update_loan(loan.id, status="Active")
+    other = connection.create_loan(ben.id, 1200.0, 12.0, term_months=12)
+    assert_summaries_consistent()
+
+    connection.record_repayment(loan.id, 2000.0)
+    connection.bulk_record_repayments([(loan.id, 500.0), (other.id, 100.0, "first installment")])
+    assert_summaries_consistent()
+
+    balance = connection.get_member_balance(asha.id)
+    assert balance.total_contributions == 750.0
+    assert balance.outstanding_balance == 10000.0 + 1000.0 - 2500.0
+
+    assert connection.delete_contribution(first.id)
+    assert_summaries_consistent()
+
+    assert connection.delete_loan(loan.id)
+    assert_summaries_consistent()
+    assert connection.get_member_balance(asha.id).loan_count == 0
+
+    assert connection.delete_member(ben.id)
+    assert_summaries_consistent()
+    assert connection.get_member_balance(ben.id) is None
+
+
+def test_pending_loans_are_not_owed(engine):
+    member = connection.create_member("Asha Rao")
+    active = connection.create_loan(member.id, 10000.0, 10.0)
+    connection.update_loan(active.id, status="Active")
+    pending = connection.create_loan(member.id, 4000.0, 5.0)
+
+    balance = connection.get_member_balance(member.id)
+    assert (balance.loan_count, balance.total_borrowed, balance.outstanding_balance) == (2, 10000.0, 11000.0)
+    assert connection.get_dashboard_snapshot().outstanding_principal == 10000.0
+    assert_summaries_consistent()
+
+    # Paying the loan out makes it owed
+    connection.update_loan(pending.id, status="Active")
+    balance = connection.get_member_balance(member.id)
+    assert (balance.total_borrowed, balance.outstanding_balance) == (14000.0, 11000.0 + 4200.0)
+    assert connection.get_dashboard_snapshot().outstanding_principal == 14000.0
+    assert_summaries_consistent()
+
+
+def test_contribution_for_an_unknown_member_is_refused(engine):
+    member = connection.create_member("Asha Rao")
+
+    # Like the other writes, a refused contribution returns None, or raises inside a unit of work
+    assert connection.record_contribution(member.id + 1, 500.0) is None
+    assert connection.record_contribution(member.id, 500.0, month="2024-13") is None
+    with pytest.raises(ValueError, match="Unknown member"):
+        with connection.unit_of_work():
+            connection.record_contribution(member.id + 1, 500.0)
+    with pytest.raises(ValueError, match="Unknown member"):
+        connection.bulk_record_contributions([(member.id, 100.0), (member.id + 1, 500.0)])
+
+    assert connection.get_contributions_by_member(member.id + 1) == []
+    assert connection.get_member_balance(member.id + 1) is None
+    assert_summaries_consistent()
@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from database import connection
+from database.models import Contribution, Member, MemberStatus
+
+
+def committed(engine, model) -> int:
+    """Rows of model's table that another connection can see"""
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(model)).scalar()
+
+
+def test_calls_inside_a_unit_of_work_share_its_transaction(engine):
+    with connection.unit_of_work() as uow:
+        with connection.session_scope() as session:
+            assert session is uow.session
+        with connection.unit_of_work() as inner:
+            assert inner is uow
+
+        member = connection.create_member("Asha Rao", status=MemberStatus.ACTIVE)
+        connection.record_contribution(member.id, 500.0)
+        assert committed(engine, Member) == 0
+
+    assert committed(engine, Member) == 1
+    assert committed(engine, Contribution) == 1
+
+
+def test_a_failing_write_rolls_back_the_whole_block(engine):
+    with pytest.raises(IntegrityError):
+        with connection.unit_of_work():
+            member = connection.create_member("Asha Rao", status=MemberStatus.ACTIVE)
+            connection.record_contribution(member.id, 500.0)
+            connection.create_member(None)
+
+    assert committed(engine, Member) == 0
+    assert committed(engine, Contribution) == 0
+
+
+def test_a_failing_write_outside_a_unit_of_work_returns_none(engine, capsys):
+    connection.create_member("Asha Rao", status=MemberStatus.ACTIVE)
+
+    assert connection.create_member(None) is None
+    assert "Error creating member" in capsys.readouterr().out
+    assert committed(engine, Member) == 1
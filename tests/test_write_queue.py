@@ -0,0 +1,63 @@
+import pytest
+from sqlalchemy import event
+
+from database import connection
+from database.write_queue import WriteQueue
+
+
+@pytest.fixture
+def commits(engine):
+    """The number of commits made on the test database so far, as a one-item list"""
+    count = [0]
+
+    def on_commit(conn):
+        count[0] += 1
+
+    event.listen(engine, "commit", on_commit)
+    yield count
+    event.remove(engine, "commit", on_commit)
+
+
+def names() -> list:
+    return sorted(member.name for member in connection.get_all_members())
+
+
+def test_commands_that_arrive_together_commit_once(commits):
+    # The batch closes as soon as max_batch commands are in, well before max_delay
+    writes = WriteQueue(max_batch=5, max_delay=5.0)
+    futures = [writes.submit(connection.create_member, f"Member {n}") for n in range(5)]
+    results = [future.result(timeout=5) for future in futures]
+    writes.stop()
+
+    assert [member.name for member in results] == [f"Member {n}" for n in range(5)]
+    assert (writes.batches, writes.commands, writes.retried_batches) == (1, 5, 0)
+    assert commits[0] == 1
+    assert names() == [f"Member {n}" for n in range(5)]
+
+
+def test_a_failing_command_fails_only_its_own_future(commits):
+    writes = WriteQueue(max_batch=3, max_delay=5.0)
+    first = writes.submit(connection.create_member, "Asha Rao")
+    failing = writes.submit(connection.bulk_record_contributions, [(999, 500.0)])
+    last = writes.submit(connection.create_member, "Ben Okafor")
+
+    assert first.result(timeout=5).name == "Asha Rao"
+    with pytest.raises(ValueError, match="Unknown member"):
+        failing.result(timeout=5)
+    assert last.result(timeout=5).name == "Ben Okafor"
+    writes.stop()
+
+    # The batch rolled back, then each command ran and committed on its own
+    assert writes.retried_batches == 1
+    assert commits[0] == 2
+    assert names() == ["Asha Rao", "Ben Okafor"]
+
+
+def test_stop_runs_every_queued_command(engine):
+    writes = WriteQueue(max_batch=2, max_delay=0.0)
+    futures = [writes.submit(connection.create_member, f"Member {n}") for n in range(7)]
+    writes.stop()
+
+    assert all(future.done() for future in futures)
+    assert writes.commands == 7
+    assert len(names()) == 7